@@ -3,9 +3,11 @@ Django settings for de project.
 """
 
 import environ
+import sys
 from pathlib import Path
 import boto3
 import logging
+from django.core.exceptions import ImproperlyConfigured
 
 # ==================== 初始化 environ ====================
 env = environ.Env(
@@ -77,6 +79,15 @@ TEMPLATES = [
 WSGI_APPLICATION = "core.de.wsgi.application"
 
 # ==================== Database ====================
+# 資料庫驅動: psycopg2(預設) / psycopg(psycopg 3)
+# 兩者都安裝時 Django 一律選用 psycopg 3, 選 psycopg2 時需在 Django 載入
+# PostgreSQL backend 之前擋掉 psycopg 的 import
+DATABASE_DRIVER = env("DATABASE_DRIVER", default="psycopg2")
+if DATABASE_DRIVER == "psycopg2":
+    sys.modules["psycopg"] = None
+elif DATABASE_DRIVER != "psycopg":
+    raise ImproperlyConfigured(f"未知的 DATABASE_DRIVER: {DATABASE_DRIVER}")
+
 DATABASES = {"default": env.db("DATABASE_URL")}
 
 # ==================== Password validation ====================
@@ -108,6 +119,26 @@ STATIC_URL = "static/"
 CSV_URL = env("CSV_URL", default="https://eip.fia.gov.tw/data/BGMOPEN1.csv")
 BATCH_SIZE = env.int("BATCH_SIZE", default=10000)
 CHUNK_SIZE = env.int("CHUNK_SIZE", default=50000)
+# 來源 CSV 本地快取目錄（搭配 ETag / Last-Modified 做條件式下載）
+ETL_CACHE_DIR = env("ETL_CACHE_DIR", default="./cache")
+# 本地快取的壓縮格式: none / gzip / zstd
+ETL_SPOOL_COMPRESSION = env("ETL_SPOOL_COMPRESSION", default="none")
+# COPY 格式: text(psycopg2 / psycopg 3) / binary(需 DATABASE_DRIVER=psycopg)
+ETL_LOADER_BACKEND = env("ETL_LOADER_BACKEND", default="text")
+# --load-profile=bulk 重建索引時的 session 參數
+ETL_MAINTENANCE_WORK_MEM = env("ETL_MAINTENANCE_WORK_MEM", default="1GB")
+ETL_PARALLEL_MAINTENANCE_WORKERS = env.int(
+    "ETL_PARALLEL_MAINTENANCE_WORKERS", default=2
+)
+# --adaptive-chunks 的 RSS 上限(MB), 需低於 q-worker 容器的記憶體限制
+ETL_MEMORY_BUDGET_MB = env.int("ETL_MEMORY_BUDGET_MB", default=1024)
+# 執行中任務更新 ETLJobRun.updated_at 的間隔(秒), 需遠小於判定中斷的 5 分鐘
+ETL_HEARTBEAT_SECONDS = env.int("ETL_HEARTBEAT_SECONDS", default=30)
+# 單次匯入寫入 data_import_error 的錯誤上限, 超過的寫入 ETL_ERROR_DIR 的 gzip CSV
+ETL_ERROR_DB_LIMIT = env.int("ETL_ERROR_DB_LIMIT", default=100000)
+ETL_ERROR_DIR = env("ETL_ERROR_DIR", default="./errors")
+# --profile 的輸出目錄, 每次執行寫入 job_<ETLJobRun.id>/
+ETL_PROFILE_DIR = env("ETL_PROFILE_DIR", default="./profiles")
 
 
 # 2. 配置 Django-Q2
@@ -115,7 +146,9 @@ Q_CLUSTER = {
     "name": "ETL_Cluster",
     "workers": 1,
     "queue_limit": 50,
-    "recycle": 5,  # 執行 5 次任務後重啟 worker，防止記憶體洩漏
+    # 執行 5 次任務後重啟 worker，防止記憶體洩漏
+    # (成長來源可用 load_tax_registration --track-memory 或 benchmark_etl --suite memory 追查)
+    "recycle": 5,
     "timeout": 7200,  # 2 小時（ETL 可能跑很久）
     "retry": 7300,  # 重試時間要略長於 timeout
     "orm": "default",  # 直接使用 DB，不需 Redis
@@ -6,6 +6,7 @@ from .models import (
     ETLJobRun,
     DataImportError,
     ImportProgress,
+    ChunkMetric,
 )
 
 
@@ -61,6 +62,29 @@ class ImportProgressInline(admin.StackedInline):
     can_delete = False
 
 
+class ChunkMetricInline(admin.TabularInline):
+    model = ChunkMetric
+    extra = 0
+    readonly_fields = (
+        "batch_number",
+        "rows_in",
+        "rows_out",
+        "bytes_read",
+        "extract_seconds",
+        "transform_seconds",
+        "copy_seconds",
+        "industry_seconds",
+        "progress_seconds",
+        "peak_rss_display",
+    )
+    exclude = ("peak_rss",)
+    can_delete = False
+
+    @admin.display(description="RSS 高水位")
+    def peak_rss_display(self, obj):
+        return f"{obj.peak_rss / 1024 / 1024:,.1f} MB"
+
+
 @admin.register(ETLJobRun)
 class ETLJobRunAdmin(admin.ModelAdmin):
     list_display = (
@@ -73,7 +97,7 @@ class ETLJobRunAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "started_at")
     readonly_fields = ("started_at", "completed_at", "duration_display")
-    inlines = [ImportProgressInline, DataImportErrorInline]
+    inlines = [ImportProgressInline, ChunkMetricInline, DataImportErrorInline]
 
     @admin.display(description="執行耗時")
     def duration_display(self, obj):
@@ -0,0 +1,123 @@
+"""跨批次統一編號去重模組"""
+
+import zlib
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class SeenBanSet:
+    """
+    單次匯入中已出現過的統一編號集合
+
+    以 10^8 bits 的 bitmap 表示(約 12.5MB), 查詢與加入都是 O(1) 且可整批向量化。
+    斷點續傳的 checkpoint 只寫入變化量: track_changes 時記錄上次 take_added()
+    之後加入的統一編號, 每批次寫一筆增量(見 SeenBanDelta), 還原時依序重放。
+    統一編號平均分布在整個範圍, 單一批次就會改到 bitmap 的每一頁,
+    因此記錄編號本身而不是變動的 bitmap 頁。
+    """
+
+    SIZE = 10**8  # 8 位數統一編號的範圍
+
+    def __init__(self, bits: Optional[np.ndarray] = None, track_changes: bool = False):
+        self._bits = bits
+        self._added: Optional[List[np.ndarray]] = [] if track_changes else None
+
+    @property
+    def bits(self) -> np.ndarray:
+        """bitmap 本體(第一次使用才配置記憶體)"""
+        if self._bits is None:
+            self._bits = np.zeros(self.SIZE // 8, dtype=np.uint8)
+        return self._bits
+
+    def __len__(self) -> int:
+        if self._bits is None:
+            return 0
+        return int(np.bitwise_count(self._bits).sum(dtype=np.int64))
+
+    def contains(self, bans: pd.Series) -> np.ndarray:
+        """每個統一編號是否已出現過"""
+        values = self._to_ints(bans)
+        return (self.bits[values >> 3] & (1 << (values & 7)).astype(np.uint8)) != 0
+
+    def add(self, bans: pd.Series):
+        """將統一編號加入集合"""
+        self._add_ints(self._to_ints(bans))
+
+    def discard(self, bans: pd.Series):
+        """將統一編號移出集合"""
+        values = self._to_ints(bans)
+        np.bitwise_and.at(self.bits, values >> 3, ~(1 << (values & 7)).astype(np.uint8))
+
+    def _add_ints(self, values: np.ndarray):
+        np.bitwise_or.at(self.bits, values >> 3, (1 << (values & 7)).astype(np.uint8))
+        if self._added is not None:
+            self._added.append(values)
+
+    def to_bans(self) -> np.ndarray:
+        """集合中所有統一編號(8 位數字字串, 由小到大)"""
+        if self._bits is None:
+            return np.empty(0, dtype="U8")
+        # 只展開非 0 的 byte, 避免配置 10^8 bytes 的暫存陣列
+        nonzero = np.flatnonzero(self._bits)
+        bits = np.unpackbits(self._bits[nonzero, None], axis=1, bitorder="little")
+        rows, offsets = np.nonzero(bits)
+        values = nonzero[rows] * 8 + offsets
+        return np.char.zfill(values.astype("U8"), 8)
+
+    def take_added(self) -> bytes:
+        """
+        取出上次呼叫之後加入的統一編號, 用於寫入 checkpoint
+
+        排序後存相鄰差值(uint32)再以 zlib 壓縮, 每個編號約 2 bytes。
+        """
+        if self._added:
+            values = np.unique(np.concatenate(self._added))
+        else:
+            values = np.empty(0, dtype=np.int64)
+        if self._added is not None:
+            self._added = []
+        deltas = np.diff(values, prepend=0).astype(np.uint32)
+        return zlib.compress(deltas.tobytes(), level=1)
+
+    @classmethod
+    def from_deltas(
+        cls, deltas: Iterable[bytes], track_changes: bool = False
+    ) -> "SeenBanSet":
+        """依序重放 take_added() 的結果還原集合, 內容損毀時拋出 ValueError"""
+        seen = cls(track_changes=track_changes)
+        for data in deltas:
+            raw = zlib.decompress(data)
+            if len(raw) % 4:
+                raise ValueError(f"增量長度錯誤: {len(raw):,} bytes")
+            values = np.cumsum(np.frombuffer(raw, dtype=np.uint32), dtype=np.int64)
+            if len(values) and values[-1] >= cls.SIZE:
+                raise ValueError(f"統一編號超出範圍: {values[-1]}")
+            seen._add_ints(values)
+        return seen
+
+    @classmethod
+    def from_bans(
+        cls, bans: Iterable[str], batch_size: int = 100000, track_changes: bool = False
+    ) -> "SeenBanSet":
+        """由既有的統一編號清單建立(例如資料庫中已載入的資料)"""
+        seen = cls(track_changes=track_changes)
+        batch = []
+        for ban in bans:
+            batch.append(ban)
+            if len(batch) >= batch_size:
+                seen.add(pd.Series(batch, dtype=str))
+                batch = []
+        if batch:
+            seen.add(pd.Series(batch, dtype=str))
+        return seen
+
+    @staticmethod
+    def _to_ints(bans: pd.Series) -> np.ndarray:
+        """8 位數字字串轉為整數陣列(呼叫端需先通過格式驗證)"""
+        if bans.empty:
+            return np.empty(0, dtype=np.int64)
+        joined = "".join(bans.tolist()).encode("ascii")
+        digits = np.frombuffer(joined, dtype=np.uint8).reshape(-1, 8) - ord("0")
+        return digits.astype(np.int64) @ (10 ** np.arange(7, -1, -1, dtype=np.int64))
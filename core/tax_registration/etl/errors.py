@@ -0,0 +1,214 @@
+"""匯入錯誤紀錄模組: 跨批次緩衝, 以 COPY 寫入資料庫, 超量時改寫壓縮檔"""
+
+import gzip
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from django.db import connection
+from django.utils import timezone
+
+from core.tax_registration.etl.loader import BulkLoader
+from core.tax_registration.etl.transformer import ERROR_COLUMNS
+from core.tax_registration.models import DataImportError
+
+logger = logging.getLogger("tax_registration.etl")
+
+# data_import_error 的 COPY 欄位
+ERROR_TABLE_COLUMNS = {
+    "job_run_id": "int8",
+    "batch_number": "int4",
+    "error_type": "text",
+    "error_message": "text",
+    "raw_data": "jsonb",
+    "created_at": "timestamptz",
+}
+
+
+class ErrorSink:
+    """
+    收集單次匯入的所有錯誤
+
+    - 錯誤表先累積在記憶體, 滿 flush_rows 筆或進度 checkpoint 時才寫入(減少往返)
+    - 前 max_db_rows 筆以 COPY 寫入 data_import_error, 之後的寫進
+      <sidecar_dir>/job_<id>_errors.csv.gz, 資料庫不會因為一份壞檔案暴增
+    - counts 為各錯誤類型的精確筆數(不受上述上限影響);
+      checkpoint_counts 只含已 checkpoint 的批次, 與續傳進度一起保存
+    """
+
+    FLUSH_ROWS = 50000
+
+    def __init__(
+        self,
+        job_run_id: int,
+        max_db_rows: int,
+        sidecar_dir: str,
+        flush_rows: Optional[int] = None,
+    ):
+        self.job_run_id = job_run_id
+        self.max_db_rows = max_db_rows
+        self.sidecar_dir = Path(sidecar_dir)
+        self.flush_rows = flush_rows or self.FLUSH_ROWS
+
+        self.counts: Dict[str, int] = {}
+        self.checkpoint_counts: Dict[str, int] = {}
+        self.db_rows = 0
+        self.sidecar_rows = 0
+        self.sidecar_path: Optional[Path] = None
+
+        self._buffer: List[Tuple[int, pd.DataFrame]] = []
+        self._buffered = 0
+        # 尚未 checkpoint 的批次 → 各錯誤類型筆數
+        self._pending_counts: Dict[int, Dict[str, int]] = {}
+
+    def resume(self, counts: Dict[str, int]):
+        """續傳: 從上次 checkpoint 保存的筆數繼續累計"""
+        self.counts = dict(counts)
+        self.checkpoint_counts = dict(counts)
+
+    def add(self, errors: pd.DataFrame, chunk_num: int):
+        """加入一個批次的錯誤表(欄位見 transformer.ERROR_COLUMNS)"""
+        if errors.empty:
+            return
+
+        chunk_counts = self._pending_counts.setdefault(chunk_num, {})
+        for error_type, count in errors["type"].value_counts().items():
+            self.counts[error_type] = self.counts.get(error_type, 0) + int(count)
+            chunk_counts[error_type] = chunk_counts.get(error_type, 0) + int(count)
+
+        self._buffer.append((chunk_num, errors))
+        self._buffered += len(errors)
+        if self._buffered >= self.flush_rows:
+            self.flush()
+
+    def checkpoint(self, chunk_num: int) -> Dict[str, int]:
+        """
+        寫出 chunk_num(含)之前批次的錯誤, 返回這些批次的各錯誤類型筆數
+
+        續傳從 chunk_num 的下一批開始, 之前批次的錯誤必須在進度保存前寫出;
+        管線化時之後的批次可能已經 screen, 它們的錯誤留在緩衝區(續傳時會重新產生)。
+        """
+        self._write(through=chunk_num)
+
+        for chunk in [chunk for chunk in self._pending_counts if chunk <= chunk_num]:
+            for error_type, count in self._pending_counts.pop(chunk).items():
+                self.checkpoint_counts[error_type] = (
+                    self.checkpoint_counts.get(error_type, 0) + count
+                )
+        return self.checkpoint_counts
+
+    def flush(self):
+        """寫出緩衝中的錯誤"""
+        self._write()
+
+    def _write(self, through: Optional[int] = None):
+        """寫出緩衝中批次編號不超過 through 的錯誤(None 為全部), 其餘留在緩衝區"""
+        frames, kept = [], []
+        for chunk_num, frame in self._buffer:
+            if through is None or chunk_num <= through:
+                frames.append(frame)
+            else:
+                kept.append((chunk_num, frame))
+        if not frames:
+            return
+
+        errors = pd.concat(frames, ignore_index=True)
+        self._buffer = kept
+        self._buffered = sum(len(frame) for _, frame in kept)
+
+        quota = max(self.max_db_rows - self.db_rows, 0)
+        if quota:
+            to_db = errors.iloc[:quota]
+            self._write_db(to_db)
+            self.db_rows += len(to_db)
+
+        if len(errors) > quota:
+            overflow = errors.iloc[quota:]
+            self._write_sidecar(overflow)
+            self.sidecar_rows += len(overflow)
+
+    def _write_db(self, errors: pd.DataFrame):
+        """PostgreSQL 以 COPY 寫入, 其他資料庫退回 bulk_create"""
+        if connection.vendor != "postgresql":
+            DataImportError.objects.bulk_create(
+                [
+                    DataImportError(
+                        job_run_id=self.job_run_id,
+                        batch_number=err["batch"],
+                        error_type=err["type"],
+                        error_message=err["message"],
+                        raw_data=err,
+                    )
+                    for err in errors.to_dict("records")
+                ],
+                batch_size=5000,
+            )
+            return
+
+        rows = pd.DataFrame(
+            {
+                "job_run_id": self.job_run_id,
+                "batch_number": errors["batch"].to_numpy(),
+                "error_type": errors["type"].to_numpy(),
+                "error_message": errors["message"].to_numpy(),
+                "raw_data": self._raw_data_json(errors).to_numpy(),
+                # created_at 沒有資料庫預設值, COPY 時需自行提供
+                "created_at": timezone.now().isoformat(),
+            }
+        )
+        BulkLoader(backend="text").copy_frame(
+            rows, DataImportError._meta.db_table, ERROR_TABLE_COLUMNS
+        )
+
+    @staticmethod
+    def _raw_data_json(errors: pd.DataFrame) -> pd.Series:
+        """
+        以字串運算組出每筆錯誤的 JSON(type / batch / ban / row, 訊息已在 error_message)
+
+        type 由程式產生, 只有 ban 來自原始資料, 需跳脫;
+        含控制字元的少數情況改用 json.dumps。
+        """
+        bans = errors["ban"].astype(str)
+        escaped = bans.str.replace("\\", "\\\\", regex=False).str.replace(
+            '"', '\\"', regex=False
+        )
+        control = bans.str.contains(r"[\x00-\x1f]", regex=True)
+        if control.any():
+            escaped[control] = bans[control].map(lambda ban: json.dumps(ban)[1:-1])
+        return (
+            '{"type": "'
+            + errors["type"].astype(str)
+            + '", "batch": '
+            + errors["batch"].astype(str)
+            + ', "ban": "'
+            + escaped
+            + '", "row": '
+            + errors["row"].astype(str)
+            + "}"
+        )
+
+    def _write_sidecar(self, errors: pd.DataFrame):
+        """附加到 gzip CSV(每次附加為一個新的 gzip member, 可直接串接解壓)"""
+        if self.sidecar_path is None:
+            self.sidecar_dir.mkdir(parents=True, exist_ok=True)
+            self.sidecar_path = (
+                self.sidecar_dir / f"job_{self.job_run_id}_errors.csv.gz"
+            )
+            header = True
+        else:
+            header = False
+
+        with gzip.open(self.sidecar_path, "at", encoding="utf-8", newline="") as f:
+            errors[ERROR_COLUMNS].to_csv(f, index=False, header=header)
+
+        logger.info(
+            "錯誤紀錄超過資料庫上限, 寫入壓縮檔",
+            extra={
+                "event": "errors_sidecar",
+                "job_run_id": self.job_run_id,
+                "path": str(self.sidecar_path),
+                "rows": len(errors),
+            },
+        )
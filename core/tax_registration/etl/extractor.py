@@ -1,49 +1,626 @@
 """CSV 資料擷取模組"""
 
+import base64
+import bz2
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Generator, Optional, Union
+from urllib.parse import unquote, urlparse
+
 import pandas as pd
+import pyarrow as pa
 import requests
+import zstandard
+from django.utils import timezone
+from pyarrow import csv as pa_csv
 from requests.adapters import HTTPAdapter
 from urllib3.util import Retry
-from typing import Generator
+from urllib3.util.request import ACCEPT_ENCODING
 
 
 class CSVExtractor:
     """負責從遠端 URL 下載 CSV 並分批讀取"""
 
-    def __init__(self, url: str):
+    DOWNLOAD_BLOCK_SIZE = 1024 * 1024  # 1MB
+
+    PARSER_ENGINES = ["pandas", "pyarrow"]
+
+    # 本地快取(spool)的壓縮格式 → 副檔名
+    SPOOL_COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+    # 本地來源依副檔名透明解壓
+    COMPRESSED_SUFFIXES = [".gz", ".zst", ".bz2", ".xz"]
+
+    NA_VALUES = ["", "NULL", "null", "NA", "N/A"]
+
+    # TaxDataTransformer / BulkLoader 實際用到的欄位, 其他欄位不解析
+    USE_COLUMNS = [
+        "統一編號",
+        "總機構統一編號",
+        "營業人名稱",
+        "營業地址",
+        "資本額",
+        "設立日期",
+        "組織別名稱",
+        "使用統一發票",
+        "行業代號",
+        "名稱",
+        "行業代號1",
+        "名稱1",
+        "行業代號2",
+        "名稱2",
+        "行業代號3",
+        "名稱3",
+    ]
+
+    def __init__(
+        self,
+        url: str,
+        cache_dir: Optional[str] = None,
+        download_workers: int = 1,
+        parser: str = "pandas",
+        spool_compression: str = "none",
+    ):
+        if parser not in self.PARSER_ENGINES:
+            raise ValueError(f"不支援的 parser: {parser}")
+        if spool_compression not in self.SPOOL_COMPRESSIONS:
+            raise ValueError(f"不支援的 spool 壓縮格式: {spool_compression}")
+
         self.url = url
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.download_workers = max(1, download_workers)
+        self.parser = parser
+        self.spool_compression = spool_compression
+        self.source_hash: Optional[str] = None
+        self._synced = False
+
+        # 下載與解析分開統計, 才看得出瓶頸在網路還是 pandas
+        # bytes: 解壓後大小, wire_bytes: 實際傳輸大小
+        self.download_stats = {"bytes": 0, "wire_bytes": 0, "seconds": 0.0}
+        self.parse_stats = {"rows": 0, "seconds": 0.0}
+
+    @property
+    def download_mb_per_second(self) -> float:
+        """下載速度 (MB/s)"""
+        if self.download_stats["seconds"] > 0:
+            return (
+                self.download_stats["bytes"] / 1024**2 / self.download_stats["seconds"]
+            )
+        return 0
+
+    @property
+    def parse_rows_per_second(self) -> float:
+        """解析速度 (rows/s)"""
+        if self.parse_stats["seconds"] > 0:
+            return self.parse_stats["rows"] / self.parse_stats["seconds"]
+        return 0
+
+    @property
+    def local_path(self) -> Optional[Path]:
+        """file:// 或本機路徑來源, 遠端 URL 時為 None"""
+        parsed = urlparse(self.url)
+        if parsed.scheme == "file":
+            return Path(unquote(parsed.path))
+        if parsed.scheme in ("http", "https"):
+            return None
+        return Path(self.url)
+
+    @property
+    def cache_path(self) -> Optional[Path]:
+        """本地快取檔路徑(以 URL 區分不同來源)"""
+        if self.cache_dir is None or self.local_path is not None:
+            return None
+
+        url_key = hashlib.sha1(self.url.encode("utf-8")).hexdigest()[:12]
+        filename = Path(urlparse(self.url).path).name or "source.csv"
+        suffix = self.SPOOL_COMPRESSIONS[self.spool_compression]
+        return self.cache_dir / f"{url_key}_{filename}{suffix}"
+
+    @property
+    def source_path(self) -> Optional[Path]:
+        """實際讀取的本地檔案(本機來源或快取), 直接串流遠端時為 None"""
+        return self.local_path or self.cache_path
+
+    @property
+    def meta_path(self) -> Optional[Path]:
+        """快取 metadata (ETag / Last-Modified / sha256) 路徑"""
+        if self.cache_path is None:
+            return None
+        return self.cache_path.with_name(self.cache_path.name + ".meta.json")
+
+    def sync(self, force: bool = False) -> bool:
+        """
+        以條件式請求同步本地快取。
+
+        有快取時帶上 If-None-Match / If-Modified-Since, 伺服器回 304 則沿用本地檔案;
+        否則重新下載並計算 sha256。
+
+        本機來源不需下載, 只計算解壓後內容的 sha256。
+
+        Args:
+            force (bool): 忽略既有快取, 強制重新下載
+
+        Returns:
+            bool: 來源內容是否有變更
+
+        Raises:
+            ValueError: 遠端來源未設定 cache_dir
+        """
+        if self.local_path is not None:
+            previous = self.source_hash
+            with self._open_local(self.local_path) as f:
+                self.source_hash = self._hash_stream(f)
+            self._synced = True
+            return self.source_hash != previous
+
+        if self.cache_dir is None:
+            raise ValueError("未設定 cache_dir, 無法同步本地快取")
 
-    def fetch_chunks(self, chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta = {} if force else self._load_meta()
+
+        headers = {}
+        if meta and self.cache_path.exists():
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        session = self._create_session()
+        started = time.perf_counter()
+
+        with self._request_source(session, headers) as response:
+            if response.status_code == 304:
+                self.source_hash = meta["sha256"]
+                self._synced = True
+                return False
+
+            response.raise_for_status()
+
+            # HEAD 代表伺服器支援 Range, 走多連線分段下載
+            if response.request.method == "HEAD":
+                sha256, size = self._download_ranges(session, response)
+                self.download_stats["wire_bytes"] += size
+            else:
+                sha256, size = self._download(response)
+                self.download_stats["wire_bytes"] += response.raw.tell()
+
+            new_meta = {
+                "url": self.url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": sha256,
+                "size": size,
+                "fetched_at": timezone.now().isoformat(),
+            }
+
+        self.download_stats["bytes"] += size
+        self.download_stats["seconds"] += time.perf_counter() - started
+
+        self._save_meta(new_meta)
+        self.source_hash = sha256
+        self._synced = True
+
+        return sha256 != meta.get("sha256")
+
+    def fetch_chunks(
+        self,
+        chunk_size: Union[int, Callable[[], int]],
+        start_offset: Optional[int] = None,
+        start_row: int = 0,
+    ) -> Generator[pd.DataFrame, None, None]:
         """
         下載 CSV 並以 generator 方式分批返回 DataFrame。
 
+        本機來源(可為 .gz / .zst / .bz2 / .xz)或有設定 cache_dir 時從本地檔案讀取,
+        否則直接串流遠端檔案(可協商 gzip 等壓縮傳輸, 邊收邊解壓)。
+        每個 DataFrame 的 attrs["chunk_range"] 記錄
+        (起始 byte, 結束 byte, 起始列號, 筆數), 供斷點續傳直接 seek;
+        attrs["extract_seconds"] 為讀取與解析該 chunk 的秒數。
+
+        Args:
+            chunk_size (Union[int, Callable[[], int]]): 每個 chunk 的資料筆數,
+                或每讀一個 chunk 前呼叫一次的函式(動態調整)
+            start_offset (Optional[int]): 從檔案的這個 byte 位置開始讀
+                (需為某個 chunk 的起點)
+            start_row (int): start_offset 對應的資料列號, 用於延續 DataFrame index
+
+        Returns:
+            Generator[pd.DataFrame, None, None]: 依序產生各個 chunk
         """
+        if self.cache_path is not None and not self._synced:
+            self.sync()
+
+        header, stream, position = self._open_source(start_offset)
+        return self._iter_chunks(header, stream, position, chunk_size, start_row)
+
+    def _open_source(self, start_offset: Optional[int]) -> tuple:
+        """
+        開啟來源並定位, 返回 (header bytes, binary stream, 目前 byte 位置)
+
+        byte 位置一律以解壓後的內容計算, 壓縮檔續傳時以讀取丟棄的方式前進。
+        """
+        path = self.source_path
+        if path is not None:
+            f = self._open_local(path)
+            header = f.readline()
+            position = len(header)
+            if start_offset is not None:
+                if path.suffix in self.COMPRESSED_SUFFIXES:
+                    self._skip_bytes(f, start_offset - position)
+                else:
+                    f.seek(start_offset)
+                position = start_offset
+            return header, f, position
+
         session = self._create_session()
 
+        if start_offset is not None:
+            # 先用小範圍請求取回 header, 再從 offset 開始串流
+            header = self._fetch_header(session)
+            # Range 需針對未壓縮內容, 因此要求 identity 編碼
+            response = session.get(
+                self.url,
+                headers={
+                    "Range": f"bytes={start_offset}-",
+                    "Accept-Encoding": "identity",
+                },
+                stream=True,
+                timeout=60,
+            )
+            response.raise_for_status()
+            if response.status_code == 206:
+                return header, self._buffered(response), start_offset
+            # 伺服器不支援 Range, 退回從頭讀取
+            response.close()
+
         response = session.get(self.url, stream=True, timeout=60)
         response.raise_for_status()
+        stream = self._buffered(response)
+        header = stream.readline()
+        position = len(header)
+
+        if start_offset is not None:
+            self._skip_bytes(stream, start_offset - position)
+            position = start_offset
+
+        return header, stream, position
+
+    def _fetch_header(self, session: requests.Session) -> bytes:
+        """以 Range 請求取回第一行(header)"""
+        response = session.get(
+            self.url,
+            headers={"Range": "bytes=0-65535", "Accept-Encoding": "identity"},
+            stream=True,
+            timeout=60,
+        )
+        response.raise_for_status()
+        with response:
+            return self._buffered(response).readline()
+
+    def _buffered(self, response: requests.Response) -> io.BufferedReader:
+        """包成 BufferedReader 以便逐行讀取, 壓縮傳輸時邊讀邊解壓"""
+        # 讀完時不要自動關閉, 否則 buffer 內尚未取出的資料也無法再讀
+        response.raw.auto_close = False
+        response.raw.decode_content = True
+        return io.BufferedReader(response.raw, self.DOWNLOAD_BLOCK_SIZE)
+
+    def _open_local(self, path: Path):
+        """依副檔名開啟本地檔案, 壓縮檔以串流方式解壓"""
+        if path.suffix == ".gz":
+            return gzip.open(path, "rb")
+        if path.suffix == ".zst":
+            reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+            return io.BufferedReader(reader, self.DOWNLOAD_BLOCK_SIZE)
+        if path.suffix == ".bz2":
+            return bz2.open(path, "rb")
+        if path.suffix == ".xz":
+            return lzma.open(path, "rb")
+        return open(path, "rb", buffering=self.DOWNLOAD_BLOCK_SIZE)
+
+    def _open_spool_writer(self, path: Path):
+        """依 spool_compression 開啟快取寫入檔"""
+        if self.spool_compression == "gzip":
+            return gzip.open(path, "wb", compresslevel=6)
+        if self.spool_compression == "zstd":
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+        return open(path, "wb")
+
+    def _skip_bytes(self, stream, count: int):
+        """讀取並丟棄指定 bytes 數(無法 seek 時使用)"""
+        while count > 0:
+            block = stream.read(min(count, self.DOWNLOAD_BLOCK_SIZE))
+            if not block:
+                break
+            count -= len(block)
+
+    def _iter_chunks(
+        self,
+        header: bytes,
+        stream,
+        position: int,
+        chunk_size: Union[int, Callable[[], int]],
+        start_row: int,
+    ) -> Generator[pd.DataFrame, None, None]:
+        """逐行切出 chunk 並解析, 同時記錄每個 chunk 的 byte 範圍"""
+        header = header.removeprefix(codecs.BOM_UTF8)
+        names = next(csv.reader([header.decode("utf-8")]))
+        columns = [name for name in names if name in self.USE_COLUMNS]
+
+        with stream:
+            while True:
+                read_started = time.perf_counter()
+                chunk_start = position
+                lines = []
+                records = 0
+                in_quotes = False
+                size = chunk_size() if callable(chunk_size) else chunk_size
+
+                while records < size:
+                    line = stream.readline()
+                    if not line:
+                        break
+                    lines.append(line)
+                    position += len(line)
+
+                    # 引號內的換行不算新的一筆
+                    if line.count(b'"') % 2:
+                        in_quotes = not in_quotes
+                    if not in_quotes:
+                        records += 1
+
+                if not lines:
+                    return
+
+                parse_started = time.perf_counter()
+                df = self._parse(header + b"".join(lines), columns)
+                self.parse_stats["seconds"] += time.perf_counter() - parse_started
+                self.parse_stats["rows"] += len(df)
+
+                df.index = pd.RangeIndex(start_row, start_row + len(df))
+                df.attrs["chunk_range"] = (chunk_start, position, start_row, len(df))
+                # 讀取 + 解析此 chunk 的時間
+                df.attrs["extract_seconds"] = time.perf_counter() - read_started
+                start_row += len(df)
+
+                yield df
+
+    def _parse(self, data: bytes, columns: list) -> pd.DataFrame:
+        """解析單一 chunk 的 CSV bytes(含 header), 只保留 columns"""
+        if self.parser == "pyarrow":
+            return self._parse_pyarrow(data, columns)
 
         return pd.read_csv(
-            response.raw,
+            io.BytesIO(data),
             encoding="utf-8",
-            chunksize=chunk_size,
             dtype=str,
-            na_values=["", "NULL", "null", "NA", "N/A"],
+            usecols=columns,
+            na_values=self.NA_VALUES,
             keep_default_na=False,
         )
 
+    def _parse_pyarrow(self, data: bytes, columns: list) -> pd.DataFrame:
+        """以 pyarrow 多執行緒解析, 欄位直接保留 Arrow string 型別"""
+        table = pa_csv.read_csv(
+            pa.py_buffer(data),
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={column: pa.string() for column in columns},
+                null_values=self.NA_VALUES,
+                strings_can_be_null=True,
+            ),
+        )
+        return table.to_pandas(
+            types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get
+        )
+
+    def _request_source(
+        self, session: requests.Session, headers: dict
+    ) -> requests.Response:
+        """
+        發出條件式請求。
+
+        多連線模式先送 HEAD 確認是否支援 Range, 不支援時退回單一 GET 串流。
+        """
+        if self.download_workers > 1:
+            response = session.head(
+                self.url, headers=headers, timeout=60, allow_redirects=True
+            )
+            if response.status_code == 304 or self._supports_ranges(response):
+                return response
+            response.close()
+
+        return session.get(self.url, headers=headers, stream=True, timeout=60)
+
+    def _supports_ranges(self, response: requests.Response) -> bool:
+        """伺服器是否能以 byte range 分段下載"""
+        return (
+            response.status_code == 200
+            and response.headers.get("Accept-Ranges") == "bytes"
+            and int(response.headers.get("Content-Length") or 0) > 0
+            and not response.headers.get("Content-Encoding")
+        )
+
+    def _download_ranges(
+        self, session: requests.Session, head: requests.Response
+    ) -> tuple:
+        """
+        將檔案切成 N 段 byte range 並行下載到 spool 檔。
+
+        每段帶 If-Range, 若下載期間來源變更伺服器會回 200 而非 206, 直接視為失敗。
+        完成後檢查總長度, 並在伺服器提供 Repr-Digest / Digest 時比對 sha256。
+        """
+        size = int(head.headers["Content-Length"])
+        validator = head.headers.get("ETag") or head.headers.get("Last-Modified")
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".ranges.part")
+
+        step = -(-size // self.download_workers)
+        ranges = [
+            (start, min(start + step, size) - 1) for start in range(0, size, step)
+        ]
+
+        try:
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+                with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+                    written = sum(
+                        pool.map(
+                            lambda r: self._download_range(
+                                session, f.fileno(), r[0], r[1], validator
+                            ),
+                            ranges,
+                        )
+                    )
+
+            if written != size:
+                raise requests.RequestException(
+                    f"下載長度不符: 預期 {size:,} bytes, 實際 {written:,} bytes"
+                )
+
+            with open(tmp_path, "rb") as f:
+                sha256 = self._hash_stream(f)
+            expected = self._expected_sha256(head)
+            if expected and expected != sha256:
+                raise requests.RequestException(
+                    f"sha256 驗證失敗: 預期 {expected}, 實際 {sha256}"
+                )
+
+            if self.spool_compression == "none":
+                os.replace(tmp_path, self.cache_path)
+            else:
+                self._compress_spool(tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        return sha256, size
+
+    def _download_range(
+        self,
+        session: requests.Session,
+        fd: int,
+        start: int,
+        end: int,
+        validator: Optional[str],
+    ) -> int:
+        """下載單一 byte range 並寫到 spool 檔的對應位置"""
+        headers = {"Range": f"bytes={start}-{end}", "Accept-Encoding": "identity"}
+        if validator:
+            headers["If-Range"] = validator
+
+        position = start
+        with session.get(
+            self.url, headers=headers, stream=True, timeout=60
+        ) as response:
+            if response.status_code != 206:
+                raise requests.RequestException(
+                    f"分段 {start}-{end} 未回傳 206 (HTTP {response.status_code}), "
+                    "來源可能在下載期間變更"
+                )
+            for block in response.iter_content(self.DOWNLOAD_BLOCK_SIZE):
+                os.pwrite(fd, block, position)
+                position += len(block)
+
+        if position != end + 1:
+            raise requests.RequestException(
+                f"分段 {start}-{end} 長度不符: 只收到 {position - start:,} bytes"
+            )
+
+        return position - start
+
+    def _compress_spool(self, plain_path: Path):
+        """將分段下載完成的明文檔壓縮成 spool 檔"""
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".part")
+        try:
+            with (
+                open(plain_path, "rb") as src,
+                self._open_spool_writer(tmp_path) as dst,
+            ):
+                shutil.copyfileobj(src, dst, self.DOWNLOAD_BLOCK_SIZE)
+            os.replace(tmp_path, self.cache_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _hash_stream(self, stream) -> str:
+        """計算串流內容 sha256"""
+        digest = hashlib.sha256()
+        while block := stream.read(self.DOWNLOAD_BLOCK_SIZE):
+            digest.update(block)
+        return digest.hexdigest()
+
+    def _expected_sha256(self, response: requests.Response) -> Optional[str]:
+        """從 Repr-Digest / Digest header 取出伺服器宣告的 sha256 (hex)"""
+        header = response.headers.get("Repr-Digest") or response.headers.get("Digest")
+        match = re.search(r"sha-256=:?([A-Za-z0-9+/=]+):?", header or "", re.IGNORECASE)
+        if not match:
+            return None
+        return base64.b64decode(match.group(1)).hex()
+
+    def _download(self, response: requests.Response) -> tuple:
+        """
+        串流寫入暫存檔並計算 sha256, 完成後再原子性地取代快取檔
+
+        iter_content 會依 Content-Encoding 邊收邊解壓, sha256 以解壓後內容計算,
+        寫入時再依 spool_compression 壓縮。
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".part")
+
+        try:
+            with self._open_spool_writer(tmp_path) as f:
+                for block in response.iter_content(self.DOWNLOAD_BLOCK_SIZE):
+                    f.write(block)
+                    digest.update(block)
+                    size += len(block)
+            os.replace(tmp_path, self.cache_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        return digest.hexdigest(), size
+
+    def _load_meta(self) -> dict:
+        """讀取快取 metadata, 不存在或損毀時視為無快取"""
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, meta: dict):
+        """寫入快取 metadata"""
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
     def _create_session(self) -> requests.Session:
         """建立帶重試機制的 Session"""
         session = requests.Session()
 
+        # 主動協商壓縮傳輸 (gzip / deflate, 有安裝時含 br / zstd)
+        session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
         retry = Retry(
             total=3,
             backoff_factor=1,
             status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET"],
+            allowed_methods=["GET", "HEAD"],
         )
 
-        adapter = HTTPAdapter(max_retries=retry)
+        # 連線池大小需涵蓋分段下載的並行數
+        adapter = HTTPAdapter(
+            max_retries=retry, pool_maxsize=max(10, self.download_workers)
+        )
         session.mount("http://", adapter)
         session.mount("https://", adapter)
 
@@ -0,0 +1,90 @@
+"""執行中 ETL 任務的心跳與互斥鎖模組"""
+
+import logging
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Generator
+
+from django.db import connection
+from django.db.models.functions import Now
+
+from core.tax_registration.models import ETLJobRun
+
+logger = logging.getLogger("tax_registration.etl")
+
+# pg advisory lock 的 key(同一資料庫內的所有 ETL 共用)
+ETL_LOCK_KEY = zlib.crc32(b"tax_registration.load_tax_registration")
+
+
+class Heartbeat:
+    """
+    背景執行緒每 interval 秒以一個 UPDATE 更新 ETLJobRun.updated_at
+
+    與批次處理無關, 單一批次跑很久(或 COPY 卡住)時仍會持續更新;
+    process 結束或被 kill 時心跳停止, 其他執行即可判定此任務已中斷。
+    執行緒使用自己的資料庫連線, 停止時關閉。
+    """
+
+    def __init__(self, job_run_id: int, interval: float = 30):
+        self.job_run_id = job_run_id
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="etl-heartbeat", daemon=True
+        )
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def beat(self):
+        """更新一次心跳時間"""
+        ETLJobRun.objects.filter(pk=self.job_run_id).update(updated_at=Now())
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    self.beat()
+                except Exception:
+                    # 資料庫暫時無法連線時不中斷 ETL, 下次再試
+                    logger.warning("心跳更新失敗", exc_info=True)
+                    connection.close()
+        finally:
+            connection.close()
+
+
+@contextmanager
+def etl_lock() -> Generator[bool, None, None]:
+    """
+    以 PostgreSQL session advisory lock 確保同時只有一個 ETL 在執行
+
+    鎖綁定在預設連線上, process 結束或連線中斷時由資料庫自動釋放, 不會殘留。
+    非 PostgreSQL 資料庫不支援, 一律視為取得。
+
+    Yields:
+        bool: 是否取得鎖(False 表示已有其他 ETL 正在執行)
+    """
+    if connection.vendor != "postgresql":
+        yield True
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [ETL_LOCK_KEY])
+        acquired = cursor.fetchone()[0]
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [ETL_LOCK_KEY])
+            except Exception:
+                # 連線已中斷時鎖已隨 session 釋放
+                logger.warning("釋放 ETL 鎖失敗", exc_info=True)
@@ -0,0 +1,212 @@
+"""本地 HTTP 測試伺服器模組"""
+
+import base64
+import hashlib
+import re
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Optional
+
+
+class LocalCSVServer:
+    """
+    以本地檔案模擬資料來源的 HTTP 伺服器
+
+    支援 Range / If-Range / ETag / If-None-Match / If-Modified-Since,
+    可在離線環境測試 CSVExtractor 的條件式下載、分段下載與斷點續傳。
+    """
+
+    BLOCK_SIZE = 1024 * 1024  # 1MB
+
+    def __init__(self, path: str, host: str = "127.0.0.1", port: int = 0):
+        self.path = Path(path)
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._digest_key: Optional[tuple] = None
+        self._digest = ""
+
+    @property
+    def url(self) -> str:
+        """檔案的下載網址"""
+        return f"http://{self.host}:{self._server.server_port}/{self.path.name}"
+
+    def start(self) -> "LocalCSVServer":
+        """在背景執行緒啟動伺服器"""
+        self._server = self._make_server()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self, ready: Optional[Callable[[str], None]] = None):
+        """
+        在前景執行伺服器(for management command)
+
+        Args:
+            ready (Optional[Callable[[str], None]]): 開始接受連線前以下載網址呼叫
+                (port 為 0 時才知道實際 port)
+        """
+        self._server = self._make_server()
+        if ready is not None:
+            ready(self.url)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def _make_server(self) -> ThreadingHTTPServer:
+        handler = type("Handler", (_CSVRequestHandler,), {"source": self})
+        return ThreadingHTTPServer((self.host, self.port), handler)
+
+    def stop(self):
+        """停止伺服器"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "LocalCSVServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def validators(self) -> dict:
+        """依檔案目前狀態產生 ETag / Last-Modified / Repr-Digest"""
+        stat = self.path.stat()
+        digest_key = (stat.st_size, stat.st_mtime_ns)
+
+        # 檔案沒變就沿用上次算好的 sha256
+        if self._digest_key != digest_key:
+            digest = hashlib.sha256()
+            with open(self.path, "rb") as f:
+                while block := f.read(self.BLOCK_SIZE):
+                    digest.update(block)
+            self._digest = base64.b64encode(digest.digest()).decode("ascii")
+            self._digest_key = digest_key
+
+        return {
+            "size": stat.st_size,
+            "mtime": int(stat.st_mtime),
+            "etag": f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+            "last_modified": formatdate(stat.st_mtime, usegmt=True),
+            "digest": f"sha-256=:{self._digest}:",
+        }
+
+
+class _CSVRequestHandler(BaseHTTPRequestHandler):
+    """處理 GET / HEAD, 單一 byte range 與條件式請求"""
+
+    source: LocalCSVServer
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def log_message(self, format, *args):
+        """測試用伺服器不輸出 access log"""
+
+    def _respond(self, send_body: bool):
+        if self.path.lstrip("/").split("?")[0] != self.source.path.name:
+            self.send_error(404)
+            return
+
+        meta = self.source.validators()
+
+        if self._not_modified(meta):
+            self.send_response(304)
+            self.send_header("ETag", meta["etag"])
+            self.send_header("Last-Modified", meta["last_modified"])
+            self.end_headers()
+            return
+
+        byte_range = self._requested_range(meta)
+        if byte_range == "invalid":
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{meta['size']}")
+            self.end_headers()
+            return
+
+        if byte_range is None:
+            start, end = 0, meta["size"] - 1
+            self.send_response(200)
+            self.send_header("Repr-Digest", meta["digest"])
+        else:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{meta['size']}")
+
+        length = max(0, end - start + 1)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", meta["etag"])
+        self.send_header("Last-Modified", meta["last_modified"])
+        self.end_headers()
+
+        if send_body:
+            self._send_file(start, length)
+
+    def _not_modified(self, meta: dict) -> bool:
+        """If-None-Match 優先, 其次 If-Modified-Since"""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return meta["etag"] in [tag.strip() for tag in if_none_match.split(",")]
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return meta["mtime"] <= since
+
+        return False
+
+    def _requested_range(self, meta: dict):
+        """解析 Range header, 返回 (start, end)、None(整份) 或 "invalid"(416)"""
+        header = self.headers.get("Range")
+        if not header:
+            return None
+
+        # If-Range 不符代表來源已變更, 依規範回傳整份檔案
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range not in (meta["etag"], meta["last_modified"]):
+            return None
+
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+        if not match or match.groups() == ("", ""):
+            return "invalid"
+
+        size = meta["size"]
+        first, last = match.groups()
+        if first == "":
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+
+        if start >= size or start > end:
+            return "invalid"
+        return start, end
+
+    def _send_file(self, start: int, length: int):
+        """從指定位置送出檔案內容"""
+        with open(self.source.path, "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                block = f.read(min(remaining, LocalCSVServer.BLOCK_SIZE))
+                if not block:
+                    break
+                try:
+                    self.wfile.write(block)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                remaining -= len(block)
@@ -1,38 +1,396 @@
 """資料載入模組"""
 
-import csv
-from io import StringIO
-from typing import List
+import io
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
+import numpy as np
 import pandas as pd
-from django.db import connection, transaction
+import pyarrow as pa
+import pyarrow.compute as pc
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DataError, IntegrityError, connection, transaction
 
-from core.tax_registration.models import BusinessIndustry
+from core.tax_registration.etl.dedupe import SeenBanSet
+
+# COPY 欄位 → binary COPY 時的 PostgreSQL 型別, 順序需與 DataFrame 欄位相同
+TAX_REGISTRATION_COLUMNS = {
+    "ban": "text",
+    "headquarters_ban": "text",
+    "business_name": "text",
+    "business_address": "text",
+    "capital_amount": "int8",
+    "business_setup_date": "text",
+    "business_type": "text",
+    "is_use_invoice": "bool",
+    "content_hash": "int8",
+}
+
+# business_industry 的 COPY 欄位, 與 _prepare_industry_records 的輸出欄位順序相同
+INDUSTRY_COLUMNS = {
+    "business_id": "text",
+    "industry_code": "text",
+    "industry_name": "text",
+    "order": "int2",
+}
+
+# 增量匯入用的暫存表(temp table, 只存在於本連線, 不寫 WAL)
+STAGE_TABLE = "tax_registration_stage"
+INDUSTRY_STAGE_TABLE = "business_industry_stage"
+CHANGED_TABLE = "tax_registration_changed"
+SEEN_TABLE = "tax_registration_seen"
+
+# COPY text 格式需跳脫的字元(反斜線須最先處理)
+COPY_ESCAPES = [("\\", "\\\\"), ("\t", "\\t"), ("\n", "\\n"), ("\r", "\\r")]
+
+# COPY text 每次從 CopyStream 讀取的 bytes 數
+COPY_READ_SIZE = 64 * 1024
+
+
+class CopyStream(io.RawIOBase):
+    """
+    將 DataFrame 逐段編碼成 COPY text 格式的唯讀串流
+
+    每次只編碼 block_size 筆, COPY 讀完一段才編碼下一段,
+    記憶體用量只和 block_size 有關, 與 chunk 大小無關。
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        block_size: int = 5000,
+        blank_as_null: Sequence[str] = (),
+    ):
+        self.df = df
+        self.block_size = block_size
+        self.blank_as_null = set(blank_as_null)
+        self._blocks = self.blocks()
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        """COPY 以 read(size) 讀取(兩種驅動皆同), 由 RawIOBase 轉呼叫此方法"""
+        while not self._buffer:
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._buffer = memoryview(block)
+
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def blocks(self) -> Generator[bytes, None, None]:
+        """依序產生每段已編碼的 bytes"""
+        for start in range(0, len(self.df), self.block_size):
+            yield self._encode(self.df.iloc[start : start + self.block_size])
+
+    def _encode(self, block: pd.DataFrame) -> bytes:
+        """
+        以 Arrow compute 編碼一段資料: 欄位以 tab 分隔, NULL 為 \\N, 特殊字元以反斜線跳脫
+
+        每列接上換行後, 字串陣列的資料 buffer 本身就是整段 COPY 內容, 不需再 join。
+        """
+        fields = []
+        for col in block.columns:
+            values = pc.cast(pa.array(block[col], from_pandas=True), pa.large_string())
+
+            if col in self.blank_as_null:
+                values = pc.if_else(pc.equal(values, ""), None, values)
+
+            if pc.any(pc.match_substring_regex(values, r"[\\\t\n\r]")).as_py():
+                for char, escaped in COPY_ESCAPES:
+                    values = pc.replace_substring(values, char, escaped)
+
+            fields.append(pc.fill_null(values, "\\N"))
+
+        tab, newline, empty = (
+            pa.scalar(c, pa.large_string()) for c in ("\t", "\n", "")
+        )
+        lines = pc.binary_join_element_wise(*fields, tab)
+        lines = pc.binary_join_element_wise(lines, newline, empty)
+
+        _, offsets, data = lines.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int64)
+        start, end = offsets[lines.offset], offsets[lines.offset + len(lines)]
+        return data.slice(start, end - start).to_pybytes()
 
 
 class BulkLoader:
-    """負責批次匯入資料到 PostgreSQL"""
+    """
+    負責批次匯入資料到 PostgreSQL
+
+    backend:
+        text: COPY text 格式, psycopg2 / psycopg 3 皆可
+        binary: COPY BINARY 格式, 依欄位型別直接寫入 int8 / bool, 需 psycopg 3
+            (DATABASE_DRIVER=psycopg)
+    """
+
+    BACKENDS = ["text", "binary"]
+
+    # 由個別資料列造成、值得以二分法找出問題列的錯誤(連線中斷等其他錯誤直接拋出)
+    ROW_ERRORS = (DataError, IntegrityError)
+
+    def __init__(
+        self,
+        batch_size: int = 5000,
+        backend: Optional[str] = None,
+        table_suffix: str = "",
+    ):
+        backend = backend or settings.ETL_LOADER_BACKEND
+        if backend not in self.BACKENDS:
+            raise ImproperlyConfigured(f"不支援的 loader backend: {backend}")
 
-    def __init__(self, batch_size: int = 5000):
         self.batch_size = batch_size
+        self.backend = backend
+        # 寫入影子表時為 "_next" (見 schema.ShadowTables)
+        self.table_suffix = table_suffix
 
-    def insert(self, df: pd.DataFrame) -> int:
+    def insert(
+        self, df: pd.DataFrame, timings: Optional[Dict[str, float]] = None
+    ) -> int:
         """
         匯入資料到資料庫
 
+        Args:
+            df (pd.DataFrame): 清理後的資料
+            timings (Optional[Dict[str, float]]): 若提供, 寫入 copy_seconds(主表)
+                與 industry_seconds(行業別)
+
+        Returns:
+            int: 主表寫入筆數
         """
+        timings = {} if timings is None else timings
+
         with transaction.atomic():
             # 準備並匯入主表
+            started = time.perf_counter()
             tax_records = self._prepare_tax_records(df)
             count = self._bulk_insert_copy(tax_records)
+            timings["copy_seconds"] = time.perf_counter() - started
 
             # 匯入行業資料
+            started = time.perf_counter()
             industry_records = self._prepare_industry_records(df)
-            if industry_records:
+            if not industry_records.empty:
                 self._bulk_insert_industries(industry_records)
+            timings["industry_seconds"] = time.perf_counter() - started
 
             return count
 
+    def load_bisecting(
+        self, df: pd.DataFrame, load: Callable[[pd.DataFrame], Any]
+    ) -> Tuple[List[Any], pd.DataFrame, List[str]]:
+        """
+        整批載入失敗後的補救: 以二分法切成子批次, 各自在 savepoint 中載入
+
+        成功的子批次全部保留, 失敗的子批次再對半切, 直到剩下單一資料列即為問題列。
+        k 筆問題資料約需 O(k log n) 次載入, 只有一筆時約 2 log2(n) 次。
+        全部在同一個交易中, 結束時一起 commit。
+
+        Args:
+            df (pd.DataFrame): 整批載入失敗的清理後資料
+            load (Callable[[pd.DataFrame], Any]): 載入一段資料的函式(insert / upsert)
+
+        Returns:
+            Tuple[List[Any], pd.DataFrame, List[str]]: (每個成功子批次的 load 返回值,
+            被拒絕的資料列, 各列的錯誤訊息)
+        """
+        results, rejected, messages = [], [], []
+
+        with transaction.atomic():
+            parts = [df]
+            while parts:
+                part = parts.pop()
+                try:
+                    with transaction.atomic():
+                        results.append(load(part))
+                except self.ROW_ERRORS as e:
+                    if len(part) == 1:
+                        rejected.append(part)
+                        messages.append(str(e).strip().splitlines()[0])
+                        continue
+                    # 後半段先放入, 先處理前半段(維持原本順序)
+                    middle = len(part) // 2
+                    parts.append(part.iloc[middle:])
+                    parts.append(part.iloc[:middle])
+
+        return results, pd.concat(rejected) if rejected else df.iloc[:0], messages
+
+    def upsert(
+        self, df: pd.DataFrame, timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, int]:
+        """
+        增量匯入: 先 COPY 進暫存表, 再以 set-based SQL 只寫入新增與內容雜湊不同的資料
+
+        行業別只替換有新增 / 更新的營業人, 未變更的資料不會產生任何寫入。
+
+        Args:
+            df (pd.DataFrame): 清理後的資料(含 content_hash)
+            timings (Optional[Dict[str, float]]): 同 insert(), 各包含暫存表 COPY
+                與合併 SQL 的時間
+
+        Returns:
+            Dict[str, int]: inserted / updated / unchanged 筆數
+        """
+        quote = connection.ops.quote_name
+        columns = [quote(col) for col in TAX_REGISTRATION_COLUMNS]
+        column_list = ", ".join(columns)
+        industry_list = ", ".join(quote(col) for col in INDUSTRY_COLUMNS)
+
+        timings = {} if timings is None else timings
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                self._create_stage_tables(cursor)
+
+            self.copy_frame(
+                self._prepare_tax_records(df),
+                STAGE_TABLE,
+                TAX_REGISTRATION_COLUMNS,
+                blank_as_null=["總機構統一編號"],
+            )
+
+            with connection.cursor() as cursor:
+                # xmax = 0 表示此列由 INSERT 產生, 否則為 ON CONFLICT 的 UPDATE;
+                # 雜湊相同的列不符合 WHERE, 不會被更新也不會出現在 RETURNING
+                cursor.execute(
+                    f"""
+                    WITH upserted AS (
+                        INSERT INTO tax_registration ({column_list})
+                        SELECT {column_list} FROM {STAGE_TABLE}
+                        ON CONFLICT (ban) DO UPDATE SET
+                            {", ".join(f"{col} = EXCLUDED.{col}" for col in columns[1:])},
+                            updated_at = now()
+                        WHERE tax_registration.content_hash
+                              IS DISTINCT FROM EXCLUDED.content_hash
+                        RETURNING ban, (xmax = 0) AS inserted
+                    )
+                    INSERT INTO {CHANGED_TABLE} SELECT ban, inserted FROM upserted
+                    """
+                )
+                cursor.execute(
+                    f"SELECT count(*) FILTER (WHERE inserted), "
+                    f"count(*) FILTER (WHERE NOT inserted) FROM {CHANGED_TABLE}"
+                )
+                inserted, updated = cursor.fetchone()
+            timings["copy_seconds"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            industry_records = self._prepare_industry_records(df)
+            if not industry_records.empty:
+                self.copy_frame(
+                    industry_records, INDUSTRY_STAGE_TABLE, INDUSTRY_COLUMNS
+                )
+
+            with connection.cursor() as cursor:
+                # 更新的營業人先刪除舊的行業別, 再由暫存表補上
+                cursor.execute(
+                    f"""
+                    DELETE FROM business_industry b USING {CHANGED_TABLE} c
+                    WHERE b.business_id = c.ban AND NOT c.inserted
+                    """
+                )
+                cursor.execute(
+                    f"""
+                    INSERT INTO business_industry ({industry_list})
+                    SELECT {", ".join(f"s.{quote(col)}" for col in INDUSTRY_COLUMNS)}
+                    FROM {INDUSTRY_STAGE_TABLE} s
+                    JOIN {CHANGED_TABLE} c ON c.ban = s.business_id
+                    """
+                )
+            timings["industry_seconds"] = time.perf_counter() - started
+
+        return {
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": len(df) - inserted - updated,
+        }
+
+    def delete_missing(self, seen: SeenBanSet) -> int:
+        """
+        刪除來源中已不存在的營業人(及其行業別)
+
+        Args:
+            seen (SeenBanSet): 整份來源的統一編號, 呼叫端須確認所有批次都已成功匯入
+
+        Returns:
+            int: 刪除筆數
+        """
+        bans = pd.DataFrame({"ban": seen.to_bans()})
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMP TABLE IF NOT EXISTS {SEEN_TABLE} (ban varchar(8))"
+                )
+                cursor.execute(f"TRUNCATE {SEEN_TABLE}")
+
+            self.copy_frame(bans, SEEN_TABLE, {"ban": "text"})
+
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {SEEN_TABLE}")
+                # business_industry 的外鍵沒有 ON DELETE CASCADE(由 Django 處理), 需先刪
+                cursor.execute(
+                    f"""
+                    DELETE FROM business_industry b
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {SEEN_TABLE} s WHERE s.ban = b.business_id
+                    )
+                    """
+                )
+                cursor.execute(
+                    f"""
+                    DELETE FROM tax_registration t
+                    WHERE NOT EXISTS (SELECT 1 FROM {SEEN_TABLE} s WHERE s.ban = t.ban)
+                    """
+                )
+                return cursor.rowcount
+
+    def _create_stage_tables(self, cursor):
+        """建立(或清空)本連線的暫存表"""
+        cursor.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE}
+            (LIKE tax_registration INCLUDING DEFAULTS)
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {INDUSTRY_STAGE_TABLE} (
+                business_id varchar(8),
+                industry_code varchar(20),
+                industry_name varchar(255),
+                "order" smallint
+            )
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {CHANGED_TABLE}
+            (ban varchar(8) PRIMARY KEY, inserted boolean)
+            """
+        )
+        # 不用 ON COMMIT DELETE ROWS: 外層若已有交易(例如 benchmark), commit 不會發生
+        cursor.execute(
+            f"TRUNCATE {STAGE_TABLE}, {INDUSTRY_STAGE_TABLE}, {CHANGED_TABLE}"
+        )
+
     def _prepare_tax_records(self, df: pd.DataFrame) -> pd.DataFrame:
         """準備 TaxRegistration 記錄"""
         return df[
@@ -45,82 +403,141 @@ class BulkLoader:
                 "設立日期",
                 "組織別名稱",
                 "使用統一發票",
+                "內容雜湊",
             ]
-        ].copy()
+        ]
 
     def _bulk_insert_copy(self, df: pd.DataFrame) -> int:
         """使用 PostgreSQL COPY 批次匯入"""
-        buffer = StringIO()
+        self.copy_frame(
+            df,
+            "tax_registration",
+            TAX_REGISTRATION_COLUMNS,
+            # 處理 NULL 值
+            blank_as_null=["總機構統一編號"],
+        )
 
-        df_ordered = df.copy()
+        return len(df)
 
-        # 處理 NULL 值
-        df_ordered["總機構統一編號"] = df_ordered["總機構統一編號"].replace(
-            {None: "\\N", "": "\\N"}
-        )
+    def _prepare_industry_records(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        將 4 組行業代號/名稱欄位 melt 成長表(business_id, 代號, 名稱, 順序)
 
-        # 寫入 CSV
-        df_ordered.to_csv(
-            buffer,
-            index=False,
-            header=False,
-            sep="\t",
-            na_rep="\\N",
-            quoting=csv.QUOTE_MINIMAL,
-            escapechar="\\",
-            doublequote=False,
-        )
-        buffer.seek(0)
-
-        # COPY 匯入
-        with connection.cursor() as cursor:
-            cursor.copy_from(
-                buffer,
-                "tax_registration",
-                sep="\t",
-                null="\\N",
-                columns=(
-                    "ban",
-                    "headquarters_ban",
-                    "business_name",
-                    "business_address",
-                    "capital_amount",
-                    "business_setup_date",
-                    "business_type",
-                    "is_use_invoice",
-                ),
+        移除空白代號, 同一營業人重複的代號只保留順序最前面的一筆
+        (對應 unique_business_industry)。
+        """
+        frames = []
+
+        # 處理最多 4 組行業, 如有未來有需要再添加
+        for order, suffix in enumerate(["", "1", "2", "3"], 1):
+            code_col = f"行業代號{suffix}" if suffix else "行業代號"
+            name_col = f"名稱{suffix}" if suffix else "名稱"
+
+            if code_col not in df.columns:
+                continue
+
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "business_id": df["統一編號"].to_numpy(),
+                        "industry_code": df[code_col].fillna("").to_numpy(),
+                        "industry_name": (
+                            df[name_col].fillna("").to_numpy()
+                            if name_col in df.columns
+                            else ""
+                        ),
+                        "order": order,
+                    }
+                )
             )
 
-        return len(df_ordered)
+        if not frames:
+            return pd.DataFrame(columns=list(INDUSTRY_COLUMNS))
 
-    def _prepare_industry_records(self, df: pd.DataFrame) -> List[BusinessIndustry]:
-        """準備行業記錄 for bulk insert"""
-        records = []
+        industries = pd.concat(frames, ignore_index=True)
+        industries = industries[industries["industry_code"] != ""]
 
-        for _, row in df.iterrows():
-            ban = row["統一編號"]
+        # concat 依順序排列, keep="first" 即保留順序最小的
+        return industries.drop_duplicates(
+            subset=["business_id", "industry_code"], keep="first"
+        )
 
-            # 處理最多 4 組行業, 如有未來有需要再添加
-            for i, suffix in enumerate(["", "1", "2", "3"], 1):
-                code_col = f"行業代號{suffix}" if suffix else "行業代號"
-                name_col = f"名稱{suffix}" if suffix else "名稱"
+    def _bulk_insert_industries(self, industries: pd.DataFrame):
+        """使用 PostgreSQL COPY 批次匯入行業資料"""
+        self.copy_frame(industries, "business_industry", INDUSTRY_COLUMNS)
 
-                if code_col in row and row[code_col]:
-                    records.append(
-                        BusinessIndustry(
-                            business_id=ban,
-                            industry_code=row[code_col],
-                            industry_name=row.get(name_col, ""),
-                            order=i,
-                        )
-                    )
+    def copy_frame(
+        self,
+        df: pd.DataFrame,
+        table: str,
+        columns: Dict[str, str],
+        blank_as_null: Sequence[str] = (),
+    ):
+        """將 DataFrame COPY 進資料表(欄位順序需與 columns 相同), 依 backend 選擇格式"""
+        table = connection.ops.quote_name(f"{table}{self.table_suffix}")
+        # 欄位名稱需加引號(business_industry.order 為保留字)
+        column_list = ", ".join(connection.ops.quote_name(col) for col in columns)
 
-        return records
+        # Django 不包裝 copy / copy_expert 的例外, 需自行轉成 DataError 等,
+        # load_bisecting 才能攔截 COPY 失敗
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            if self.backend == "binary":
+                self._copy_binary(
+                    cursor, df, table, column_list, columns, blank_as_null
+                )
+            else:
+                self._copy_text(cursor, df, table, column_list, blank_as_null)
 
-    def _bulk_insert_industries(self, records: List[BusinessIndustry]):
-        """批次匯入行業資料"""
-        BusinessIndustry.objects.bulk_create(
-            records,
-            batch_size=self.batch_size,
-            ignore_conflicts=True,
+    def _copy_text(self, cursor, df, table, column_list, blank_as_null):
+        """
+        以 COPY text 格式串流寫入
+
+        以 batch_size 筆為單位邊編碼邊送出, 不會先把整個 chunk 序列化到記憶體。
+        """
+        stream = CopyStream(df, self.batch_size, blank_as_null)
+        sql = (
+            f"COPY {table} ({column_list}) FROM STDIN "
+            f"WITH (FORMAT text, DELIMITER E'\\t', NULL '\\N')"
         )
+
+        # psycopg2
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, stream, size=COPY_READ_SIZE)
+            return
+
+        # psycopg 3: 同樣以 read(size) 讀取串流
+        with cursor.copy(sql) as copy:
+            while data := stream.read(COPY_READ_SIZE):
+                copy.write(data)
+
+    def _copy_binary(self, cursor, df, table, column_list, columns, blank_as_null):
+        """以 COPY BINARY 格式逐列寫入, 數值與布林不經文字轉換"""
+        if not hasattr(cursor, "copy"):
+            raise ImproperlyConfigured(
+                "binary loader backend 需要 psycopg 3 驅動 (DATABASE_DRIVER=psycopg)"
+            )
+
+        with cursor.copy(
+            f"COPY {table} ({column_list}) FROM STDIN (FORMAT BINARY)"
+        ) as copy:
+            copy.set_types(list(columns.values()))
+            for rows in self._typed_rows(df, blank_as_null):
+                for row in rows:
+                    copy.write_row(row)
+
+    def _typed_rows(
+        self, df: pd.DataFrame, blank_as_null: Sequence[str]
+    ) -> Generator[Iterable[tuple], None, None]:
+        """以 batch_size 筆為單位, 轉成 Python 原生型別的 tuple(NULL 為 None)"""
+        for start in range(0, len(df), self.batch_size):
+            block = df.iloc[start : start + self.batch_size]
+
+            columns = []
+            for col in block.columns:
+                values = block[col]
+                null = values.isna()
+                if col in blank_as_null:
+                    null |= values.eq("").fillna(False).astype(bool)
+                columns.append(values.astype(object).mask(null, None).tolist())
+
+            yield zip(*columns)
@@ -0,0 +1,202 @@
+"""記憶體量測模組"""
+
+import ctypes
+import ctypes.util
+import gc
+import os
+import resource
+import tracemalloc
+from typing import List, Optional
+
+import pyarrow as pa
+
+
+def current_rss() -> int:
+    """目前 RSS (bytes)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return peak_rss()
+
+
+def peak_rss() -> int:
+    """
+    RSS 高水位 (bytes)
+
+    Linux 讀 /proc 的 VmHWM, 可搭配 reset_peak_rss() 量測單一區段;
+    其他平台退回 getrusage 的 ru_maxrss(整個 process 的最大值)。
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss() -> bool:
+    """
+    將 RSS 高水位重設為目前 RSS (Linux 4.0+)
+
+    Returns:
+        bool: 是否重設成功, 失敗時 peak_rss() 為整個 process 的最大值
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def trim_heap() -> bool:
+    """
+    將已釋放但仍保留在 process 內的記憶體還給作業系統(glibc malloc_trim + Arrow memory pool)
+
+    量測 RSS 增量前先呼叫, 避免新配置重複利用舊的空閒記憶體而低估。
+
+    Returns:
+        bool: 是否成功呼叫 malloc_trim(非 glibc 平台為 False)
+    """
+    pa.default_memory_pool().release_unused()
+
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return False
+    try:
+        libc = ctypes.CDLL(libc_name)
+        libc.malloc_trim(0)
+    except (OSError, AttributeError):
+        return False
+    return True
+
+
+def monotonic_growth(values: List[int], threshold: int, noise: int = 0) -> int:
+    """
+    數列是否持續成長: 每一步都不下降(容許 noise 以內的波動)且總成長超過 threshold
+
+    Args:
+        values (List[int]): 依時間排序的用量 (bytes), 少於 3 個不判斷
+        threshold (int): 總成長需超過的量 (bytes)
+        noise (int): 每一步容許的下降量 (bytes)
+
+    Returns:
+        int: 持續成長時為總成長量, 否則為 0
+    """
+    if len(values) < 3:
+        return 0
+    if any(after < before - noise for before, after in zip(values, values[1:])):
+        return 0
+    growth = values[-1] - values[0]
+    return growth if growth > threshold else 0
+
+
+class MemoryTracker:
+    """
+    在 chunk 邊界記錄 RSS、Python heap(tracemalloc)與 Arrow memory pool 用量
+
+    每次 checkpoint 先 gc.collect() 並 trim_heap(), 留下的才是仍被參照的記憶體;
+    與上一個 checkpoint 比較列出成長最多的配置位置, 結束時可再與第一個 checkpoint
+    比較累計成長。tracemalloc 會明顯拖慢執行, 只在追查記憶體成長時開啟。
+    """
+
+    FRAMES = 1  # 以配置所在的程式行分組
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.records: List[dict] = []
+        self._started = False
+        self._first: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> "MemoryTracker":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.FRAMES)
+            self._started = True
+        return self
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        self._first = self._previous = None
+
+    def checkpoint(self, chunk_num: int) -> dict:
+        """記錄一個 chunk 結束時的用量, 返回此紀錄(含相對上一個 checkpoint 的成長位置)"""
+        gc.collect()
+        trim_heap()
+
+        snapshot = self._snapshot()
+        record = {
+            "chunk": chunk_num,
+            "rss": current_rss(),
+            "traced": tracemalloc.get_traced_memory()[0],
+            "arrow": pa.total_allocated_bytes(),
+            "growth": self._growth(snapshot, self._previous),
+        }
+        self.records.append(record)
+
+        if self._first is None:
+            self._first = snapshot
+        self._previous = snapshot
+        return record
+
+    def cumulative_growth(self) -> List[dict]:
+        """最後一個 checkpoint 相對第一個 checkpoint 成長最多的配置位置"""
+        return self._growth(self._previous, self._first)
+
+    def leaks(self, threshold: int, warmup: int = 1, noise: int = 1024 * 1024) -> dict:
+        """
+        各項用量(rss / traced / arrow)是否持續成長
+
+        Args:
+            threshold (int): 總成長需超過的量 (bytes)
+            warmup (int): 跳過的前幾個 checkpoint(快取、import 等一次性配置)
+            noise (int): 每一步容許的下降量 (bytes), 見 monotonic_growth
+
+        Returns:
+            dict: 持續成長且超過 threshold 的項目 → 成長量 (bytes)
+        """
+        records = self.records[warmup:]
+        found = {}
+        for key in ("rss", "traced", "arrow"):
+            growth = monotonic_growth(
+                [record[key] for record in records], threshold, noise
+            )
+            if growth:
+                found[key] = growth
+        return found
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        # 排除 tracemalloc、本模組的紀錄與 import 機制本身的配置
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ]
+        )
+
+    def _growth(
+        self,
+        snapshot: Optional[tracemalloc.Snapshot],
+        base: Optional[tracemalloc.Snapshot],
+    ) -> List[dict]:
+        if snapshot is None or base is None:
+            return []
+        # compare_to 依成長量的絕對值排序, 只取成長的部分
+        stats = [
+            stat for stat in snapshot.compare_to(base, "lineno") if stat.size_diff > 0
+        ]
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[: self.top]
+        ]
@@ -0,0 +1,107 @@
+"""多行程轉換模組: chunk 以 Arrow IPC 經共享記憶體交給 worker 行程"""
+
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from core.tax_registration.etl.transformer import TaxDataTransformer
+
+# Linux 的 /dev/shm 為 tmpfs(共享記憶體), 沒有時退回暫存目錄
+SHM_DIR = "/dev/shm"
+
+
+def shared_memory_dir() -> str:
+    """交接檔案的存放目錄"""
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return tempfile.gettempdir()
+
+
+def write_frame(df: pd.DataFrame, path: str):
+    """DataFrame 寫成 Arrow IPC stream(保留 index 與欄位型別, Arrow 字串欄不需轉換)"""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    """
+    以 memory map 讀回 write_frame 的檔案並刪除檔名
+
+    Arrow 欄位直接指向對應的記憶體(zero-copy), 刪除檔名後仍然有效,
+    DataFrame 釋放時才歸還。
+    """
+    try:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_stream(source).read_all()
+    finally:
+        os.unlink(path)
+    return table.to_pandas()
+
+
+def _transform_files(directory: str, chunk_num: int):
+    """worker 行程: 讀取 chunk, 轉換後寫出清理後資料與錯誤表"""
+    prefix = os.path.join(directory, str(chunk_num))
+    df_clean, errors = TaxDataTransformer().process(
+        read_frame(f"{prefix}.in.arrow"), chunk_num
+    )
+    write_frame(df_clean, f"{prefix}.clean.arrow")
+    write_frame(errors, f"{prefix}.errors.arrow")
+
+
+class ProcessTransformer:
+    """
+    以 worker 行程執行 TaxDataTransformer.process, 繞過 GIL 使用多核心
+
+    - 交接: 原始 chunk 與轉換結果都以 Arrow IPC 寫入共享記憶體(/dev/shm)的檔案,
+      行程之間只傳遞批次編號; 讀取端 memory map 後直接轉為 DataFrame, 不經 pickle
+    - worker 以 spawn 啟動: 呼叫端有資料庫連線與心跳、載入執行緒, fork 並不安全
+    - process() 會阻塞到結果回來, 由 LoadPipeline 的 transform 執行緒呼叫,
+      結果的順序由管線依批次編號保證
+
+    需以 with 使用, 結束時關閉行程池並刪除殘留的交接檔案。
+    """
+
+    def __init__(self, workers: int, directory: Optional[str] = None):
+        self.workers = max(workers, 1)
+        self.directory = directory or shared_memory_dir()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+
+    def __enter__(self) -> "ProcessTransformer":
+        self._tmp = tempfile.TemporaryDirectory(
+            prefix="etl-transform-", dir=self.directory
+        )
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        self._pool.shutdown(cancel_futures=True)
+        self._tmp.cleanup()
+
+    def process(
+        self, df: pd.DataFrame, chunk_num: int
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """同 TaxDataTransformer.process, 於 worker 行程執行"""
+        prefix = os.path.join(self._tmp.name, str(chunk_num))
+        try:
+            write_frame(df, f"{prefix}.in.arrow")
+            self._pool.submit(_transform_files, self._tmp.name, chunk_num).result()
+            return read_frame(f"{prefix}.clean.arrow"), read_frame(
+                f"{prefix}.errors.arrow"
+            )
+        finally:
+            # worker 失敗時可能留下部分檔案
+            for suffix in ["in", "clean", "errors"]:
+                try:
+                    os.unlink(f"{prefix}.{suffix}.arrow")
+                except FileNotFoundError:
+                    pass
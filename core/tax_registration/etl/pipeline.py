@@ -0,0 +1,188 @@
+"""管線化匯入模組: 讀取、轉換、載入三段重疊執行"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+import pandas as pd
+from django.db import connection
+
+_FAILED = object()
+
+
+class LoadPipeline:
+    """
+    管線化執行 ETL 批次
+
+    主執行緒讀取 chunk → transform 執行緒池 → 主執行緒依批次順序 screen(去重、記錄錯誤)
+    → load_workers 個載入執行緒, 各自使用一條資料庫連線同時 COPY。
+    transform 可再交給 worker 行程執行(見 etl.parallel.ProcessTransformer),
+    結果同樣依批次順序 screen。
+
+    轉換視窗與載入佇列都有上限, 載入跟不上時主執行緒阻塞在 put, 讀取與轉換隨之暫停
+    (backpressure), 同時在記憶體中的 chunk 數不超過
+    transform_workers * 2 + queue_size + load_workers。
+
+    載入完成的順序不固定, complete 仍依批次順序呼叫: 某批次要等之前的批次全部
+    完成(成功或失敗)才回報, 因此依 complete 記錄的進度可直接用於斷點續傳。
+
+    Callbacks:
+        transform(chunk_num, df) -> transformed: 於 transform 執行緒執行, 不可存取資料庫
+        screen(chunk_num, df, transformed) -> payload: 主執行緒、依批次順序;
+            返回 None 表示沒有需要載入的資料
+        load(chunk_num, payload) -> result: 於載入執行緒執行
+        complete(chunk_num, result): 主執行緒、依批次順序; 沒有載入時 result 為 None
+        fail(chunk_num, df, error): 主執行緒; df 為轉換失敗的原始資料或載入失敗的 payload,
+            要中止整個管線時直接 raise
+        setup(): 載入執行緒第一次載入前呼叫(例如設定 session 參數)
+    """
+
+    def __init__(
+        self,
+        transform: Callable[[int, pd.DataFrame], Any],
+        screen: Callable[[int, pd.DataFrame, Any], Any],
+        load: Callable[[int, Any], Any],
+        complete: Callable[[int, Any], None],
+        fail: Callable[[int, pd.DataFrame, Exception], None],
+        transform_workers: int = 1,
+        load_workers: int = 1,
+        queue_size: Optional[int] = None,
+        setup: Optional[Callable[[], None]] = None,
+    ):
+        self.transform = transform
+        self.screen = screen
+        self.load = load
+        self.complete = complete
+        self.fail = fail
+        self.transform_workers = max(transform_workers, 1)
+        self.load_workers = max(load_workers, 1)
+        self.queue_size = queue_size or self.load_workers
+        self.setup = setup
+
+        self._load_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self._done_queue: queue.Queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._order: deque = deque()  # 已 screen 的批次, 依批次順序等待回報
+        self._results: dict = {}
+        self._loading = 0  # 已送入載入佇列、尚未收到結果的批次數
+
+    def run(self, chunks: Iterable[Tuple[int, pd.DataFrame]]):
+        """執行到所有批次完成; fail 中止時停止其餘載入並重新拋出錯誤"""
+        loaders = [
+            threading.Thread(
+                target=self._load_worker, name=f"etl-loader-{i}", daemon=True
+            )
+            for i in range(self.load_workers)
+        ]
+        for thread in loaders:
+            thread.start()
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.transform_workers, thread_name_prefix="etl-transform"
+            ) as pool:
+                transforming: deque = deque()
+                for chunk_num, df in chunks:
+                    transforming.append(
+                        (chunk_num, df, pool.submit(self.transform, chunk_num, df))
+                    )
+                    # 視窗已滿時先處理最前面的批次, 讀取端因此暫停
+                    while len(transforming) >= self.transform_workers * 2:
+                        self._screen(*transforming.popleft())
+                    self._collect(block=False)
+
+                while transforming:
+                    self._screen(*transforming.popleft())
+
+            while self._loading:
+                self._collect(block=True)
+        finally:
+            self._stop(loaders)
+
+    def _screen(self, chunk_num: int, df: pd.DataFrame, future):
+        """取回轉換結果, 依批次順序 screen 後送入載入佇列(佇列已滿時阻塞)"""
+        self._order.append(chunk_num)
+        try:
+            transformed = future.result()
+        except Exception as e:
+            self._results[chunk_num] = _FAILED
+            self.fail(chunk_num, df, e)
+            self._advance()
+            return
+
+        payload = self.screen(chunk_num, df, transformed)
+        if payload is None:
+            self._results[chunk_num] = None
+            self._advance()
+            return
+
+        self._loading += 1
+        self._load_queue.put((chunk_num, payload))
+
+    def _collect(self, block: bool):
+        """處理載入執行緒回報的結果"""
+        while True:
+            try:
+                chunk_num, ok, value = self._done_queue.get(block=block)
+            except queue.Empty:
+                return
+
+            self._loading -= 1
+            if ok:
+                self._results[chunk_num] = value
+            else:
+                payload, error = value
+                self._results[chunk_num] = _FAILED
+                self.fail(chunk_num, payload, error)
+
+            self._advance()
+            block = False
+
+    def _advance(self):
+        """依批次順序回報已完成的批次, 直到遇到尚未完成的批次"""
+        while self._order and self._order[0] in self._results:
+            chunk_num = self._order.popleft()
+            result = self._results.pop(chunk_num)
+            if result is not _FAILED:
+                self.complete(chunk_num, result)
+
+    def _load_worker(self):
+        """載入執行緒: 使用自己的資料庫連線, 結束時關閉"""
+        ready = False
+        try:
+            while True:
+                item = self._load_queue.get()
+                if item is None:
+                    return
+
+                chunk_num, payload = item
+                if self._stopped.is_set():
+                    continue
+
+                try:
+                    if not ready and self.setup is not None:
+                        self.setup()
+                    ready = True
+                    self._done_queue.put(
+                        (chunk_num, True, self.load(chunk_num, payload))
+                    )
+                except Exception as e:
+                    self._done_queue.put((chunk_num, False, (payload, e)))
+        finally:
+            connection.close()
+
+    def _stop(self, loaders: list):
+        """丟棄尚未開始的載入, 等待進行中的載入結束"""
+        self._stopped.set()
+        while True:
+            try:
+                self._load_queue.get_nowait()
+            except queue.Empty:
+                break
+
+        for _ in loaders:
+            self._load_queue.put(None)
+        for thread in loaders:
+            thread.join()
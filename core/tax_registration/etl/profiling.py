@@ -0,0 +1,313 @@
+"""ETL 分階段效能剖析模組"""
+
+import cProfile
+import json
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Generator, Iterable, Iterator, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger("tax_registration.etl")
+
+
+class StageProfiler:
+    """
+    依階段(extract / transform / screen / load / tracker)剖析 ETL
+
+    每個階段寫出 <stage>.pstats, 全部階段合併為 stacks.collapsed(flamegraph.pl /
+    speedscope 可直接讀取), 兩種模式都會產生:
+    - cProfile(deterministic 為 True): 主執行緒上的每個階段各自累計;
+      stacks 由 cProfile 的呼叫關係換算, 權重為微秒
+    - 取樣(deterministic 為 False): 背景執行緒每 SAMPLE_INTERVAL 秒讀取各執行緒的 stack,
+      依該執行緒目前所在的階段歸類, 權重為取樣數; 管線化時 transform / load 執行緒也一併
+      取樣, pstats 由取樣結果換算(呼叫次數為取樣數)
+
+    兩者擇一: Python 3.12 起 cProfile 改用 sys.monitoring, 同時只能有一個 profiler 且記錄
+    整個 interpreter 的所有執行緒, 管線的各執行緒無法各自剖析; 與取樣執行緒同時執行時,
+    階段統計也會混入它的時間。
+    - 只剖析前 max_chunks 個批次, 之後 stage() 只剩一次比較, 可在正式執行時開啟
+
+    檔案寫入 output_dir, 另有 summary.json 記錄各階段耗時與 stacks 權重;
+    沒有任何資料的檔案不寫出。
+    """
+
+    SAMPLE_INTERVAL = 0.01  # 100 Hz
+    # 由 cProfile 換算 stacks 時, 小於階段總時間這個比例的呼叫路徑不展開
+    MIN_STACK_SHARE = 1e-4
+    MAX_STACK_DEPTH = 200
+
+    def __init__(
+        self,
+        output_dir: str,
+        max_chunks: Optional[int] = None,
+        deterministic: bool = True,
+    ):
+        self.output_dir = Path(output_dir)
+        self.max_chunks = max_chunks or None
+        self.deterministic = deterministic
+
+        self.seconds: Dict[str, float] = {}
+        # (階段, (最外層, ..., 最內層)) → 取樣數, 每層為 pstats 的 (檔名, 行號, 函式)
+        self.samples: Counter = Counter()
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._active: Dict[int, str] = {}  # thread id → 目前的階段
+        self._first_chunk: Optional[int] = None
+        self._chunks = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(
+            target=self._sample, name="etl-profiler", daemon=True
+        )
+
+    def start(self) -> "StageProfiler":
+        if not self.deterministic:
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        """停止取樣並寫出檔案"""
+        self._stopped.set()
+        if self._sampler.is_alive():
+            self._sampler.join()
+        self._write()
+
+    @contextmanager
+    def stage(self, name: str, chunk_num: int) -> Generator[None, None, None]:
+        """剖析一個批次的某個階段(超過 max_chunks 的批次不剖析)"""
+        if not self._profiling(chunk_num):
+            yield
+            return
+
+        thread_id = threading.get_ident()
+        profile = None
+        if self.deterministic and threading.current_thread() is threading.main_thread():
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+
+        self._active[thread_id] = name
+        started = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self._active.pop(thread_id, None)
+            with self._lock:
+                self.seconds[name] = (
+                    self.seconds.get(name, 0.0) + time.perf_counter() - started
+                )
+
+    def iterate(
+        self, name: str, chunks: Iterable[pd.DataFrame], first_chunk: int
+    ) -> Iterator[pd.DataFrame]:
+        """將讀取每個 chunk(generator 的 next)視為該批次的一個階段"""
+        iterator = iter(chunks)
+        chunk_num = first_chunk
+        while True:
+            with self.stage(name, chunk_num):
+                df = next(iterator, None)
+            if df is None:
+                # 最後一次 next 只是確認已讀完, 不算一個批次
+                self._chunks.discard(chunk_num)
+                return
+            yield df
+            chunk_num += 1
+
+    def top_functions(self, name: str, limit: int = 5) -> list:
+        """某階段累計時間(不含子呼叫)最多的函式: [(函式, 秒數), ...]"""
+        ranked: list = sorted(
+            ((self._label(func), data[2]) for func, data in self._stats(name).items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return ranked[:limit]
+
+    def _profiling(self, chunk_num: int) -> bool:
+        with self._lock:
+            if self._first_chunk is None:
+                self._first_chunk = chunk_num
+            if self.max_chunks is not None:
+                if chunk_num >= self._first_chunk + self.max_chunks:
+                    return False
+            self._chunks.add(chunk_num)
+            return True
+
+    def _sample(self):
+        """取樣執行緒: 只記錄正在某個階段中的執行緒(不含取樣執行緒本身)"""
+        while not self._stopped.wait(self.SAMPLE_INTERVAL):
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, name in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples[(name, self._stack(frame))] += 1
+
+    @staticmethod
+    def _stack(frame) -> tuple:
+        """frame 往外展開為 (最外層, ..., 最內層)"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def _stages(self) -> list:
+        """有剖析資料的階段"""
+        if self.deterministic:
+            return list(self._profiles)
+        return list(dict.fromkeys(name for name, _ in self.samples))
+
+    def _stats(self, name: str) -> dict:
+        """某階段 pstats 格式的統計: {函式: (cc, nc, tt, ct, {呼叫者: (cc, nc, tt, ct)})}"""
+        profile = self._profiles.get(name)
+        if profile is not None:
+            return pstats.Stats(profile).stats
+        return self._sampled_stats(name)
+
+    def _sampled_stats(self, name: str) -> dict:
+        """由取樣結果換算 pstats: 時間為取樣數 × SAMPLE_INTERVAL, 呼叫次數為取樣數"""
+        entries: dict = {}
+        for (stage, stack), count in self.samples.items():
+            if stage != name:
+                continue
+            seconds = count * self.SAMPLE_INTERVAL
+            for func in set(stack):
+                entry = entries.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+            entries[stack[-1]][2] += seconds
+
+            for caller, callee in set(zip(stack, stack[1:])):
+                edge = entries[callee][4].setdefault(caller, [0, 0, 0.0, 0.0])
+                edge[0] += count
+                edge[1] += count
+                edge[3] += seconds
+            if len(stack) > 1:
+                entries[stack[-1]][4][stack[-2]][2] += seconds
+
+        return {
+            func: (
+                cc,
+                nc,
+                tt,
+                ct,
+                {caller: tuple(edge) for caller, edge in callers.items()},
+            )
+            for func, (cc, nc, tt, ct, callers) in entries.items()
+        }
+
+    def _call_stacks(self, stats: dict) -> Counter:
+        """
+        由 cProfile 的呼叫關係換算 stack → 秒數
+
+        cProfile 只記錄直接呼叫者, 每個函式的時間依各呼叫者佔的累計時間比例分到
+        各條呼叫路徑(近似值); 遞迴呼叫不再展開。
+        """
+        children: dict = {}
+        for callee, (_, _, _, _, callers) in stats.items():
+            for caller, edge in callers.items():
+                children.setdefault(caller, []).append((callee, edge[3]))
+
+        roots = [func for func, data in stats.items() if not data[4]]
+        min_seconds = sum(stats[func][3] for func in roots) * self.MIN_STACK_SHARE
+        stacks: Counter = Counter()
+
+        def walk(path: tuple, func: tuple, seconds: float):
+            _, _, own, total, _ = stats[func]
+            ratio = seconds / total if total > 0 else 0.0
+            path = (*path, func)
+            stacks[path] += own * ratio
+            if len(path) >= self.MAX_STACK_DEPTH:
+                return
+            for callee, edge_seconds in children.get(func, []):
+                share = edge_seconds * ratio
+                if callee not in path and share > 0 and share >= min_seconds:
+                    walk(path, callee, share)
+
+        for func in roots:
+            walk((), func, stats[func][3])
+        return stacks
+
+    def _collapsed(self) -> Counter:
+        """collapsed 格式的 stacks: 「階段;最外層;...;最內層」→ 權重"""
+        collapsed: Counter = Counter()
+        if self.deterministic:
+            for name in self._stages():
+                for stack, seconds in self._call_stacks(self._stats(name)).items():
+                    weight = round(seconds * 1e6)
+                    if weight:
+                        collapsed[self._collapse(name, stack)] += weight
+        else:
+            for (name, stack), count in self.samples.items():
+                collapsed[self._collapse(name, stack)] += count
+        return collapsed
+
+    def _collapse(self, name: str, stack: tuple) -> str:
+        return ";".join([name, *(self._label(func) for func in stack)])
+
+    def _write(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        for name in self._stages():
+            profile = self._profiles.get(name)
+            if profile is not None:
+                profile.dump_stats(self.output_dir / f"{name}.pstats")
+                continue
+            stats = self._sampled_stats(name)
+            if stats:
+                # 與 cProfile.Profile.dump_stats 相同的格式, pstats / snakeviz 可直接讀取
+                with open(self.output_dir / f"{name}.pstats", "wb") as f:
+                    marshal.dump(stats, f)
+
+        collapsed = self._collapsed()
+        if collapsed:
+            with open(self.output_dir / "stacks.collapsed", "w", encoding="utf-8") as f:
+                for stack, weight in sorted(collapsed.items()):
+                    f.write(f"{stack} {weight}\n")
+        else:
+            logger.warning("效能剖析沒有任何 stack, 不寫出 stacks.collapsed")
+
+        weight_by_stage = Counter()
+        for stack, weight in collapsed.items():
+            weight_by_stage[stack.split(";", 1)[0]] += weight
+
+        summary = {
+            "chunks": sorted(self._chunks),
+            "stack_unit": "microseconds" if self.deterministic else "samples",
+            "stages": {
+                name: {
+                    "seconds": round(seconds, 3),
+                    "stack_weight": weight_by_stage.get(name, 0),
+                }
+                for name, seconds in self.seconds.items()
+            },
+        }
+        if not self.deterministic:
+            summary["sample_interval"] = self.SAMPLE_INTERVAL
+        with open(self.output_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        logger.info(
+            "效能剖析結果已寫入",
+            extra={"event": "profile_written", "path": str(self.output_dir)},
+        )
+
+    @staticmethod
+    def _label(func: Tuple[str, int, str]) -> str:
+        filename, line, function = func
+        if filename == "~":
+            return function
+        return f"{function} ({os.path.basename(filename)}:{line})"
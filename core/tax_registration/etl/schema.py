@@ -0,0 +1,329 @@
+"""資料表結構(索引 / 約束)查詢、bulk 載入設定與影子表交換模組"""
+
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+from django.db import connection, transaction
+
+logger = logging.getLogger("tax_registration.etl")
+
+# 全量重建時一起交換的資料表, 被參照的表需排在前面
+SWAP_TABLES = ["tax_registration", "business_industry"]
+
+
+class IndexDef(NamedTuple):
+    """非約束所屬的索引"""
+
+    name: str
+    definition: str  # pg_get_indexdef 結果
+
+
+class ConstraintDef(NamedTuple):
+    """資料表約束(不含 NOT NULL)"""
+
+    name: str
+    type: str  # p: 主鍵, u: 唯一, f: 外鍵, c: check, x: exclusion
+    definition: str  # pg_get_constraintdef 結果
+
+
+def secondary_indexes(cursor, table: str) -> List[IndexDef]:
+    """取得資料表上不屬於主鍵/唯一約束的索引"""
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid
+          )
+        ORDER BY i.relname
+        """,
+        [table],
+    )
+    return [IndexDef(*row) for row in cursor.fetchall()]
+
+
+def table_constraints(cursor, table: str) -> List[ConstraintDef]:
+    """取得資料表約束, 依主鍵、唯一、check、外鍵的順序(外鍵需在被參照的主鍵之後建立)"""
+    cursor.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'c', 'x', 'f')
+        ORDER BY CASE contype
+                     WHEN 'p' THEN 0 WHEN 'u' THEN 1 WHEN 'x' THEN 2
+                     WHEN 'c' THEN 3 ELSE 4
+                 END,
+                 conname
+        """,
+        [table],
+    )
+    return [ConstraintDef(*row) for row in cursor.fetchall()]
+
+
+def referencing_tables(cursor, table: str) -> List[str]:
+    """以外鍵參照此資料表的其他資料表"""
+    cursor.execute(
+        """
+        SELECT DISTINCT conrelid::regclass::text
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = %s::regclass AND conrelid <> confrelid
+        """,
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def rename_index_definition(definition: str, index: str, table: str) -> str:
+    """將 pg_get_indexdef 的索引名稱與資料表換成新的"""
+    match = re.match(
+        r"^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .*)$", definition
+    )
+    if not match:
+        raise ValueError(f"無法解析索引定義: {definition}")
+
+    create, rest = match.groups()
+    quote = connection.ops.quote_name
+    return f"{create} {quote(index)} ON {quote(table)} {rest}"
+
+
+def drop_indexes(cursor, indexes: List[IndexDef]):
+    """刪除索引(bulk 載入前, 避免 COPY 時逐筆維護)"""
+    for index in indexes:
+        cursor.execute(f"DROP INDEX IF EXISTS {connection.ops.quote_name(index.name)}")
+
+
+def build_indexes(
+    definitions: List[str], workers: int = 1, session: Optional[Dict[str, str]] = None
+):
+    """
+    執行 CREATE INDEX, workers > 1 時以多條連線同時建立
+
+    每個 CREATE INDEX 本身另可依 max_parallel_maintenance_workers 平行掃描。
+    Django 的連線以 thread 區分, 每個 worker thread 各自連線, 結束時關閉。
+    """
+    definitions = [
+        re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX IF NOT EXISTS ", d)
+        for d in definitions
+    ]
+
+    def build(definition: str):
+        try:
+            with connection.cursor() as cursor:
+                apply_session(cursor, session)
+                cursor.execute(definition)
+        finally:
+            connection.close()
+
+    if workers <= 1:
+        with connection.cursor() as cursor:
+            apply_session(cursor, session)
+            for definition in definitions:
+                cursor.execute(definition)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(build, definitions))
+
+
+def bulk_session_settings(
+    maintenance_work_mem: str, parallel_workers: int
+) -> Dict[str, str]:
+    """偏重吞吐量的 session 參數(只影響本連線)"""
+    return {
+        # COPY 的 commit 不等 WAL 落盤; 最壞情況是遺失最後幾筆交易, 不會損毀資料
+        "synchronous_commit": "off",
+        # 建索引的排序記憶體
+        "maintenance_work_mem": maintenance_work_mem,
+        # 單一 CREATE INDEX 可用的平行 worker 數
+        "max_parallel_maintenance_workers": str(parallel_workers),
+    }
+
+
+@contextmanager
+def bulk_session(session: Dict[str, str]):
+    """在預設連線上套用 session 參數, 結束時還原"""
+    with connection.cursor() as cursor:
+        apply_session(cursor, session)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name in session:
+                cursor.execute(f"RESET {name}")
+
+
+def apply_session(cursor, session: Optional[Dict[str, str]]):
+    """在 cursor 所屬連線上設定 session 參數"""
+    for name, value in (session or {}).items():
+        cursor.execute("SELECT set_config(%s, %s, false)", [name, value])
+
+
+class ShadowTables:
+    """
+    以影子表(<table>_next)進行零停機全量重建
+
+    1. create(): 建立結構相同、沒有索引與約束的 UNLOGGED 影子表
+    2. 匯入資料到影子表(讀取端仍看到完整的舊資料)
+    3. finalize(): 轉為 LOGGED, 一次建好約束與索引, ANALYZE
+    4. swap(): 在單一短交易中刪除舊表並把影子表、索引、約束改名為原名稱
+    """
+
+    SUFFIX = "_next"
+
+    def __init__(self, tables: Optional[List[str]] = None):
+        self.tables = tables or SWAP_TABLES
+        self._constraints: dict = {}
+        self._indexes: dict = {}
+
+    def name(self, table: str) -> str:
+        """影子表名稱"""
+        return f"{table}{self.SUFFIX}"
+
+    def create(self):
+        """依原資料表建立空的影子表, 並記下之後要重建的約束與索引"""
+        quote = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            for table in self.tables:
+                external = set(referencing_tables(cursor, table)) - set(self.tables)
+                if external:
+                    raise ValueError(
+                        f"{table} 被 {', '.join(sorted(external))} 參照, 無法交換"
+                    )
+
+                self._constraints[table] = table_constraints(cursor, table)
+                self._indexes[table] = secondary_indexes(cursor, table)
+
+            self.drop()
+            for table in self.tables:
+                # LIKE 只複製欄位、NOT NULL、預設值與 identity, 不含索引與約束
+                cursor.execute(
+                    f"CREATE UNLOGGED TABLE {quote(self.name(table))} "
+                    f"(LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING IDENTITY)"
+                )
+
+        logger.info(
+            "建立影子表",
+            extra={"event": "shadow_tables_created", "tables": self.tables},
+        )
+
+    def finalize(self, index_workers: int = 1, session: Optional[Dict] = None):
+        """影子表轉為 LOGGED 並建立約束、索引, 最後更新統計資訊"""
+        quote = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            for table in self.tables:
+                shadow = quote(self.name(table))
+                cursor.execute(f"ALTER TABLE {shadow} SET LOGGED")
+
+                for i, constraint in enumerate(self._constraints[table]):
+                    definition = self._shadow_references(constraint.definition)
+                    cursor.execute(
+                        f"ALTER TABLE {shadow} ADD CONSTRAINT "
+                        f"{quote(self._temp_name(table, 'c', i))} {definition}"
+                    )
+
+        build_indexes(
+            [
+                rename_index_definition(
+                    index.definition,
+                    self._temp_name(table, "i", i),
+                    self.name(table),
+                )
+                for table in self.tables
+                for i, index in enumerate(self._indexes[table])
+            ],
+            workers=index_workers,
+            session=session,
+        )
+
+        with connection.cursor() as cursor:
+            for table in self.tables:
+                cursor.execute(f"ANALYZE {quote(self.name(table))}")
+
+    def swap(self):
+        """刪除舊表並將影子表改為正式名稱(單一交易, 讀取端只會短暫等待鎖)"""
+        quote = connection.ops.quote_name
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # 不加 CASCADE: 若有 view 等其他物件相依, 寧可交換失敗也不要默默刪除
+            cursor.execute(
+                "DROP TABLE " + ", ".join(quote(table) for table in self.tables)
+            )
+
+            for table in self.tables:
+                cursor.execute(
+                    f"ALTER TABLE {quote(self.name(table))} RENAME TO {quote(table)}"
+                )
+
+                for i, constraint in enumerate(self._constraints[table]):
+                    cursor.execute(
+                        f"ALTER TABLE {quote(table)} RENAME CONSTRAINT "
+                        f"{quote(self._temp_name(table, 'c', i))} "
+                        f"TO {quote(constraint.name)}"
+                    )
+
+                for i, index in enumerate(self._indexes[table]):
+                    cursor.execute(
+                        f"ALTER INDEX {quote(self._temp_name(table, 'i', i))} "
+                        f"RENAME TO {quote(index.name)}"
+                    )
+
+                self._rename_sequences(cursor, table)
+
+        logger.info(
+            "影子表交換完成",
+            extra={"event": "shadow_tables_swapped", "tables": self.tables},
+        )
+
+    def drop(self):
+        """刪除影子表(失敗或重新開始時清理)"""
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DROP TABLE IF EXISTS "
+                + ", ".join(quote(self.name(table)) for table in self.tables)
+                + " CASCADE"
+            )
+
+    def _temp_name(self, table: str, kind: str, index: int) -> str:
+        """影子表上索引 / 約束的暫時名稱(交換後改回原名稱)"""
+        return f"{table}{self.SUFFIX}_{kind}{index}"
+
+    def _shadow_references(self, definition: str) -> str:
+        """外鍵若參照一起交換的資料表, 改為參照其影子表"""
+
+        def replace(match):
+            target = match.group(1).split(".")[-1].strip('"')
+            if target in self.tables:
+                return f"REFERENCES {connection.ops.quote_name(self.name(target))}("
+            return match.group(0)
+
+        return re.sub(r"REFERENCES (\S+?)\(", replace, definition)
+
+    def _rename_sequences(self, cursor, table: str):
+        """identity 欄位的 sequence 沿用影子表名稱, 改回 <table>_<欄位>_seq"""
+        quote = connection.ops.quote_name
+        cursor.execute(
+            """
+            SELECT s.relname, a.attname
+            FROM pg_depend d
+            JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+            JOIN pg_attribute a
+              ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+            WHERE d.refobjid = %s::regclass
+            """,
+            [table],
+        )
+        for sequence, column in cursor.fetchall():
+            if sequence == f"{table}_{column}_seq":
+                continue
+            cursor.execute(
+                f"ALTER SEQUENCE {quote(sequence)} "
+                f"RENAME TO {quote(f'{table}_{column}_seq')}"
+            )
@@ -0,0 +1,120 @@
+"""依吞吐量與記憶體自動調整 chunk 大小"""
+
+from typing import List, Optional
+
+
+class AdaptiveChunkSizer:
+    """
+    每個 chunk 結束後依量測結果決定下一個 chunk 的大小
+
+    - 記憶體: 以 (RSS 高水位 - chunk 開始時 RSS) / 筆數 估計每筆成本(取指數移動平均),
+      下一個 chunk 不超過 (budget - 目前 RSS) 可容納的筆數; 高水位超過 budget 的 90% 時直接減半
+    - 吞吐量: hill climbing, 調整後 rows/s 變好就繼續同方向, 變差就反向
+
+    實例可直接當作 CSVExtractor.fetch_chunks 的 chunk_size(每讀一個 chunk 呼叫一次)。
+
+    Args:
+        initial (int): 第一個 chunk 的筆數
+        memory_budget (int): process RSS 上限 (bytes)
+        minimum (Optional[int]): chunk 筆數下限, 預設 MIN_SIZE
+        maximum (Optional[int]): chunk 筆數上限, 預設 MAX_SIZE
+
+    Attributes:
+        MIN_SIZE: 預設的 chunk 筆數下限
+        MAX_SIZE: 預設的 chunk 筆數上限
+        STEP: 每次放大 / 縮小的倍數
+        TOLERANCE: rows/s 變化在此比例(5%)內視為持平
+        SMOOTHING: 每筆記憶體成本的移動平均權重
+    """
+
+    MIN_SIZE = 5000
+    MAX_SIZE = 500000
+    STEP = 1.5
+    TOLERANCE = 0.05
+    SMOOTHING = 0.5
+
+    def __init__(
+        self,
+        initial: int,
+        memory_budget: int,
+        minimum: Optional[int] = None,
+        maximum: Optional[int] = None,
+    ):
+        self.minimum = minimum or self.MIN_SIZE
+        self.maximum = maximum or self.MAX_SIZE
+        self.memory_budget = memory_budget
+        self.size = self._clamp(initial)
+
+        self.history: List[dict] = []
+        self._direction = 1
+        self._last_rate: Optional[float] = None
+        self._bytes_per_row: Optional[float] = None
+
+    def __call__(self) -> int:
+        return self.size
+
+    def observe(
+        self, chunk_num: int, rows: int, seconds: float, start_rss: int, peak_rss: int
+    ) -> int:
+        """
+        記錄一個 chunk 的量測結果並決定下一個 chunk 的大小
+
+        Args:
+            chunk_num (int): 批次編號
+            rows (int): 此 chunk 的筆數
+            seconds (float): 此 chunk 的處理耗時(含下一個 chunk 的讀取)
+            start_rss (int): chunk 開始時的 RSS (bytes)
+            peak_rss (int): 處理期間的 RSS 高水位 (bytes)
+
+        Returns:
+            int: 下一個 chunk 的筆數
+        """
+        if rows <= 0 or seconds <= 0:
+            return self.size
+
+        rate = rows / seconds
+        used = max(peak_rss - start_rss, 0) / rows
+        self._bytes_per_row = (
+            used
+            if self._bytes_per_row is None
+            else self.SMOOTHING * used + (1 - self.SMOOTHING) * self._bytes_per_row
+        )
+
+        self.history.append(
+            {
+                "chunk": chunk_num,
+                "size": self.size,
+                "rows": rows,
+                "rows_per_second": round(rate),
+                "peak_rss_mb": round(peak_rss / 1024 / 1024, 1),
+            }
+        )
+
+        if peak_rss > self.memory_budget * 0.9:
+            # 接近上限: 不論吞吐量先減半, 下一輪改為往小的方向試
+            self._direction = -1
+            self._last_rate = None
+            self.size = self._clamp(self.size // 2)
+            return self.size
+
+        if self._last_rate is not None and rate < self._last_rate * (
+            1 - self.TOLERANCE
+        ):
+            self._direction = -self._direction
+        self._last_rate = rate
+
+        factor = self.STEP if self._direction > 0 else 1 / self.STEP
+        self.size = min(
+            self._clamp(int(self.size * factor)), self._memory_limit(start_rss)
+        )
+        return self.size
+
+    def _memory_limit(self, current_rss: int) -> int:
+        """依每筆記憶體成本, 目前 RSS 之外的預算可容納的筆數"""
+        if not self._bytes_per_row:
+            return self.maximum
+        headroom = self.memory_budget * 0.9 - current_rss
+        return self._clamp(int(headroom / self._bytes_per_row))
+
+    def _clamp(self, size: int) -> int:
+        return max(self.minimum, min(self.maximum, size))
@@ -0,0 +1,402 @@
+"""BGMOPEN1 格式的合成資料產生模組(離線測試與效能測試用)"""
+
+import gzip
+import re
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+from core.tax_registration.etl.transformer import BAN_WEIGHTS
+
+# 財政部 BGMOPEN1.csv 的欄位與順序
+HEADER = [
+    "營業地址",
+    "統一編號",
+    "總機構統一編號",
+    "營業人名稱",
+    "資本額",
+    "設立日期",
+    "組織別名稱",
+    "使用統一發票",
+    "行業代號",
+    "名稱",
+    "行業代號1",
+    "名稱1",
+    "行業代號2",
+    "名稱2",
+    "行業代號3",
+    "名稱3",
+]
+
+DISTRICTS = {
+    "臺北市": [
+        "中正區",
+        "大同區",
+        "中山區",
+        "松山區",
+        "大安區",
+        "萬華區",
+        "信義區",
+        "內湖區",
+    ],
+    "新北市": ["板橋區", "三重區", "中和區", "永和區", "新莊區", "新店區", "汐止區"],
+    "桃園市": ["桃園區", "中壢區", "平鎮區", "八德區", "蘆竹區", "龜山區"],
+    "新竹市": ["東區", "北區", "香山區"],
+    "臺中市": ["中區", "西區", "北區", "西屯區", "南屯區", "北屯區", "豐原區"],
+    "臺南市": ["中西區", "東區", "安平區", "安南區", "永康區"],
+    "高雄市": ["新興區", "苓雅區", "鼓山區", "前鎮區", "三民區", "左營區", "鳳山區"],
+}
+ROADS = [
+    "中山路",
+    "中正路",
+    "民生路",
+    "民權路",
+    "復興路",
+    "忠孝東路",
+    "仁愛路",
+    "信義路",
+    "和平東路",
+    "建國北路",
+    "光復路",
+    "成功路",
+    "自由路",
+    "文化路",
+    "博愛路",
+    "五福路",
+]
+BRANDS = [
+    "永豐",
+    "大同",
+    "宏達",
+    "聯合",
+    "新光",
+    "金鼎",
+    "長榮",
+    "華新",
+    "順發",
+    "佳美",
+    "友信",
+    "昇陽",
+    "鴻福",
+    "泰安",
+    "志成",
+    "嘉新",
+    "明德",
+    "全民",
+    "福興",
+    "協和",
+]
+TRADES = [
+    "科技",
+    "電子",
+    "實業",
+    "貿易",
+    "國際",
+    "建設",
+    "營造",
+    "食品",
+    "生技",
+    "餐飲",
+    "物流",
+    "資訊",
+    "精密",
+    "光電",
+    "紡織",
+]
+# (組織別名稱, 名稱字尾, 比例); 分公司另外指定總機構
+ORGANIZATIONS = [
+    ("股份有限公司", ["股份有限公司"], 0.30),
+    ("有限公司", ["有限公司"], 0.36),
+    ("獨資", ["商行", "企業社", "工作室", "小吃店"], 0.25),
+    ("合夥", ["商行", "企業社"], 0.04),
+    ("分公司", ["股份有限公司"], 0.05),
+]
+INDUSTRIES = [
+    ("410011", "住宅營造"),
+    ("433011", "室內裝潢"),
+    ("456111", "食品什貨批發"),
+    ("464111", "電腦及其週邊設備批發"),
+    ("465911", "五金批發"),
+    ("472913", "化妝品零售"),
+    ("474001", "電腦及其週邊設備零售"),
+    ("481299", "其他綜合商品零售"),
+    ("494011", "汽車貨運"),
+    ("561111", "餐館"),
+    ("561211", "飲料店"),
+    ("620101", "電腦程式設計"),
+    ("683111", "不動產仲介"),
+    ("702099", "其他管理顧問"),
+    ("711911", "工程顧問"),
+    ("962011", "美髮"),
+]
+# 每家公司的行業組數 0 ~ 4 的比例
+INDUSTRY_COUNTS = [0.03, 0.50, 0.27, 0.14, 0.06]
+
+BAN_SPACE = 10**7  # 前 7 碼的組合數, 超過此筆數時統一編號會開始重複
+
+
+def valid_bans(rng: np.random.Generator, count: int) -> np.ndarray:
+    """產生檢查碼正確的隨機統一編號"""
+    digits = rng.integers(0, 10, (count, 7), dtype=np.uint8)
+    return _ban_strings(_with_check_digit(digits))
+
+
+def _with_check_digit(digits: np.ndarray) -> np.ndarray:
+    """由前 7 碼補上檢查碼(末碼權重為 1, 使加權和為 10 的倍數), 返回 8 碼的數字矩陣"""
+    products = digits * BAN_WEIGHTS[:7]
+    total = (products // 10 + products % 10).sum(axis=1)
+    check = ((10 - total % 10) % 10).astype(np.uint8)
+    return np.column_stack([digits, check]).astype(np.uint8)
+
+
+def _ban_strings(digits: np.ndarray) -> np.ndarray:
+    """數字矩陣轉為統一編號字串"""
+    return (digits + ord("0")).astype(np.uint8).view("S8").ravel().astype("U8")
+
+
+def _pick(values: list, indices: np.ndarray) -> pa.Array:
+    """依 indices 從 values 取值, 直接產生 Arrow 字串欄位"""
+    return pc.take(pa.array(values, type=pa.string()), pa.array(indices))
+
+
+def _join(*parts) -> pa.Array:
+    """逐列串接字串欄位(或常數)"""
+    return pc.binary_join_element_wise(*parts, "")
+
+
+def _to_string(values: np.ndarray) -> pa.Array:
+    return pc.cast(pa.array(values), pa.string())
+
+
+class SyntheticGenerator:
+    """
+    產生 BGMOPEN1 格式的合成資料
+
+    - 統一編號: 第 k 列的前 7 碼為 (a * k + b) mod 10^7(a 與 10^7 互質), 一千萬筆內不重複,
+      重複資料與總機構可直接由列號算出對應的統一編號, 不需保留之前的 chunk
+    - 各 chunk 的亂數以 (seed, 起始列號) 決定, 同樣的 seed 產生完全相同的資料
+    - invalid_ratio 比例的統一編號格式或檢查碼錯誤, duplicate_ratio 比例與之前某列重複
+    - 欄位以 Arrow compute 組成, 不經過 Python 字串物件
+    """
+
+    CHUNK_SIZE = 100000
+    # 與財政部檔案相同不加引號(產生的值不含逗號、引號與換行, 若有 pyarrow 會直接報錯)
+    WRITE_OPTIONS = pa_csv.WriteOptions(include_header=False, quoting_style="none")
+
+    def __init__(
+        self, seed: int = 0, invalid_ratio: float = 0.01, duplicate_ratio: float = 0.01
+    ):
+        self.seed = seed
+        self.invalid_ratio = invalid_ratio
+        self.duplicate_ratio = duplicate_ratio
+
+        rng = np.random.default_rng(seed)
+        self._scale = int(rng.integers(BAN_SPACE // 10, BAN_SPACE))
+        while self._scale % 2 == 0 or self._scale % 5 == 0:
+            self._scale += 1
+        self._offset = int(rng.integers(0, BAN_SPACE))
+
+        self._places = [
+            f"{city}{district}"
+            for city, names in DISTRICTS.items()
+            for district in names
+        ]
+        # 各組織別的名稱字尾攤平成一個清單, 以 (起點, 個數) 取用
+        self._suffixes = [
+            suffix for _, suffixes, _ in ORGANIZATIONS for suffix in suffixes
+        ]
+        sizes = np.array([len(suffixes) for _, suffixes, _ in ORGANIZATIONS])
+        self._suffix_sizes = sizes
+        self._suffix_starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self._org_weights = np.array([weight for _, _, weight in ORGANIZATIONS])
+
+    def ban_at(self, rows: np.ndarray) -> np.ndarray:
+        """第 rows 列(全域列號)原本的統一編號"""
+        return _ban_strings(self._ban_digits(rows))
+
+    def _ban_digits(self, rows: np.ndarray) -> np.ndarray:
+        first7 = (
+            self._scale * (rows.astype(np.int64) % BAN_SPACE) + self._offset
+        ) % BAN_SPACE
+        digits = first7[:, None] // 10 ** np.arange(6, -1, -1) % 10
+        return _with_check_digit(digits.astype(np.uint8))
+
+    def chunk(self, start: int, rows: int) -> pd.DataFrame:
+        """產生第 start 列起的 rows 筆資料, index 為全域列號"""
+        df = self.table(start, rows).to_pandas()
+        df.index = pd.RangeIndex(start, start + rows)
+        return df
+
+    def table(self, start: int, rows: int) -> pa.Table:
+        """產生第 start 列起的 rows 筆資料(Arrow table, 欄位依 HEADER 順序)"""
+        rng = np.random.default_rng([self.seed, start])
+        index = np.arange(start, start + rows)
+
+        source = index.copy()
+        duplicate = (rng.random(rows) < self.duplicate_ratio) & (index > 0)
+        source[duplicate] = self._earlier(rng, index[duplicate])
+
+        org = rng.choice(len(ORGANIZATIONS), rows, p=self._org_weights)
+        hq = np.full(rows, "", dtype="U8")
+        branch = (org == len(ORGANIZATIONS) - 1) & (index > 0)
+        hq[branch] = self.ban_at(self._earlier(rng, index[branch]))
+
+        columns = {
+            "營業地址": self._addresses(rng, rows),
+            "統一編號": pa.array(self._corrupt(rng, self._ban_digits(source))),
+            "總機構統一編號": pa.array(hq),
+            "營業人名稱": self._business_names(rng, org, branch),
+            "資本額": self._capitals(rng, org),
+            "設立日期": self._setup_dates(rng, rows),
+            "組織別名稱": _pick([org for org, _, _ in ORGANIZATIONS], org),
+            "使用統一發票": _pick(
+                ["Y", "N"], (rng.random(rows) >= 0.85).astype(np.int8)
+            ),
+        }
+
+        counts = rng.choice(len(INDUSTRY_COUNTS), rows, p=INDUSTRY_COUNTS)
+        picks = rng.integers(0, len(INDUSTRIES), (rows, 4))
+        codes = [code for code, _ in INDUSTRIES] + [""]
+        names = [name for _, name in INDUSTRIES] + [""]
+        for i, suffix in enumerate(["", "1", "2", "3"]):
+            # 沒有第 i 組行業時取最後的空字串
+            chosen = np.where(counts > i, picks[:, i], len(INDUSTRIES))
+            columns[f"行業代號{suffix}"] = _pick(codes, chosen)
+            columns[f"名稱{suffix}"] = _pick(names, chosen)
+
+        return pa.table([columns[name] for name in HEADER], names=HEADER)
+
+    def write_csv(
+        self,
+        path: str,
+        rows: int,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """
+        寫出 rows 筆資料的 CSV(副檔名 .gz 時以 gzip 壓縮)
+
+        Args:
+            path (str): 輸出檔案路徑, 上層目錄不存在時自動建立
+            rows (int): 資料筆數
+            progress (Optional[Callable[[int], None]]): 每寫完一個 chunk
+                呼叫 progress(已寫出筆數)
+
+        Returns:
+            int: 檔案大小 (bytes)
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        gzipped = path.suffix == ".gz"
+        schema = pa.schema([(name, pa.string()) for name in HEADER])
+
+        with open(path, "wb") as raw:
+            # gzip header 的時間戳固定為 0, 同一 seed 產生完全相同的檔案
+            f = (
+                gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0)
+                if gzipped
+                else raw
+            )
+            with f:
+                # pyarrow 的 header 一律加引號, 自行寫出
+                f.write((",".join(HEADER) + "\n").encode("utf-8"))
+                with pa_csv.CSVWriter(f, schema, write_options=self.WRITE_OPTIONS) as w:
+                    for start in range(0, rows, self.CHUNK_SIZE):
+                        size = min(self.CHUNK_SIZE, rows - start)
+                        w.write_table(self.table(start, size))
+                        if progress is not None:
+                            progress(start + size)
+
+        return path.stat().st_size
+
+    @staticmethod
+    def _earlier(rng: np.random.Generator, rows: np.ndarray) -> np.ndarray:
+        """每列隨機取一個更早的列號"""
+        return (rng.random(len(rows)) * rows).astype(np.int64)
+
+    def _corrupt(self, rng: np.random.Generator, digits: np.ndarray) -> np.ndarray:
+        """依 invalid_ratio 混入檢查碼錯誤、非數字與長度錯誤的統一編號"""
+        invalid = np.flatnonzero(rng.random(len(digits)) < self.invalid_ratio)
+        kinds = rng.integers(0, 3, len(invalid))
+
+        # 末碼 +1: 加權和差 1, 兩種合法規則都不會成立
+        checksum = invalid[kinds == 0]
+        digits[checksum, 7] = (digits[checksum, 7] + 1) % 10
+        # 末碼改為 X
+        digits[invalid[kinds == 1], 7] = ord("X") - ord("0")
+
+        bans = _ban_strings(digits)
+        # 只剩 7 碼(numpy 轉為較短的字串型別時截斷)
+        short = invalid[kinds == 2]
+        bans[short] = bans[short].astype("U7")
+        return bans
+
+    def _addresses(self, rng: np.random.Generator, rows: int) -> pa.Array:
+        floors = pc.if_else(
+            pa.array(rng.random(rows) < 0.4),
+            _join(_to_string(rng.integers(2, 20, rows)), "樓"),
+            "",
+        )
+        return _join(
+            _pick(self._places, rng.integers(0, len(self._places), rows)),
+            _pick(ROADS, rng.integers(0, len(ROADS), rows)),
+            _pick(["", "1段", "2段", "3段", "4段"], rng.integers(0, 5, rows)),
+            _to_string(rng.integers(1, 400, rows)),
+            "號",
+            floors,
+        )
+
+    def _business_names(
+        self, rng: np.random.Generator, org: np.ndarray, branch: np.ndarray
+    ) -> pa.Array:
+        rows = len(org)
+        suffix = self._suffix_starts[org] + rng.integers(0, self._suffix_sizes[org])
+        names = _join(
+            _pick(BRANDS, rng.integers(0, len(BRANDS), rows)),
+            _pick(TRADES, rng.integers(0, len(TRADES), rows)),
+            _pick(self._suffixes, suffix),
+        )
+        cities = _pick(list(DISTRICTS), rng.integers(0, len(DISTRICTS), rows))
+        return pc.if_else(pa.array(branch), _join(names, cities, "分公司"), names)
+
+    def _capitals(self, rng: np.random.Generator, org: np.ndarray) -> pa.Array:
+        """資本額: 公司較大、行號較小, 取到千元; 少數空白"""
+        capital = np.where(
+            org < 2,
+            rng.lognormal(15, 1.5, len(org)),
+            rng.lognormal(11.5, 1.0, len(org)),
+        )
+        capital = _to_string((capital // 1000 * 1000).astype(np.int64))
+        return pc.if_else(pa.array(rng.random(len(org)) < 0.01), "", capital)
+
+    @staticmethod
+    def _setup_dates(rng: np.random.Generator, rows: int) -> pa.Array:
+        """民國年 7 碼日期(YYYMMDD), 民國 40 ~ 114 年"""
+        years = rng.integers(40, 115, rows)
+        months = rng.integers(1, 13, rows)
+        days = rng.integers(1, 29, rows)
+        dates = _to_string(years * 10000 + months * 100 + days)
+        return pc.utf8_lpad(dates, 7, "0")
+
+
+def synthetic_chunk(
+    rows: int,
+    invalid_ratio: float = 0.1,
+    duplicate_ratio: float = 0.02,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """產生單一 chunk(效能測試用), 依比例混入格式錯誤與重複的統一編號"""
+    return SyntheticGenerator(seed, invalid_ratio, duplicate_ratio).chunk(0, rows)
+
+
+def row_count(value: str) -> int:
+    """筆數, 可用 k / M 表示(例如 10k、2.5M)"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", value.strip())
+    if not match:
+        raise ValueError(value)
+    number, unit = match.groups()
+    return int(float(number) * {"": 1, "k": 10**3, "m": 10**6}[unit.lower()])
@@ -6,12 +6,19 @@ from pathlib import Path
 from typing import List, Optional
 
 import pandas as pd
+from django.db import transaction
 from django.utils import timezone
 
+from django.conf import settings
+
+from core.tax_registration.etl.dedupe import SeenBanSet
+from core.tax_registration.etl.errors import ErrorSink
 from core.tax_registration.models import (
+    ChunkMetric,
     ETLJobRun,
-    DataImportError,
     ImportProgress,
+    SeenBanDelta,
+    TaxRegistration,
 )
 
 
@@ -21,6 +28,9 @@ logger = logging.getLogger("tax_registration.etl")
 class ETLTracker:
     """負責 ETL 執行狀態、進度追蹤、錯誤記錄"""
 
+    # 批次指標累積到這個數量才寫入一次
+    METRICS_FLUSH_SIZE = 20
+
     def __init__(
         self,
         batch_size: int,
@@ -34,13 +44,33 @@ class ETLTracker:
         self.dry_run = dry_run
 
         self.job_run: Optional[ETLJobRun] = None
+        self.error_sink: Optional[ErrorSink] = None
         self.start_time: Optional[datetime] = None
+        self.source_hash: Optional[str] = None
+        self.resume_progress: Optional[ImportProgress] = None
+        # 本次匯入已載入的統一編號, 用於跨批次去重(dry-run 不寫 checkpoint, 不需記錄變化量)
+        self.seen_bans = SeenBanSet(track_changes=not dry_run)
+        # 載入時被排除的統一編號: 仍出現在來源中, 只供 --delete-missing 保留既有資料,
+        # 不加入去重集合(之後同一統一編號的有效資料照常載入)
+        self.rejected_bans = SeenBanSet(track_changes=not dry_run)
+        # 自動調整 chunk 大小的紀錄(見 etl.sizing.AdaptiveChunkSizer.history)
+        self.chunk_sizes: List[dict] = []
+        # 每批次的效能指標(欄位同 ChunkMetric), 摘要時計算百分位數
+        self.chunk_metrics: List[dict] = []
+        self._pending_metrics: List[ChunkMetric] = []
         self.stats = {
             "total": 0,
             "success": 0,
             "failed": 0,
             "duplicates": 0,
+            # 資料仍會匯入的警告筆數(見 transformer.WARNING_TYPES)
+            "warnings": 0,
             "skipped": 0,
+            # 增量匯入的異動筆數
+            "inserted": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "deleted": 0,
         }
 
     def start(self) -> ETLJobRun:
@@ -52,6 +82,12 @@ class ETLTracker:
             chunk_size=self.chunk_size,
             data_source_url=self.data_source_url,
         )
+        self.error_sink = ErrorSink(
+            self.job_run.id, settings.ETL_ERROR_DB_LIMIT, settings.ETL_ERROR_DIR
+        )
+        if self.resume_progress is not None:
+            # 續傳前的批次不會重新處理, 錯誤筆數從上次 checkpoint 接續
+            self.error_sink.resume(self.resume_progress.job_run.error_counts)
 
         logger.info(
             "ETL 任務開始",
@@ -73,9 +109,24 @@ class ETLTracker:
         self.job_run.records_processed = self.stats["success"]
         self.job_run.records_failed = self.stats["failed"]
         self.job_run.records_duplicated = self.stats["duplicates"]
+        self.job_run.records_inserted = self.stats["inserted"]
+        self.job_run.records_updated = self.stats["updated"]
+        self.job_run.records_unchanged = self.stats["unchanged"]
+        self.job_run.records_deleted = self.stats["deleted"]
+        self.job_run.chunk_sizes = self.chunk_sizes
         self.job_run.completed_at = timezone.now()
+        self.flush_chunk_metrics()
+        self._flush_errors()
+
+        # 只有整份來源都成功載入才記錄雜湊, 否則下次不可略過
+        if self.source_hash and self.stats["skipped"] == 0:
+            self.job_run.source_hash = self.source_hash
+
         self.job_run.save()
 
+        # 成功的任務不會再續傳, 去重集合的 checkpoint 不再需要
+        SeenBanDelta.objects.filter(progress__job_run=self.job_run).delete()
+
         logger.info(
             "ETL 任務完成",
             extra={
@@ -92,7 +143,14 @@ class ETLTracker:
         """標記 ETL 失敗"""
         self.job_run.status = "failed"
         self.job_run.error_message = str(error)
+        self.job_run.chunk_sizes = self.chunk_sizes
         self.job_run.completed_at = timezone.now()
+        try:
+            self.flush_chunk_metrics()
+            self._flush_errors()
+        except Exception:
+            # 不蓋掉原本的錯誤, 任務狀態仍需記錄
+            logger.exception("批次指標 / 錯誤紀錄寫入失敗")
         self.job_run.save()
 
         logger.exception(
@@ -104,51 +162,220 @@ class ETLTracker:
             },
         )
 
-    def record_errors(self, errors: List[dict], chunk_num: int):
-        """記錄錯誤到資料庫"""
-        if not errors:
-            return
+    def skip(self, reason: str) -> ETLJobRun:
+        """記錄一筆略過的 ETL Job (來源未變更時不做任何寫入)"""
+        now = timezone.now()
+        self.job_run = ETLJobRun.objects.create(
+            status="skipped",
+            batch_size=self.batch_size,
+            chunk_size=self.chunk_size,
+            data_source_url=self.data_source_url,
+            source_hash=self.source_hash or "",
+            error_message=reason,
+            completed_at=now,
+        )
+
+        logger.info(
+            "ETL 任務略過",
+            extra={
+                "event": "etl_skipped",
+                "job_run_id": self.job_run.id,
+                "source_hash": self.source_hash,
+                "reason": reason,
+            },
+        )
+
+        return self.job_run
+
+    def defer_indexes(self, indexes: List[dict]):
+        """記錄 bulk 載入暫時刪除的索引, 中斷時下次執行可據此重建"""
+        self.job_run.deferred_indexes = indexes
+        self.job_run.save(update_fields=["deferred_indexes", "updated_at"])
+
+    def clear_deferred_indexes(self):
+        """索引已重建"""
+        self.job_run.deferred_indexes = []
+        self.job_run.save(update_fields=["deferred_indexes", "updated_at"])
+
+    def take_pending_indexes(self) -> List[dict]:
+        """取出先前中斷的任務尚未重建的索引, 並從那些任務移除"""
+        pending = []
+        jobs = ETLJobRun.objects.exclude(deferred_indexes=[])
+        if self.job_run is not None:
+            jobs = jobs.exclude(pk=self.job_run.pk)
+
+        for job in jobs:
+            pending.extend(job.deferred_indexes)
+            job.deferred_indexes = []
+            job.save(update_fields=["deferred_indexes"])
+
+        return pending
+
+    def is_source_loaded(self, source_hash: str) -> bool:
+        """最近一次成功的完整匯入是否就是這份來源"""
+        last_success = (
+            ETLJobRun.objects.filter(status="success").order_by("-started_at").first()
+        )
+        return bool(last_success and last_success.source_hash == source_hash)
+
+    def record_errors(self, errors: pd.DataFrame, chunk_num: int):
+        """
+        記錄錯誤(errors 為 transformer 產生的錯誤表, 已含批次編號)
 
-        error_records = [
-            DataImportError(
+        交給 ErrorSink 跨批次緩衝後一次寫入, 不設每批次上限。
+        """
+        self.error_sink.add(errors, chunk_num)
+
+    def _flush_errors(self):
+        """寫出剩餘的錯誤並記錄各類型筆數"""
+        self.error_sink.flush()
+        self.job_run.error_counts = self.error_sink.counts
+        if self.error_sink.sidecar_path is not None:
+            self.job_run.error_file = str(self.error_sink.sidecar_path)
+
+    def record_chunk_metrics(self, metrics: dict):
+        """記錄一個批次的效能指標, 累積 METRICS_FLUSH_SIZE 筆後一次寫入"""
+        self.chunk_metrics.append(metrics)
+        self._pending_metrics.append(ChunkMetric(job_run=self.job_run, **metrics))
+        if len(self._pending_metrics) >= self.METRICS_FLUSH_SIZE:
+            self.flush_chunk_metrics()
+
+    def flush_chunk_metrics(self):
+        """寫入尚未儲存的批次指標"""
+        if self._pending_metrics:
+            ChunkMetric.objects.bulk_create(self._pending_metrics)
+            self._pending_metrics = []
+
+    def update_progress(self, chunk_num: int, chunk_range: Optional[tuple] = None):
+        """
+        更新處理進度
+
+        Args:
+            chunk_num (int): 已成功的批次編號
+            chunk_range (Optional[tuple]): extractor 提供的
+                (起始 byte, 結束 byte, 起始列號, 筆數)
+        """
+        # 續傳會略過此批次(含)之前的批次, 它們的錯誤需先寫出並記下筆數
+        self.job_run.error_counts = self.error_sink.checkpoint(chunk_num)
+        if self.error_sink.sidecar_path is not None:
+            self.job_run.error_file = str(self.error_sink.sidecar_path)
+        self.job_run.save(update_fields=["error_counts", "error_file", "updated_at"])
+
+        # 去重集合只寫入本批次的增量, 與筆數在同一個交易中, 還原時才能驗證完整
+        with transaction.atomic():
+            progress, _ = ImportProgress.objects.get_or_create(
                 job_run=self.job_run,
+                defaults={"total_batches": 0, "source_hash": self.source_hash or ""},
+            )
+            SeenBanDelta.objects.create(
+                progress=progress,
                 batch_number=chunk_num,
-                error_type=err["type"],
-                error_message=err["message"],
-                raw_data=err,
+                bans=self.seen_bans.take_added(),
+                rejected_bans=self.rejected_bans.take_added(),
             )
-            for err in errors[
-                :100
-            ]  # Limit recording 100 errors to prevent stressful db write
-        ]  # If it's over 100 error then it indicates the raw data is problematic
-
-        DataImportError.objects.bulk_create(error_records, ignore_conflicts=True)
-
-    def update_progress(self, chunk_num: int):
-        """更新處理進度"""
-        progress, _ = ImportProgress.objects.get_or_create(
-            job_run=self.job_run,
-            defaults={"total_batches": 0},
-        )
 
-        progress.last_successful_batch = chunk_num
-        progress.current_batch = chunk_num
-        progress.save()
+            progress.last_successful_batch = chunk_num
+            progress.current_batch = chunk_num
+            if chunk_range is not None:
+                progress.chunk_index[str(chunk_num)] = list(chunk_range)
+            progress.seen_ban_count = len(self.seen_bans)
+            progress.rejected_ban_count = len(self.rejected_bans)
+            progress.save()
 
     def get_resume_batch(self) -> int:
-        """取得斷點續傳的起始批次"""
-        try:
-            last_job = ETLJobRun.objects.latest("started_at")
+        """取得斷點續傳的起始批次(去重集合無法還原時直接拋出, 不從空集合續傳)"""
+        last_job = ETLJobRun.objects.order_by("-started_at").first()
 
-            if last_job.status == "running":
-                progress = ImportProgress.objects.filter(job_run=last_job).first()
-                if progress:
-                    return progress.last_successful_batch + 1
-        except Exception:
-            pass
+        if last_job is not None and last_job.status == "running":
+            progress = ImportProgress.objects.filter(job_run=last_job).first()
+            if progress:
+                self.resume_progress = progress
+                self.seen_bans = self._restore_seen_bans(progress)
+                self.rejected_bans = self._restore_rejected_bans(progress)
+                return progress.last_successful_batch + 1
 
         return 1
 
+    def _restore_seen_bans(self, progress: ImportProgress) -> SeenBanSet:
+        """
+        還原跨批次去重集合
+
+        依序重放各批次的增量, 筆數與 checkpoint 不符時拋出 ValueError:
+        從不完整的集合續傳, 之後的 --delete-missing 會誤刪仍存在的資料。
+        舊版 checkpoint 沒有筆數, 改由已載入的資料重建。
+        還原的統一編號都算作變化量, 本次任務第一個 checkpoint 會完整寫入一次。
+        """
+        track_changes = not self.dry_run
+        if progress.seen_ban_count is None:
+            return SeenBanSet.from_bans(
+                TaxRegistration.objects.values_list("ban", flat=True).iterator(
+                    chunk_size=100000
+                ),
+                track_changes=track_changes,
+            )
+
+        return self._replay_deltas(
+            progress, "bans", progress.seen_ban_count, "去重集合", track_changes
+        )
+
+    def _restore_rejected_bans(self, progress: ImportProgress) -> SeenBanSet:
+        """
+        還原載入失敗的統一編號, 筆數與 checkpoint 不符時拋出 ValueError
+
+        舊版 checkpoint 沒有記錄, 視為空集合(它們的既有資料已在資料庫中,
+        由 _restore_seen_bans 的重建一併保留)。
+        """
+        track_changes = not self.dry_run
+        if progress.rejected_ban_count is None:
+            return SeenBanSet(track_changes=track_changes)
+
+        return self._replay_deltas(
+            progress,
+            "rejected_bans",
+            progress.rejected_ban_count,
+            "載入失敗統一編號",
+            track_changes,
+        )
+
+    @staticmethod
+    def _replay_deltas(
+        progress: ImportProgress,
+        field: str,
+        expected: int,
+        label: str,
+        track_changes: bool,
+    ) -> SeenBanSet:
+        """依批次順序重放 SeenBanDelta 的某個欄位, 並以 checkpoint 的筆數驗證"""
+        seen = SeenBanSet.from_deltas(
+            progress.seen_ban_deltas.exclude(**{field: None})
+            .order_by("batch_number")
+            .values_list(field, flat=True)
+            .iterator(),
+            track_changes=track_changes,
+        )
+        if len(seen) != expected:
+            raise ValueError(
+                f"{label} checkpoint 不完整: 應有 {expected:,} 筆, 還原 {len(seen):,} 筆"
+            )
+        return seen
+
+    def get_resume_offset(self, source_hash: Optional[str]) -> tuple:
+        """
+        取得續傳批次在來源檔中的 (byte 位置, 起始列號)。
+
+        來源已變更或沒有位移索引時返回 (None, 0), 由呼叫端退回逐批跳過。
+        """
+        progress = self.resume_progress
+        if progress is None or not source_hash or progress.source_hash != source_hash:
+            return None, 0
+
+        last_range = progress.chunk_index.get(str(progress.last_successful_batch))
+        if not last_range:
+            return None, 0
+
+        _, end_byte, first_row, rows = last_range
+        return end_byte, first_row + rows
+
     def save_error_batch(self, df: pd.DataFrame, chunk_num: int, error: str):
         """儲存錯誤批次資料到 CSV"""
         error_file = (
@@ -173,6 +400,19 @@ class ETLTracker:
         """增加失敗筆數"""
         self.stats["failed"] += count
 
+    def add_warnings(self, count: int):
+        """增加警告筆數(資料仍會匯入)"""
+        self.stats["warnings"] += count
+
     def add_duplicates(self, count: int):
         """增加重複筆數"""
         self.stats["duplicates"] += count
+
+    def add_skipped(self, count: int):
+        """增加因批次失敗而略過的筆數"""
+        self.stats["skipped"] += count
+
+    def add_changes(self, changes: dict):
+        """累加增量匯入的 inserted / updated / unchanged / deleted 筆數"""
+        for key, count in changes.items():
+            self.stats[key] += count
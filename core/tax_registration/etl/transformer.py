@@ -1,7 +1,91 @@
 """資料轉換與驗證模組"""
 
+import numpy as np
 import pandas as pd
-from typing import Tuple, List
+from typing import Tuple
+
+from core.tax_registration.etl.dedupe import SeenBanSet
+
+# 錯誤表欄位: 錯誤類型, 批次, 統一編號, 原始列號, 訊息
+ERROR_COLUMNS = ["type", "batch", "ban", "row", "message"]
+
+# 只是警告的錯誤類型: 該筆資料仍會匯入, 不計入失敗筆數
+WARNING_TYPES = {"HQ_INVALID_BAN", "HQ_INVALID_BAN_CHECKSUM"}
+
+# 統一編號檢查碼權重
+BAN_WEIGHTS = np.array([1, 2, 1, 2, 1, 2, 4, 1], dtype=np.uint8)
+
+# 計算內容雜湊的欄位(清理後), 任一欄變更即視為該筆資料有異動
+CONTENT_COLUMNS = [
+    "統一編號",
+    "總機構統一編號",
+    "營業人名稱",
+    "營業地址",
+    "資本額",
+    "設立日期",
+    "組織別名稱",
+    "使用統一發票",
+    "行業代號",
+    "名稱",
+    "行業代號1",
+    "名稱1",
+    "行業代號2",
+    "名稱2",
+    "行業代號3",
+    "名稱3",
+]
+
+# 計算內容雜湊前統一的欄位型別: 雜湊值依型別而異(例如 bool 與 object),
+# 同一筆資料不論與哪些資料同批都需得到相同雜湊; nullable 型別在非 NULL 時
+# 與 numpy 型別的雜湊相同, 缺少的欄位仍為 NULL
+CONTENT_DTYPES = {column: "str" for column in CONTENT_COLUMNS} | {
+    "資本額": "Int64",
+    "使用統一發票": "boolean",
+}
+
+
+def ban_checksum_valid(bans: pd.Series) -> np.ndarray:
+    """
+    向量化驗證統一編號檢查碼
+
+    各位數乘上權重後取乘積的十位數與個位數相加, 總和可被 5 整除即為有效
+    (2023 年起由 10 放寬為 5)。第 7 位為 7 時乘積 28 → 10, 可視為 0 或 1,
+    因此總和 +1 後可被 5 整除也算有效。非 8 位 ASCII 數字一律視為無效。
+
+    Args:
+        bans (pd.Series): 統一編號字串
+
+    Returns:
+        np.ndarray: 與 bans 等長的 bool 陣列
+    """
+    valid = np.zeros(len(bans), dtype=bool)
+    well_formed = bans.str.fullmatch(r"[0-9]{8}").fillna(False).to_numpy(dtype=bool)
+    if not well_formed.any():
+        return valid
+
+    # 整個 chunk 轉成 N x 8 的數字矩陣, 一次算完
+    joined = "".join(bans[well_formed].tolist()).encode("ascii")
+    digits = np.frombuffer(joined, dtype=np.uint8).reshape(-1, 8) - ord("0")
+
+    products = digits * BAN_WEIGHTS
+    total = (products // 10 + products % 10).sum(axis=1, dtype=np.int64)
+
+    seventh_is_seven = digits[:, 6] == 7
+    valid[well_formed] = (total % 5 == 0) | (seventh_is_seven & ((total + 1) % 5 == 0))
+    return valid
+
+
+def content_hash(df: pd.DataFrame) -> np.ndarray:
+    """
+    每筆資料的內容雜湊(64-bit, 以 int64 存放)
+
+    以固定欄位順序與型別(CONTENT_DTYPES)計算, 缺少的欄位視為 NULL,
+    結果只取決於該筆資料本身, 跨次匯入可比較以判斷資料是否變更。
+    """
+    hashed = pd.util.hash_pandas_object(
+        df.reindex(columns=CONTENT_COLUMNS).astype(CONTENT_DTYPES), index=False
+    )
+    return hashed.to_numpy().view(np.int64)
 
 
 class TaxDataTransformer:
@@ -9,13 +93,21 @@ class TaxDataTransformer:
 
     def process(
         self, df: pd.DataFrame, chunk_num: int
-    ) -> Tuple[pd.DataFrame, List[dict]]:
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
         清理並驗證資料。
 
-        """
-        errors = []
+        Args:
+            df (pd.DataFrame): extractor 讀出的原始 chunk
+            chunk_num (int): 批次編號, 寫入錯誤表
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: (清理後資料, 錯誤表), 錯誤表欄位見
+            ERROR_COLUMNS, 全部以向量化方式產生
 
+        Raises:
+            ValueError: 缺少必要欄位(統一編號、營業人名稱)
+        """
         # 1. 移除完全空白的行
         df = df.dropna(how="all")
 
@@ -32,41 +124,112 @@ class TaxDataTransformer:
         invalid_mask = (df["統一編號"].str.len() != 8) | (~df["統一編號"].str.isdigit())
 
         # 記錄格式錯誤
-        # TODO find out which rows have the error later
-        for _, row in df[invalid_mask].iterrows():
-            errors.append(
-                {
-                    "type": "INVALID_BAN",
-                    "batch": chunk_num,
-                    "ban": row["統一編號"],
-                    "message": f"統一編號格式錯誤: {row['統一編號']}",
-                }
-            )
+        invalid_errors = self._error_frame(
+            df.loc[invalid_mask, "統一編號"],
+            "INVALID_BAN",
+            chunk_num,
+            "統一編號格式錯誤",
+        )
 
         df = df[~invalid_mask].copy()
 
-        # 5. 處理重複資料
+        # 5. 驗證統一編號檢查碼
+        checksum_mask = ~ban_checksum_valid(df["統一編號"])
+        checksum_errors = self._error_frame(
+            df.loc[checksum_mask, "統一編號"],
+            "INVALID_BAN_CHECKSUM",
+            chunk_num,
+            "統一編號檢查碼錯誤",
+        )
+        df = df[~checksum_mask].copy()
+
+        # 總機構統一編號格式或檢查碼錯誤時保留該筆資料, 只清空總機構欄位(記為警告)
+        hq_bans = df["總機構統一編號"].fillna("").str.strip()
+        hq_present = hq_bans != ""
+        hq_malformed = hq_present & (
+            (hq_bans.str.len() != 8) | (~hq_bans.str.isdigit())
+        )
+        hq_checksum = hq_present & ~hq_malformed & ~ban_checksum_valid(hq_bans)
+        hq_errors = pd.concat(
+            [
+                self._error_frame(
+                    hq_bans[hq_malformed],
+                    "HQ_INVALID_BAN",
+                    chunk_num,
+                    "總機構統一編號格式錯誤",
+                ),
+                self._error_frame(
+                    hq_bans[hq_checksum],
+                    "HQ_INVALID_BAN_CHECKSUM",
+                    chunk_num,
+                    "總機構統一編號檢查碼錯誤",
+                ),
+            ],
+            ignore_index=True,
+        )
+        df.loc[hq_malformed | hq_checksum, "總機構統一編號"] = ""
+
+        # 6. 處理重複資料
         duplicates_mask = df.duplicated(subset=["統一編號"], keep="first")
-        duplicates_count = duplicates_mask.sum()
-
-        if duplicates_count > 0:
-            for idx in df[duplicates_mask].index:
-                errors.append(
-                    {
-                        "type": "DUPLICATE",
-                        "batch": chunk_num,
-                        "ban": df.loc[idx, "統一編號"],
-                        "message": f"重複的統一編號: {df.loc[idx, '統一編號']}",
-                    }
-                )
+        duplicate_errors = self._error_frame(
+            df.loc[duplicates_mask, "統一編號"],
+            "DUPLICATE",
+            chunk_num,
+            "重複的統一編號",
+        )
+
+        errors = pd.concat(
+            [invalid_errors, checksum_errors, hq_errors, duplicate_errors],
+            ignore_index=True,
+        )
 
         df = df[~duplicates_mask].copy()
 
-        # 6. 清理其他欄位
+        # 7. 清理其他欄位
         df = self._clean_fields(df)
 
+        # 8. 內容雜湊(增量匯入時比對是否變更)
+        df["內容雜湊"] = content_hash(df)
+
         return df, errors
 
+    def drop_seen(
+        self, df: pd.DataFrame, chunk_num: int, seen: SeenBanSet
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        移除先前批次已出現過的統一編號(跨批次去重)
+
+        與 process() 分開, 讓 process() 保持無狀態; 此步驟需依批次順序執行。
+        """
+        seen_mask = seen.contains(df["統一編號"])
+        errors = self._error_frame(
+            df.loc[seen_mask, "統一編號"],
+            "DUPLICATE",
+            chunk_num,
+            "重複的統一編號(先前批次已出現)",
+        )
+        return df[~seen_mask], errors
+
+    @staticmethod
+    def _error_frame(
+        bans: pd.Series, error_type: str, chunk_num: int, label: str
+    ) -> pd.DataFrame:
+        """
+        由出錯的統一編號建立錯誤表
+
+        row 為 extractor 給的全域列號(DataFrame index), 可對回原始 CSV。
+        """
+        return pd.DataFrame(
+            {
+                "type": error_type,
+                "batch": chunk_num,
+                "ban": bans.to_numpy(),
+                "row": bans.index.to_numpy(dtype="int64"),
+                "message": (f"{label}: " + bans).to_numpy(),
+            },
+            columns=ERROR_COLUMNS,
+        )
+
     def _clean_fields(self, df: pd.DataFrame) -> pd.DataFrame:
         """清理各欄位"""
         # 總機構統一編號
@@ -100,6 +263,7 @@ class TaxDataTransformer:
             df["使用統一發票"]
             .map({"Y": True, "y": True, "N": False, "n": False})
             .fillna(False)
+            .astype(bool)
         )
 
         # 行業代號與名稱
@@ -0,0 +1,944 @@
+import csv
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import tempfile
+import time
+from contextlib import nullcontext
+from io import StringIO
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.tax_registration.etl.dedupe import SeenBanSet
+from core.tax_registration.etl.extractor import CSVExtractor
+from core.tax_registration.etl.http_server import LocalCSVServer
+from core.tax_registration.etl.loader import (
+    COPY_READ_SIZE,
+    TAX_REGISTRATION_COLUMNS,
+    BulkLoader,
+    CopyStream,
+)
+from core.tax_registration.etl.memory import (
+    MemoryTracker,
+    current_rss,
+    peak_rss,
+    reset_peak_rss,
+    trim_heap,
+)
+from core.tax_registration.etl.parallel import (
+    ProcessTransformer,
+    read_frame,
+    shared_memory_dir,
+    write_frame,
+)
+from core.tax_registration.etl.pipeline import LoadPipeline
+from core.tax_registration.etl.synthetic import (
+    SyntheticGenerator,
+    row_count,
+    synthetic_chunk,
+)
+from core.tax_registration.etl.transformer import (
+    BAN_WEIGHTS,
+    TaxDataTransformer,
+    ban_checksum_valid,
+)
+from core.tax_registration.models import BusinessIndustry, ETLJobRun
+
+MB = 1024 * 1024
+
+
+def python_checksum_valid(ban: str) -> bool:
+    """逐筆的檢查碼驗證, 作為比較基準"""
+    if len(ban) != 8 or not ban.isascii() or not ban.isdigit():
+        return False
+    total = sum(sum(divmod(int(d) * w, 10)) for d, w in zip(ban, BAN_WEIGHTS))
+    return total % 5 == 0 or (ban[6] == "7" and (total + 1) % 5 == 0)
+
+
+def legacy_industry_records(df: pd.DataFrame) -> list:
+    """改為 melt + COPY 之前的行業資料準備方式(iterrows 建 ORM 物件), 作為比較基準"""
+    records = []
+    for _, row in df.iterrows():
+        for i, suffix in enumerate(["", "1", "2", "3"], 1):
+            code_col = f"行業代號{suffix}" if suffix else "行業代號"
+            name_col = f"名稱{suffix}" if suffix else "名稱"
+            if code_col in row and row[code_col]:
+                records.append(
+                    BusinessIndustry(
+                        business_id=row["統一編號"],
+                        industry_code=row[code_col],
+                        industry_name=row.get(name_col, ""),
+                        order=i,
+                    )
+                )
+    return records
+
+
+def legacy_copy_buffer(df: pd.DataFrame) -> StringIO:
+    """改為串流之前的 COPY 準備方式(整個 chunk to_csv 到 StringIO), 作為比較基準"""
+    df_ordered = df.copy()
+    df_ordered["總機構統一編號"] = df_ordered["總機構統一編號"].replace(
+        {None: "\\N", "": "\\N"}
+    )
+    buffer = StringIO()
+    df_ordered.to_csv(
+        buffer,
+        index=False,
+        header=False,
+        sep="\t",
+        na_rep="\\N",
+        quoting=csv.QUOTE_MINIMAL,
+        escapechar="\\",
+        doublequote=False,
+    )
+    buffer.seek(0)
+    return buffer
+
+
+def legacy_process(df: pd.DataFrame, chunk_num: int):
+    """改為向量化之前的錯誤收集方式(iterrows / 逐筆 df.loc), 作為比較基準"""
+    errors = []
+    df = df.dropna(how="all")
+    df["統一編號"] = df["統一編號"].fillna("").str.strip()
+    invalid_mask = (df["統一編號"].str.len() != 8) | (~df["統一編號"].str.isdigit())
+    for _, row in df[invalid_mask].iterrows():
+        errors.append(
+            {
+                "type": "INVALID_BAN",
+                "batch": chunk_num,
+                "ban": row["統一編號"],
+                "message": f"統一編號格式錯誤: {row['統一編號']}",
+            }
+        )
+    df = df[~invalid_mask].copy()
+
+    duplicates_mask = df.duplicated(subset=["統一編號"], keep="first")
+    for idx in df[duplicates_mask].index:
+        errors.append(
+            {
+                "type": "DUPLICATE",
+                "batch": chunk_num,
+                "ban": df.loc[idx, "統一編號"],
+                "message": f"重複的統一編號: {df.loc[idx, '統一編號']}",
+            }
+        )
+    df = df[~duplicates_mask].copy()
+
+    return TaxDataTransformer()._clean_fields(df), errors
+
+
+class Command(BaseCommand):
+    help = "ETL 各階段效能基準測試(使用本地檔案, 不連外網)"
+
+    SUITES = [
+        "download",
+        "parser",
+        "errors",
+        "checksum",
+        "industry",
+        "copy-memory",
+        "loader",
+        "e2e",
+        "memory",
+        "transform-scaling",
+    ]
+
+    # e2e 結果中各階段的名稱與 ChunkMetric 欄位
+    E2E_STAGES = {
+        "extract": "extract_seconds",
+        "transform": "transform_seconds",
+        "load": "copy_seconds",
+        "industry": "industry_seconds",
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--suite", choices=self.SUITES, required=True, help="要執行的測試項目"
+        )
+        parser.add_argument("--file", help="本地 CSV 檔案(BGMOPEN1 格式)")
+        parser.add_argument(
+            "--chunk-size", type=int, default=50000, help="CSV 讀取 chunk 大小"
+        )
+        parser.add_argument(
+            "--download-workers",
+            type=int,
+            nargs="+",
+            default=[1, 4, 8],
+            help="要比較的分段下載連線數",
+        )
+        parser.add_argument(
+            "--parsers",
+            nargs="+",
+            choices=CSVExtractor.PARSER_ENGINES,
+            default=CSVExtractor.PARSER_ENGINES,
+            help="要比較的 CSV 解析引擎",
+        )
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            choices=BulkLoader.BACKENDS,
+            default=BulkLoader.BACKENDS,
+            help="要比較的 loader backend",
+        )
+        parser.add_argument(
+            "--rows", type=int, default=50000, help="合成資料筆數(不需 --file 的測試)"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="每種實作重複執行次數, 取中位數"
+        )
+        parser.add_argument(
+            "--sizes",
+            type=row_count,
+            nargs="+",
+            default=[row_count("100k"), row_count("1M")],
+            help="e2e: 合成資料筆數, 可用 k / M 表示 (預設: 100k 1M)",
+        )
+        parser.add_argument(
+            "--data-dir",
+            default=os.path.join(tempfile.gettempdir(), "tax_registration_bench"),
+            help="e2e: 合成資料存放目錄(同筆數重複使用)",
+        )
+        parser.add_argument(
+            "--with-command",
+            action="store_true",
+            help="e2e: 另外執行完整的 load_tax_registration(會清空並重新匯入資料表, "
+            "只在本地測試資料庫使用)",
+        )
+        parser.add_argument(
+            "--results",
+            default="benchmark_results.json",
+            help="e2e: 結果輸出的 JSON 檔",
+        )
+        parser.add_argument("--baseline", help="e2e: 作為比較基準的結果 JSON 檔")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="e2e: rows/s 下降或 RSS 增加超過此比例視為退步 (預設: 0.1)",
+        )
+        parser.add_argument(
+            "--leak-threshold",
+            type=int,
+            default=20,
+            help="memory: 跨 chunk 持續成長超過此值(MB)視為洩漏 (預設: 20)",
+        )
+        parser.add_argument(
+            "--process-workers",
+            type=int,
+            nargs="+",
+            default=[1, 2, 4, 8],
+            help="transform-scaling: 要比較的轉換行程數, --rows 建議至少為 "
+            "--chunk-size × 最大行程數 × 4",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="e2e: 將本次結果寫入 --baseline 指定的檔案",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(f"\n{'=' * 60}\n{options['suite']}\n{'=' * 60}")
+        )
+        getattr(self, f"bench_{options['suite'].replace('-', '_')}")()
+
+    def _require_file(self) -> str:
+        if not self.options["file"]:
+            raise CommandError("此測試需要 --file 指定本地 CSV")
+        return self.options["file"]
+
+    def bench_download(self):
+        """以本地 HTTP 伺服器(支援 Range)比較單連線與多連線下載, 下載與解析分開計速"""
+        path = self._require_file()
+
+        with LocalCSVServer(path) as server:
+            for workers in self.options["download_workers"]:
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    extractor = CSVExtractor(
+                        server.url, cache_dir=cache_dir, download_workers=workers
+                    )
+                    extractor.sync(force=True)
+
+                    started = time.perf_counter()
+                    rows = sum(
+                        len(df)
+                        for df in extractor.fetch_chunks(self.options["chunk_size"])
+                    )
+                    total = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"workers={workers:<3} "
+                    f"下載 {extractor.download_mb_per_second:8.1f} MB/s | "
+                    f"解析 {extractor.parse_rows_per_second:12,.0f} rows/s | "
+                    f"{rows:,} 筆 / 讀取 {total:.2f} 秒"
+                )
+
+    def bench_parser(self):
+        """比較各解析引擎每個 chunk 的耗時與 RSS 高水位"""
+        path = self._require_file()
+        chunk_size = self.options["chunk_size"]
+
+        if not reset_peak_rss():
+            self.stdout.write(
+                self.style.WARNING("無法重設 RSS 高水位, 峰值為整個 process 的最大值")
+            )
+
+        for engine in self.options["parsers"]:
+            with LocalCSVServer(path) as server, tempfile.TemporaryDirectory() as d:
+                extractor = CSVExtractor(server.url, cache_dir=d, parser=engine)
+                extractor.sync(force=True)
+
+                seconds, peaks = [], []
+                chunks = extractor.fetch_chunks(chunk_size)
+                while True:
+                    baseline = current_rss()
+                    reset_peak_rss()
+                    started = time.perf_counter()
+                    df = next(chunks, None)
+                    if df is None:
+                        break
+                    seconds.append(time.perf_counter() - started)
+                    peaks.append(peak_rss() - baseline)
+                    del df
+
+            rows = extractor.parse_stats["rows"]
+            self.stdout.write(
+                f"{engine:<8} {len(seconds)} chunks x {chunk_size:,} 筆 | "
+                f"平均 {sum(seconds) / len(seconds) * 1000:8.1f} ms/chunk | "
+                f"RSS 增量 平均 {sum(peaks) / len(peaks) / MB:7.1f} MB, "
+                f"最大 {max(peaks) / MB:7.1f} MB | "
+                f"{rows / sum(seconds):12,.0f} rows/s"
+            )
+
+    def bench_errors(self):
+        """合成 10% 格式錯誤的 chunk, 比較逐筆與向量化的錯誤收集"""
+        chunk = synthetic_chunk(self.options["rows"])
+        implementations = {
+            "iterrows": legacy_process,
+            "vectorized": TaxDataTransformer().process,
+        }
+
+        for name, process in implementations.items():
+            seconds = []
+            for _ in range(self.options["repeat"]):
+                started = time.perf_counter()
+                _, errors = process(chunk.copy(), 1)
+                seconds.append(time.perf_counter() - started)
+
+            self.stdout.write(
+                f"{name:<10} {len(chunk):,} 筆 / 錯誤 {len(errors):,} 筆 | "
+                f"中位數 {np.median(seconds) * 1000:8.1f} ms"
+            )
+
+    def bench_checksum(self):
+        """統一編號檢查碼: 逐筆 Python 與 NumPy 向量化, 並對照整個 transform 的耗時"""
+        chunk = synthetic_chunk(self.options["rows"], invalid_ratio=0)
+        bans = chunk["統一編號"]
+        transformer = TaxDataTransformer()
+
+        implementations = {
+            "python": lambda: bans.map(python_checksum_valid).to_numpy(dtype=bool),
+            "numpy": lambda: ban_checksum_valid(bans),
+            "process": lambda: transformer.process(chunk.copy(), 1),
+        }
+
+        expected = implementations["python"]()
+        if not np.array_equal(expected, implementations["numpy"]()):
+            raise CommandError("向量化檢查碼結果與逐筆驗證不一致")
+
+        for name, func in implementations.items():
+            seconds = []
+            for _ in range(self.options["repeat"]):
+                started = time.perf_counter()
+                func()
+                seconds.append(time.perf_counter() - started)
+
+            self.stdout.write(
+                f"{name:<8} {len(bans):,} 筆 | 中位數 {np.median(seconds) * 1000:8.2f} ms"
+            )
+
+    def bench_industry(self):
+        """
+        行業資料階段: iterrows + bulk_create 與 melt + COPY 每個 chunk 的耗時
+
+        PostgreSQL 上連同寫入一起計時(在交易內執行後 rollback),
+        其他資料庫只比較資料準備。
+        """
+        chunk, _ = TaxDataTransformer().process(
+            synthetic_chunk(self.options["rows"], invalid_ratio=0), 1
+        )
+        loader = BulkLoader()
+        with_db = connection.vendor == "postgresql"
+        if not with_db:
+            self.stdout.write(
+                self.style.WARNING("非 PostgreSQL 資料庫, 只比較資料準備(不含寫入)")
+            )
+
+        def legacy():
+            records = legacy_industry_records(chunk)
+            if with_db:
+                BusinessIndustry.objects.bulk_create(
+                    records, batch_size=loader.batch_size, ignore_conflicts=True
+                )
+            return len(records)
+
+        def vectorized():
+            industries = loader._prepare_industry_records(chunk)
+            if with_db:
+                loader._bulk_insert_industries(industries)
+            return len(industries)
+
+        for name, func in {"iterrows": legacy, "melt+copy": vectorized}.items():
+            seconds = []
+            for _ in range(self.options["repeat"]):
+                with transaction.atomic():
+                    if with_db:
+                        loader._bulk_insert_copy(loader._prepare_tax_records(chunk))
+                    started = time.perf_counter()
+                    count = func()
+                    seconds.append(time.perf_counter() - started)
+                    transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{name:<10} {len(chunk):,} 筆 → 行業 {count:,} 筆 | "
+                f"中位數 {np.median(seconds) * 1000:8.1f} ms/chunk"
+            )
+
+    def bench_copy_memory(self):
+        """
+        COPY 階段的 RSS 高水位: 整個 chunk 序列化到 StringIO 與分段串流
+
+        每種實作在獨立的子行程執行, 避免前一次釋放的記憶體被重複利用而影響量測。
+        PostgreSQL 上實際執行 COPY(交易內 rollback), 其他資料庫只讀完串流。
+        """
+        rows = self.options["chunk_size"]
+        chunk, _ = TaxDataTransformer().process(synthetic_chunk(rows), 1)
+        loader = BulkLoader()
+        tax_records = loader._prepare_tax_records(chunk)
+        with_db = connection.vendor == "postgresql"
+        if not with_db:
+            self.stdout.write(
+                self.style.WARNING("非 PostgreSQL 資料庫, 只量測序列化(不含寫入)")
+            )
+
+        def legacy():
+            buffer = legacy_copy_buffer(tax_records)
+            if with_db:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    if hasattr(cursor, "copy_from"):
+                        cursor.copy_from(
+                            buffer,
+                            "tax_registration",
+                            sep="\t",
+                            null="\\N",
+                            columns=list(TAX_REGISTRATION_COLUMNS),
+                        )
+                    else:
+                        columns = ", ".join(TAX_REGISTRATION_COLUMNS)
+                        with cursor.copy(
+                            f"COPY tax_registration ({columns}) FROM STDIN"
+                        ) as copy:
+                            copy.write(buffer.getvalue())
+                    transaction.set_rollback(True)
+            else:
+                buffer.getvalue()
+
+        def streaming():
+            if with_db:
+                with transaction.atomic():
+                    loader._bulk_insert_copy(tax_records)
+                    transaction.set_rollback(True)
+            else:
+                stream = CopyStream(tax_records, loader.batch_size, ["總機構統一編號"])
+                while stream.read(COPY_READ_SIZE):
+                    pass
+
+        # 子行程會重新連線, fork 前先關閉既有連線
+        connections.close_all()
+        for name, func in {"stringio": legacy, "streaming": streaming}.items():
+            seconds, peak = self._measure_in_child(func)
+            self.stdout.write(
+                f"{name:<10} {len(tax_records):,} 筆 | {seconds * 1000:8.1f} ms | "
+                f"RSS 高水位增量 {peak / MB:7.1f} MB"
+            )
+
+    def _measure_in_child(self, func) -> tuple:
+        """在 fork 出的子行程執行 func, 返回 (秒數, RSS 高水位增量)"""
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+
+        def run():
+            trim_heap()
+            baseline = current_rss()
+            reset_peak_rss()
+            started = time.perf_counter()
+            func()
+            sender.send((time.perf_counter() - started, peak_rss() - baseline))
+
+        process = multiprocessing.get_context("fork").Process(target=run)
+        process.start()
+        sender.close()
+        try:
+            return receiver.recv()
+        except EOFError:
+            raise CommandError(f"子行程執行失敗 (exit code {process.exitcode})")
+        finally:
+            process.join()
+
+    def bench_loader(self):
+        """
+        以同一份合成資料(--rows 筆, 依 --chunk-size 分批)比較各 loader backend 的匯入速度
+
+        需要 PostgreSQL, 每個 backend 在交易內執行後 rollback, 不留下資料。
+        """
+        if connection.vendor != "postgresql":
+            raise CommandError("loader 測試需要 PostgreSQL")
+
+        rows, chunk_size = self.options["rows"], self.options["chunk_size"]
+        transformer = TaxDataTransformer()
+        chunks = [
+            transformer.process(
+                synthetic_chunk(
+                    min(chunk_size, rows - start), invalid_ratio=0, seed=start
+                ).set_axis(range(start, min(start + chunk_size, rows))),
+                1,
+            )[0]
+            for start in range(0, rows, chunk_size)
+        ]
+
+        # 不同 chunk 可能產生相同統一編號, 先整體去重以免主鍵衝突
+        seen = set()
+        for i, chunk in enumerate(chunks):
+            chunk = chunk[~chunk["統一編號"].isin(seen)]
+            seen.update(chunk["統一編號"])
+            chunks[i] = chunk
+        total = sum(len(chunk) for chunk in chunks)
+
+        # 驅動由 DATABASE_DRIVER 決定, 兩個驅動需分別執行本測試比較
+        driver = connection.Database.__name__
+        for backend in self.options["backends"]:
+            if backend == "binary" and driver != "psycopg":
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{backend:<8} 需要 psycopg 3, 目前驅動為 {driver}"
+                    )
+                )
+                continue
+
+            loader = BulkLoader(backend=backend)
+            with transaction.atomic():
+                started = time.perf_counter()
+                for chunk in chunks:
+                    loader.insert(chunk)
+                seconds = time.perf_counter() - started
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{backend:<8} ({driver}) {total:,} 筆 / {len(chunks)} chunks | "
+                f"{seconds:8.2f} 秒 | {total / seconds:12,.0f} rows/s"
+            )
+
+    def bench_e2e(self):
+        """
+        以固定筆數的合成資料量測 extract → transform → load 與完整匯入指令
+
+        每組結果記錄 rows/s、各階段秒數(多次執行取中位數)與 RSS 高水位,
+        寫入 --results; 有 --baseline 時比較, 超出 --tolerance 的退步使指令以錯誤結束。
+        load 需要 PostgreSQL(交易內執行後 rollback), 其他資料庫只量測 extract / transform。
+        """
+        with_db = connection.vendor == "postgresql"
+        if not with_db:
+            self.stdout.write(
+                self.style.WARNING("非 PostgreSQL 資料庫, 不量測 load 與完整匯入指令")
+            )
+
+        results = {}
+        for rows in self.options["sizes"]:
+            path = self._synthetic_file(rows)
+            runs = {"components": lambda: self._run_components(path, with_db)}
+            if with_db and self.options["with_command"]:
+                runs["command"] = lambda: self._run_command(path)
+
+            for name, run in runs.items():
+                key = f"{name}/{rows}"
+                results[key] = self._summarize_runs(
+                    [run() for _ in range(self.options["repeat"])]
+                )
+                self._print_e2e_result(key, results[key])
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "pyarrow": pa.__version__,
+                "database": connection.vendor,
+                "cpus": os.cpu_count(),
+            },
+            "settings": {
+                "chunk_size": self.options["chunk_size"],
+                "repeat": self.options["repeat"],
+            },
+            "results": results,
+        }
+        self._write_json(self.options["results"], report)
+        self.stdout.write(f"\n結果已寫入 {self.options['results']}")
+
+        baseline = self.options["baseline"]
+        if baseline and self.options["save_baseline"]:
+            self._write_json(baseline, report)
+            self.stdout.write(f"已更新基準 {baseline}")
+        elif baseline:
+            with open(baseline, encoding="utf-8") as f:
+                regressions = self._compare_baseline(results, json.load(f)["results"])
+            if regressions:
+                raise CommandError(
+                    f"效能退步超過 {self.options['tolerance']:.0%}: "
+                    + ", ".join(regressions)
+                )
+
+    def bench_memory(self):
+        """
+        逐 chunk 記錄 RSS、Python heap(tracemalloc)與 Arrow memory pool 用量
+
+        第一個 chunk 之後任一項持續成長超過 --leak-threshold 即以錯誤結束,
+        並列出累計成長最多的配置位置。load 同 e2e, 只在 PostgreSQL 上執行。
+        """
+        with_db = connection.vendor == "postgresql"
+        threshold = self.options["leak_threshold"] * MB
+        failures = []
+
+        for rows in self.options["sizes"]:
+            path = self._synthetic_file(rows)
+            memory = MemoryTracker().start()
+            try:
+                self._run_components(path, with_db, memory=memory)
+                growth = memory.cumulative_growth()
+            finally:
+                memory.stop()
+
+            self.stdout.write(f"\n{rows:,} 筆:")
+            for record in memory.records:
+                self.stdout.write(
+                    f"  chunk {record['chunk']:>4} | RSS {record['rss'] / MB:8.1f} MB | "
+                    f"Python heap {record['traced'] / MB:7.1f} MB | "
+                    f"Arrow {record['arrow'] / MB:7.1f} MB"
+                )
+            for item in growth[:5]:
+                self.stdout.write(
+                    f"      +{item['size_diff'] / 1024:,.0f} KB  {item['location']}"
+                )
+
+            for key, size in memory.leaks(threshold).items():
+                failures.append(f"{rows:,} 筆 {key} +{size / MB:,.1f} MB")
+                self.stdout.write(
+                    self.style.ERROR(f"  {key} 跨 chunk 持續成長 {size / MB:,.1f} MB")
+                )
+
+        if failures:
+            raise CommandError("記憶體持續成長: " + ", ".join(failures))
+
+    def bench_transform_scaling(self):
+        """
+        轉換吞吐量隨 worker 行程數的變化(--rows 筆合成資料, 依 --chunk-size 分批)
+
+        各行程數都經由 LoadPipeline 執行(結果依批次順序回收), 與單一行程內直接呼叫
+        TaxDataTransformer 比較加速倍數; PostgreSQL 上另量測 COPY 吞吐量,
+        整體吞吐量以兩者較小者估計, 超過 COPY 吞吐量後增加行程已無幫助。
+        """
+        rows, chunk_size = self.options["rows"], self.options["chunk_size"]
+        workers = self.options["process_workers"]
+        generator = SyntheticGenerator(seed=0)
+        chunks = [
+            generator.chunk(start, min(chunk_size, rows - start))
+            for start in range(0, rows, chunk_size)
+        ]
+        self.stdout.write(
+            f"{rows:,} 筆 / {len(chunks)} chunks, CPU {os.cpu_count()} 核, "
+            f"交接目錄 {shared_memory_dir()}"
+        )
+        if len(chunks) < max(workers) * 2:
+            self.stdout.write(
+                self.style.WARNING("  chunk 數少於最大行程數的兩倍, 行程無法保持忙碌")
+            )
+
+        transformer = TaxDataTransformer()
+        cleaned = []
+
+        def in_process():
+            cleaned[:] = [transformer.process(df, i) for i, df in enumerate(chunks, 1)]
+
+        baseline = self._median_seconds(in_process)
+        self._print_handoff(cleaned[0][0])
+
+        db_rate = None
+        if connection.vendor == "postgresql":
+            db_rate = self._copy_rate([df_clean for df_clean, _ in cleaned])
+            self.stdout.write(f"COPY 吞吐量: {db_rate:,.0f} rows/s")
+        else:
+            self.stdout.write(self.style.WARNING("非 PostgreSQL 資料庫, 不量測 COPY"))
+
+        self._print_scaling("in-proc", baseline, rows, baseline, 1, db_rate)
+        for count in workers:
+            with ProcessTransformer(count) as pool:
+                # 先讓每個行程完成啟動與 import
+                self._run_transform_pipeline(pool, chunks[: count * 2], count)
+                seconds = self._median_seconds(
+                    lambda: self._run_transform_pipeline(pool, chunks, count)
+                )
+            self._print_scaling(
+                f"{count} 行程", seconds, rows, baseline, count, db_rate
+            )
+
+    def _median_seconds(self, func) -> float:
+        seconds = []
+        for _ in range(self.options["repeat"]):
+            started = time.perf_counter()
+            func()
+            seconds.append(time.perf_counter() - started)
+        return float(np.median(seconds))
+
+    @staticmethod
+    def _run_transform_pipeline(pool: ProcessTransformer, chunks: list, workers: int):
+        """只執行 transform 與 screen(不載入), 並確認結果依批次順序回收"""
+        order = []
+
+        def screen(chunk_num, df, transformed):
+            order.append(chunk_num)
+            return None
+
+        def fail(chunk_num, df, error):
+            raise error
+
+        LoadPipeline(
+            transform=lambda chunk_num, df: pool.process(df, chunk_num),
+            screen=screen,
+            load=lambda chunk_num, payload: None,
+            complete=lambda chunk_num, result: None,
+            fail=fail,
+            transform_workers=workers,
+        ).run(enumerate(chunks, 1))
+
+        if order != sorted(order):
+            raise CommandError(f"轉換結果未依批次順序回收: {order}")
+
+    def _print_handoff(self, df: pd.DataFrame):
+        """一個批次的交接成本: Arrow IPC(共享記憶體) 與 pickle 來回各一次"""
+        path = os.path.join(shared_memory_dir(), f"etl-bench-{os.getpid()}.arrow")
+
+        def arrow():
+            write_frame(df, path)
+            read_frame(path)
+
+        def pickled():
+            pickle.loads(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+
+        self.stdout.write(
+            f"交接 {len(df):,} 筆: Arrow IPC {self._median_seconds(arrow) * 1000:.1f} ms"
+            f" | pickle {self._median_seconds(pickled) * 1000:.1f} ms"
+        )
+
+    @staticmethod
+    def _copy_rate(chunks: list) -> float:
+        """COPY 吞吐量(rows/s), 在交易內執行後 rollback"""
+        loader = BulkLoader()
+        seen = set()
+        total = 0
+        with transaction.atomic():
+            started = time.perf_counter()
+            for chunk in chunks:
+                # 不同 chunk 可能有相同統一編號, 先去重以免主鍵衝突
+                chunk = chunk[~chunk["統一編號"].isin(seen)]
+                seen.update(chunk["統一編號"])
+                loader.insert(chunk)
+                total += len(chunk)
+            seconds = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return total / seconds
+
+    def _print_scaling(
+        self,
+        label: str,
+        seconds: float,
+        rows: int,
+        baseline: float,
+        workers: int,
+        db_rate: Optional[float],
+    ):
+        rate = rows / seconds
+        speedup = baseline / seconds
+        line = (
+            f"{label:<8} {seconds:8.2f} 秒 | {rate:12,.0f} rows/s | "
+            f"{speedup:5.2f}x | 效率 {speedup / workers:6.1%}"
+        )
+        if db_rate is not None:
+            line += f" | 含 COPY 約 {min(rate, db_rate):,.0f} rows/s"
+            if rate >= db_rate:
+                line += " (COPY 為瓶頸)"
+        self.stdout.write(line)
+
+    def _synthetic_file(self, rows: int) -> Path:
+        """固定 seed 的合成資料, 已存在就直接使用"""
+        path = Path(self.options["data_dir"]) / f"bgmopen1_{rows}.csv"
+        if not path.exists():
+            self.stdout.write(f"產生合成資料 {rows:,} 筆 → {path}")
+            SyntheticGenerator(seed=0).write_csv(str(path), rows)
+        return path
+
+    def _run_components(
+        self, path: Path, with_db: bool, memory: Optional[MemoryTracker] = None
+    ) -> dict:
+        """
+        直接呼叫 CSVExtractor / TaxDataTransformer / BulkLoader, 逐 chunk 計時
+
+        有 memory 時每個 chunk 結束後記錄一次記憶體用量(不計入秒數)。
+        """
+        extractor = CSVExtractor(str(path))
+        transformer = TaxDataTransformer()
+        loader = BulkLoader()
+        seen = SeenBanSet()
+        stages = dict.fromkeys(
+            self.E2E_STAGES if with_db else ["extract", "transform"], 0.0
+        )
+        rows = 0
+
+        trim_heap()
+        reset_peak_rss()
+        started = time.perf_counter()
+        with transaction.atomic() if with_db else nullcontext():
+            if with_db:
+                # 在同一交易中清空, 結束時連同匯入的資料一起 rollback
+                with connection.cursor() as cursor:
+                    cursor.execute("TRUNCATE business_industry, tax_registration")
+
+            chunks = extractor.fetch_chunks(self.options["chunk_size"])
+            for chunk_num, df in enumerate(chunks, 1):
+                rows += len(df)
+                stages["extract"] += df.attrs["extract_seconds"]
+
+                transform_started = time.perf_counter()
+                df_clean, _ = transformer.process(df, chunk_num)
+                df_clean = df_clean[~seen.contains(df_clean["統一編號"])]
+                seen.add(df_clean["統一編號"])
+                stages["transform"] += time.perf_counter() - transform_started
+
+                if with_db:
+                    timings = {}
+                    loader.insert(df_clean, timings)
+                    stages["load"] += timings.get("copy_seconds", 0.0)
+                    stages["industry"] += timings.get("industry_seconds", 0.0)
+
+                if memory is not None:
+                    checkpoint_started = time.perf_counter()
+                    del df, df_clean
+                    memory.checkpoint(chunk_num)
+                    started += time.perf_counter() - checkpoint_started
+
+            if with_db:
+                transaction.set_rollback(True)
+
+        return {
+            "rows": rows,
+            "seconds": time.perf_counter() - started,
+            "stages": stages,
+            "peak_rss": peak_rss(),
+        }
+
+    def _run_command(self, path: Path) -> dict:
+        """執行完整的 load_tax_registration, 各階段秒數取自該次的 ChunkMetric"""
+        trim_heap()
+        reset_peak_rss()
+        started = time.perf_counter()
+        call_command(
+            "load_tax_registration",
+            source=str(path),
+            chunk_size=self.options["chunk_size"],
+            truncate=True,
+            force=True,
+            auto=True,
+            stdout=StringIO(),
+        )
+        seconds = time.perf_counter() - started
+
+        job_run = ETLJobRun.objects.order_by("-started_at").first()
+        if job_run.status != "success":
+            raise CommandError(f"匯入失敗: {job_run.error_message}")
+
+        totals = job_run.chunk_metrics.aggregate(
+            **{stage: Sum(field) for stage, field in self.E2E_STAGES.items()}
+        )
+        return {
+            "rows": job_run.records_total,
+            "seconds": seconds,
+            "stages": {stage: value or 0.0 for stage, value in totals.items()},
+            "peak_rss": peak_rss(),
+        }
+
+    @staticmethod
+    def _summarize_runs(runs: list) -> dict:
+        """多次執行的秒數取中位數, RSS 高水位取最大值"""
+        seconds = float(np.median([run["seconds"] for run in runs]))
+        rows = runs[0]["rows"]
+        return {
+            "rows": rows,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds),
+            "stages": {
+                stage: round(
+                    float(np.median([run["stages"][stage] for run in runs])), 3
+                )
+                for stage in runs[0]["stages"]
+            },
+            "peak_rss_mb": round(max(run["peak_rss"] for run in runs) / MB, 1),
+        }
+
+    def _print_e2e_result(self, key: str, result: dict):
+        stages = " / ".join(
+            f"{stage} {seconds:.2f}" for stage, seconds in result["stages"].items()
+        )
+        self.stdout.write(
+            f"{key:<20} {result['rows']:>10,} 筆 | {result['seconds']:8.2f} 秒 | "
+            f"{result['rows_per_second']:>10,} rows/s | "
+            f"RSS {result['peak_rss_mb']:7.1f} MB | {stages}"
+        )
+
+    def _compare_baseline(self, results: dict, baseline: dict) -> list:
+        """逐項比較 rows/s 與 RSS 高水位, 返回退步的項目"""
+        tolerance = self.options["tolerance"]
+        regressions = []
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n與基準比較:"))
+        for key, result in results.items():
+            base = baseline.get(key)
+            if base is None:
+                self.stdout.write(f"{key:<20} 基準中沒有此項")
+                continue
+
+            speed = result["rows_per_second"] / base["rows_per_second"] - 1
+            memory = result["peak_rss_mb"] / base["peak_rss_mb"] - 1
+            line = f"{key:<20} rows/s {speed:+7.1%} | RSS {memory:+7.1%}"
+
+            if speed < -tolerance or memory > tolerance:
+                regressions.append(key)
+                self.stdout.write(self.style.ERROR(f"{line}  ← 退步"))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+        return regressions
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,102 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tax_registration.etl.http_server import LocalCSVServer
+from core.tax_registration.etl.synthetic import SyntheticGenerator, row_count
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = "產生 BGMOPEN1 格式的合成 CSV(同一 seed 產生相同檔案), 可直接以本地 HTTP 伺服器提供下載"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="輸出檔案路徑(副檔名 .gz 時以 gzip 壓縮)")
+        parser.add_argument(
+            "--rows",
+            type=row_count,
+            default=row_count("100k"),
+            help="資料筆數, 可用 k / M 表示, 例如 10k ~ 10M (預設: 100k)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="亂數種子 (預設: 0)")
+        parser.add_argument(
+            "--invalid-ratio",
+            type=float,
+            default=0.01,
+            help="統一編號格式或檢查碼錯誤的比例 (預設: 0.01)",
+        )
+        parser.add_argument(
+            "--duplicate-ratio",
+            type=float,
+            default=0.01,
+            help="與之前某筆統一編號重複的比例 (預設: 0.01)",
+        )
+        parser.add_argument(
+            "--skip-existing",
+            action="store_true",
+            help="輸出檔案已存在時不重新產生(搭配 --serve 重複使用)",
+        )
+        parser.add_argument(
+            "--serve",
+            action="store_true",
+            help="產生後以本地 HTTP 伺服器提供下載(支援 Range / ETag), Ctrl+C 結束",
+        )
+        parser.add_argument(
+            "--host", default="127.0.0.1", help="伺服器位址 (預設: 127.0.0.1)"
+        )
+        parser.add_argument(
+            "--port", type=int, default=8765, help="伺服器 port, 0 為自動 (預設: 8765)"
+        )
+
+    def handle(self, *args, **options):
+        output = Path(options["output"])
+        rows = options["rows"]
+        for name in ["invalid_ratio", "duplicate_ratio"]:
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} 需介於 0 與 1 之間")
+
+        if options["skip_existing"] and output.exists():
+            self.stdout.write(f"使用既有檔案: {output}")
+        else:
+            self._generate(output, rows, options)
+
+        if options["serve"]:
+            server = LocalCSVServer(str(output), options["host"], options["port"])
+            try:
+                server.serve_forever(
+                    ready=lambda url: self.stdout.write(
+                        self.style.SUCCESS(f"🌐 下載網址: {url} (Ctrl+C 結束)")
+                    )
+                )
+            except KeyboardInterrupt:
+                self.stdout.write("\n伺服器已停止")
+
+    def _generate(self, output: Path, rows: int, options: dict):
+        generator = SyntheticGenerator(
+            seed=options["seed"],
+            invalid_ratio=options["invalid_ratio"],
+            duplicate_ratio=options["duplicate_ratio"],
+        )
+
+        def progress(written: int):
+            # 每 100 萬筆與最後一批輸出進度
+            if written % 10**6 == 0 or written == rows:
+                self.stdout.write(f"  已產生 {written:,} / {rows:,} 筆")
+
+        self.stdout.write(
+            f"產生 {rows:,} 筆合成資料 → {output} "
+            f"(seed={options['seed']}, 錯誤 {options['invalid_ratio']:.1%}, "
+            f"重複 {options['duplicate_ratio']:.1%})"
+        )
+        started = time.perf_counter()
+        size = generator.write_csv(str(output), rows, progress)
+        seconds = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ 完成: {size / MB:,.1f} MB, {seconds:.1f} 秒 "
+                f"({rows / seconds:,.0f} rows/s)"
+            )
+        )
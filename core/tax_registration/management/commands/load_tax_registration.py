@@ -1,9 +1,15 @@
 # tax_registration/management/commands/import_business.py
 import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 import requests
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
 from django.utils import timezone
@@ -15,24 +21,70 @@ from core.tax_registration.models import (
     ETLJobRun,
 )
 
+from core.tax_registration.etl.dedupe import SeenBanSet
 from core.tax_registration.etl.extractor import CSVExtractor
-from core.tax_registration.etl.transformer import TaxDataTransformer
+from core.tax_registration.etl.heartbeat import Heartbeat, etl_lock
+from core.tax_registration.etl.parallel import ProcessTransformer
+from core.tax_registration.etl.pipeline import LoadPipeline
+from core.tax_registration.etl.profiling import StageProfiler
+from core.tax_registration.etl.transformer import (
+    ERROR_COLUMNS,
+    WARNING_TYPES,
+    TaxDataTransformer,
+)
 from core.tax_registration.etl.loader import BulkLoader
+from core.tax_registration.etl.memory import (
+    MemoryTracker,
+    current_rss,
+    peak_rss,
+    reset_peak_rss,
+)
+from core.tax_registration.etl.schema import (
+    SWAP_TABLES,
+    IndexDef,
+    ShadowTables,
+    apply_session,
+    build_indexes,
+    bulk_session,
+    bulk_session_settings,
+    drop_indexes,
+    secondary_indexes,
+)
+from core.tax_registration.etl.sizing import AdaptiveChunkSizer
 from core.tax_registration.etl.tracker import ETLTracker
 
 
 logger = logging.getLogger("tax_registration.etl")
 
+# 摘要中列出 p50 / p95 的批次階段 → ChunkMetric 欄位
+METRIC_STAGES = {
+    "擷取": "extract_seconds",
+    "轉換": "transform_seconds",
+    "COPY": "copy_seconds",
+    "行業別": "industry_seconds",
+    "進度更新": "progress_seconds",
+}
+
 
 class Command(BaseCommand):
     help = "匯入全國營業登記資料 ETL"
 
     CSV_URL = "https://eip.fia.gov.tw/data/BGMOPEN1.csv"
 
+    STRATEGIES = ["inplace", "swap"]
+
+    MODES = ["full", "incremental"]
+
     def __init__(self):
         super().__init__()
         self.tracker = None
         self.start_batch = 1
+        self.shadow = None
+        self.sizer = None
+        self.profiler = None
+        self.memory = None
+        self.process_transformer = None
+        self.phase_seconds = {}
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -57,38 +109,169 @@ class Command(BaseCommand):
         parser.add_argument(
             "--auto", action="store_true", help="跳過確認提示（For scheduling）"
         )
+        parser.add_argument(
+            "--download-workers",
+            type=int,
+            default=1,
+            help="分段並行下載的連線數(伺服器需支援 Range), 1 為單一串流",
+        )
+        parser.add_argument(
+            "--parser",
+            choices=CSVExtractor.PARSER_ENGINES,
+            default="pandas",
+            help="CSV 解析引擎(pyarrow: 多執行緒 + Arrow string 欄位)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="忽略來源快取比對, 即使來源未變更也重新匯入",
+        )
+        parser.add_argument(
+            "--source",
+            default=self.CSV_URL,
+            help="資料來源 URL、file:// 或本機路徑(支援 .gz / .zst / .bz2 / .xz)",
+        )
+        parser.add_argument(
+            "--spool-compression",
+            choices=list(CSVExtractor.SPOOL_COMPRESSIONS),
+            default=settings.ETL_SPOOL_COMPRESSION,
+            help="本地快取的壓縮格式(none / gzip / zstd)",
+        )
+        parser.add_argument(
+            "--strategy",
+            choices=self.STRATEGIES,
+            default="inplace",
+            help="inplace: 直接寫入正式表; swap: 寫入影子表後一次交換(零停機全量重建)",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=self.MODES,
+            default="full",
+            help="full: COPY 寫入(需先清空); incremental: 依內容雜湊只新增/更新有異動的資料",
+        )
+        parser.add_argument(
+            "--delete-missing",
+            action="store_true",
+            help="incremental 模式: 刪除來源中已不存在的營業人",
+        )
+        parser.add_argument(
+            "--transform-workers",
+            type=int,
+            default=1,
+            help="同時轉換的批次數, 大於 1 時改為管線化執行",
+        )
+        parser.add_argument(
+            "--load-workers",
+            type=int,
+            default=1,
+            help="同時 COPY 的資料庫連線數, 大於 1 時改為管線化執行",
+        )
+        parser.add_argument(
+            "--transform-processes",
+            type=int,
+            default=0,
+            help="以多個 worker 行程轉換(Arrow IPC 經共享記憶體交接), "
+            "0 為不使用; 大於 0 時改為管線化執行",
+        )
+        parser.add_argument(
+            "--adaptive-chunks",
+            action="store_true",
+            help="依吞吐量與記憶體自動調整 chunk 大小(--chunk-size 為起始值)",
+        )
+        parser.add_argument(
+            "--memory-budget",
+            type=int,
+            default=settings.ETL_MEMORY_BUDGET_MB,
+            help="--adaptive-chunks 的 RSS 上限(MB)",
+        )
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="剖析各階段(extract / transform / screen / load / tracker), "
+            "結果寫入 ETL_PROFILE_DIR/job_<ID>/",
+        )
+        parser.add_argument(
+            "--profile-chunks",
+            type=int,
+            default=5,
+            help="--profile 只剖析前幾個批次, 0 為全部 (預設: 5)",
+        )
+        parser.add_argument(
+            "--track-memory",
+            action="store_true",
+            help="每個 chunk 結束時記錄 RSS 與 tracemalloc 快照, 列出記憶體成長位置(會變慢)",
+        )
+        parser.add_argument(
+            "--leak-threshold",
+            type=int,
+            default=50,
+            help="--track-memory: 跨 chunk 持續成長超過此值(MB)時警告 (預設: 50)",
+        )
+        parser.add_argument(
+            "--load-profile",
+            choices=["default", "bulk"],
+            default="default",
+            help="bulk: 載入期間刪除次要索引並調整 session 參數, 載入後平行重建",
+        )
+        parser.add_argument(
+            "--index-workers",
+            type=int,
+            default=2,
+            help="bulk 模式同時建立的索引數(各自另可使用平行 worker)",
+        )
 
     def handle(self, *args, **options):
         """主要進入點"""
         self.set_args_vals(**options)
 
-        # TODO Add auto resume on scheduler
-        self.handle_ongoing_job()
+        # 整個執行期間持有 advisory lock, 避免兩個 ETL 同時寫入
+        with etl_lock() as locked:
+            # TODO Add auto resume on scheduler
+            self.handle_ongoing_job(locked)
+
+            self.handle_job()
 
+    def handle_job(self):
+        """檢查參數、建立執行紀錄並執行 ETL"""
         self.handle_truncate_resume_conflict()
 
+        self.handle_strategy_conflict()
+
+        self.handle_mode_conflict()
+
         # 建立執行紀錄
         self.tracker = ETLTracker(
             batch_size=self.batch_size,
             chunk_size=self.chunk_size,
-            data_source_url=self.CSV_URL,
+            data_source_url=self.source,
             dry_run=self.dry_run,
         )
 
         # 取得起始批次(斷點續傳)
         self.handle_resume()
 
+        # 來源未變更時直接略過, 不做 truncate / transform / COPY
+        if self.handle_unchanged_source():
+            return
+
         self.handle_truncate()
 
+        self.handle_shadow_tables()
+
         # 開始新的 ETL 任務並記錄
         self.tracker.start()
 
-        try:
-            self.handle_successful_etl_job()
-        except Exception as e:
-            self.handle_failed_etl_job(e)
-        finally:
-            self._print_summary()
+        with (
+            Heartbeat(self.tracker.job_run.id, settings.ETL_HEARTBEAT_SECONDS),
+            self._profiling(),
+            self._tracking_memory(),
+        ):
+            try:
+                self.handle_successful_etl_job()
+            except Exception as e:
+                self.handle_failed_etl_job(e)
+            finally:
+                self._print_summary()
 
     def set_args_vals(self, **options):
         """設定 ETL Job 參數資料"""
@@ -99,9 +282,42 @@ class Command(BaseCommand):
         self.resume = options["resume"]
         self.limit = options["limit"]
         self.auto = options["auto"]
+        self.force = options["force"]
+        self.download_workers = options["download_workers"]
+        self.parser = options["parser"]
+        self.source = options["source"]
+        self.spool_compression = options["spool_compression"]
+        self.strategy = options["strategy"]
+        self.mode = options["mode"]
+        self.delete_missing = options["delete_missing"]
+        self.load_profile = options["load_profile"]
+        self.transform_workers = options["transform_workers"]
+        self.adaptive_chunks = options["adaptive_chunks"]
+        self.memory_budget = options["memory_budget"]
+        self.load_workers = options["load_workers"]
+        self.transform_processes = options["transform_processes"]
+        self.index_workers = options["index_workers"]
+        self.profile = options["profile"]
+        self.profile_chunks = options["profile_chunks"]
+        self.track_memory = options["track_memory"]
+        self.leak_threshold = options["leak_threshold"]
+        self.session_settings = bulk_session_settings(
+            settings.ETL_MAINTENANCE_WORK_MEM,
+            settings.ETL_PARALLEL_MAINTENANCE_WORKERS,
+        )
+
+    def handle_ongoing_job(self, locked: bool):
+        """
+        檢查是否有正在執行中的任務
+
+        PostgreSQL 以 advisory lock 判斷; 其他資料庫退回檢查心跳(updated_at)。
+        """
+        if not locked:
+            raise CommandError("已有任務正在執行中，請稍後再試。")
+        if connection.vendor == "postgresql":
+            # 取得鎖即表示沒有其他執行, 殘留的 running 紀錄是已中斷的任務
+            return
 
-    def handle_ongoing_job(self):
-        """檢查是否有正在執行中的任務"""
         HEARTBEAT_TIMEOUT = timedelta(minutes=5)  # 測試用只等待五分鐘
 
         ongoing_job = ETLJobRun.objects.filter(
@@ -120,16 +336,110 @@ class Command(BaseCommand):
                 "   --resume: 從上次中斷處繼續"
             )
 
+    def handle_strategy_conflict(self):
+        """swap 一定是完整重建, 不能搭配斷點續傳或限制筆數"""
+        if self.strategy != "swap":
+            return
+
+        if self.resume:
+            raise CommandError(
+                "❌ --strategy=swap 和 --resume 不能同時使用(影子表不保留中斷前的資料)"
+            )
+        if self.limit:
+            raise CommandError(
+                "❌ --strategy=swap 不能搭配 --limit, 否則會以部分資料取代正式表"
+            )
+
+        # 舊資料在交換時才被取代, 不需要先清空
+        self.truncate = False
+
+    def handle_mode_conflict(self):
+        """incremental 以 upsert 寫入正式表, 不清空也不交換; --delete-missing 需要完整來源"""
+        if self.delete_missing and self.mode != "incremental":
+            raise CommandError("❌ --delete-missing 只能搭配 --mode=incremental")
+
+        if self.mode != "incremental":
+            return
+
+        if self.truncate:
+            raise CommandError(
+                "❌ --mode=incremental 和 --truncate 不能同時使用(增量匯入不清空資料)"
+            )
+        if self.strategy == "swap":
+            raise CommandError("❌ --mode=incremental 不能搭配 --strategy=swap")
+        if self.delete_missing and self.limit:
+            raise CommandError(
+                "❌ --delete-missing 不能搭配 --limit, 否則未讀到的資料都會被刪除"
+            )
+
     def handle_resume(self):
-        """如果參數中 resume 為 True, 取回上次任務最後成功批次, 並設定下次任務開始批次"""
+        """
+        如果參數中 resume 為 True, 取回上次任務最後成功批次, 並設定下次任務開始批次
+
+        Raises:
+            CommandError: 上次任務的去重集合無法還原
+        """
         if self.resume:
-            self.start_batch = self.tracker.get_resume_batch()
+            try:
+                self.start_batch = self.tracker.get_resume_batch()
+            except ValueError as e:
+                # 去重集合不完整時續傳, 之後的 --delete-missing 會誤刪資料
+                raise CommandError(f"❌ 無法斷點續傳: {e}") from e
 
             if self.start_batch > 1:
                 self.stdout.write(f"  ⏩ 從批次 {self.start_batch} 繼續...")
             else:
                 # 如果開始批次為 1, 一律 drop table 以防 duplicate rows insert
-                self.truncate = True
+                # (增量匯入以 upsert 寫入, 重跑不會重複)
+                self.truncate = self.mode == "full"
+
+    def handle_unchanged_source(self) -> bool:
+        """
+        以條件式請求同步來源快取, 若來源與上次成功匯入相同則記錄略過。
+
+        Returns:
+            bool: 是否略過本次匯入
+
+        Raises:
+            CommandError: 來源下載失敗
+        """
+        self.stdout.write("🔎 檢查來源檔案是否變更...")
+
+        self.extractor = CSVExtractor(
+            self.source,
+            cache_dir=settings.ETL_CACHE_DIR,
+            download_workers=self.download_workers,
+            parser=self.parser,
+            spool_compression=self.spool_compression,
+        )
+        try:
+            changed = self.extractor.sync(force=self.force)
+        except requests.RequestException as e:
+            raise CommandError(f"資料下載失敗: {e}")
+
+        source_hash = self.extractor.source_hash
+        self.stdout.write(
+            f"  {'📥 已下載新版本' if changed else '📦 沿用本地快取'} "
+            f"(sha256: {source_hash[:12]})"
+        )
+
+        # 只有完整匯入才記錄雜湊, dry run / limit 不算數
+        if not self.dry_run and not self.limit:
+            self.tracker.source_hash = source_hash
+
+        if self.force or self.resume or self.dry_run:
+            return False
+
+        if not self.tracker.is_source_loaded(source_hash):
+            return False
+
+        job_run = self.tracker.skip("來源檔案未變更, 略過匯入")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  ⏭️  來源檔案與上次成功匯入相同, 略過本次 ETL (ID: {job_run.id})"
+            )
+        )
+        return True
 
     def handle_truncate(self):
         """如果參數 truncate 為 True 即做作資料庫全量覆蓋"""
@@ -140,15 +450,153 @@ class Command(BaseCommand):
                 return
             self._truncate_tables()
 
+    def handle_shadow_tables(self):
+        """swap 模式: 建立沒有索引與約束的 UNLOGGED 影子表, 之後的資料都寫入影子表"""
+        if self.strategy != "swap" or self.dry_run:
+            return
+
+        if not self._confirm_truncate():
+            raise CommandError("操作已取消")
+
+        self.stdout.write("🪞 建立影子表...")
+        self.shadow = ShadowTables()
+        try:
+            self.shadow.create()
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS("  ✅ 完成"))
+
     def handle_successful_etl_job(self):
         """執行 ETL Job, 更新成功結果, log 成功訊息"""
         # 可加入這行來強制失敗
         # raise Exception("測試失敗場景！")
 
-        with self._track_progress():
-            self._run_etl()
+        with self._track_progress(), self._load_profile():
+            with self._timed("載入"):
+                self._run_etl()
+            self._delete_missing()
+            if self.shadow is not None:
+                self._swap_shadow_tables()
         self.tracker.complete()
 
+    def _delete_missing(self):
+        """增量匯入: 刪除本次來源中沒有出現的營業人"""
+        if not self.delete_missing or self.dry_run:
+            return
+
+        # 失敗批次的統一編號不在 seen_bans 中, 此時刪除會誤刪仍存在的資料
+        if self.tracker.stats["skipped"]:
+            self.stdout.write(
+                self.style.WARNING("\n⚠️  有批次匯入失敗, 略過刪除已不存在的資料")
+            )
+            return
+
+        self.stdout.write("\n🧹 刪除來源中已不存在的資料...")
+        # 載入失敗的統一編號同樣出現在來源中, 需一併保留
+        present = SeenBanSet(
+            self.tracker.seen_bans.bits | self.tracker.rejected_bans.bits
+        )
+        with self._timed("刪除"):
+            deleted = self.loader.delete_missing(present)
+        self.tracker.add_changes({"deleted": deleted})
+        self.stdout.write(self.style.SUCCESS(f"  ✅ 已刪除 {deleted:,} 筆"))
+
+    def _swap_shadow_tables(self):
+        """
+        影子表建索引、約束並 ANALYZE 後, 與正式表交換
+
+        Raises:
+            CommandError: 有批次匯入失敗(--auto 略過)時影子表不完整, 不交換;
+                由 handle_failed_etl_job 刪除影子表並將任務標記為失敗
+        """
+        # 同 _delete_missing: 失敗批次的資料不在影子表中, 交換會讓正式表缺資料
+        if self.tracker.stats["skipped"]:
+            raise CommandError(
+                f"有批次匯入失敗(略過 {self.tracker.stats['skipped']:,} 筆), "
+                "影子表不完整, 不交換資料表"
+            )
+
+        self.stdout.write("\n🔨 階段 3: 建立索引與約束...")
+        with self._timed("建立索引"):
+            self.shadow.finalize(self.index_workers, self.session_settings)
+        self.stdout.write(self.style.SUCCESS("  ✅ 完成"))
+
+        self.stdout.write("🔀 交換資料表...")
+        with self._timed("交換資料表"):
+            self.shadow.swap()
+        self.stdout.write(self.style.SUCCESS("  ✅ 完成"))
+
+    @contextmanager
+    def _load_profile(self):
+        """
+        bulk 載入設定: 調整 session 參數, inplace 時先刪除非主鍵/唯一索引, 載入後再重建
+
+        刪除的索引先記在 ETLJobRun.deferred_indexes, 中斷時下次執行會補建。
+        """
+        pending = [] if self.dry_run else self.tracker.take_pending_indexes()
+        if pending:
+            # 先轉記到本次任務, 重建失敗時仍保有紀錄
+            self.tracker.defer_indexes(pending)
+
+        if self.load_profile != "bulk" or self.dry_run:
+            if pending:
+                self._rebuild_indexes(pending)
+            yield
+            return
+
+        with bulk_session(self.session_settings):
+            if self.shadow is None:
+                with self._timed("刪除索引"):
+                    self._drop_indexes(pending)
+            yield
+            if self.tracker.job_run.deferred_indexes:
+                self._rebuild_indexes(self.tracker.job_run.deferred_indexes)
+
+    def _drop_indexes(self, pending: list):
+        """刪除非主鍵/唯一索引, 連同先前未重建的一併記錄"""
+        self.stdout.write("🗑️  暫時刪除索引...")
+
+        deferred = {index["name"]: index for index in pending}
+        with connection.cursor() as cursor:
+            for table in SWAP_TABLES:
+                for index in secondary_indexes(cursor, table):
+                    deferred[index.name] = {"table": table, **index._asdict()}
+
+            # 先記錄再刪除, 確保中斷時一定能補建
+            self.tracker.defer_indexes(list(deferred.values()))
+            drop_indexes(
+                cursor,
+                [IndexDef(i["name"], i["definition"]) for i in deferred.values()],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"  ✅ 已刪除 {len(deferred)} 個索引"))
+
+    def _rebuild_indexes(self, indexes: list):
+        """依記錄的定義重建索引"""
+        self.stdout.write(f"\n🔨 重建 {len(indexes)} 個索引...")
+        with self._timed("重建索引"):
+            build_indexes(
+                [index["definition"] for index in indexes],
+                workers=self.index_workers,
+                session=self.session_settings,
+            )
+            with connection.cursor() as cursor:
+                for table in {index["table"] for index in indexes}:
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+        self.tracker.clear_deferred_indexes()
+        self.stdout.write(self.style.SUCCESS("  ✅ 完成"))
+
+    @contextmanager
+    def _timed(self, phase: str):
+        """記錄階段耗時, 於摘要輸出"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[phase] = (
+                self.phase_seconds.get(phase, 0) + time.perf_counter() - started
+            )
+
     @contextmanager
     def _track_progress(self):
         """追蹤執行進度"""
@@ -166,6 +614,17 @@ class Command(BaseCommand):
 
         self.tracker.fail(error)
 
+        # 正式表未受影響, 清掉未完成的影子表
+        if self.shadow is not None:
+            self.shadow.drop()
+
+        # bulk 載入中斷時盡量把索引建回來, 失敗的話下次執行會再補建
+        if self.tracker.job_run.deferred_indexes:
+            try:
+                self._rebuild_indexes(self.tracker.job_run.deferred_indexes)
+            except Exception:
+                logger.exception("索引重建失敗, 將於下次執行時補建")
+
         raise CommandError(f"執行失敗: {error}")
 
     def _run_etl(self):
@@ -173,45 +632,310 @@ class Command(BaseCommand):
         # 1. Extract: 下載資料
         self.stdout.write("📥 階段 1: 擷取資料...")
 
+        # 斷點續傳: 有位移索引時直接從未完成批次的 byte 位置開始讀
+        start_offset, start_row = self.tracker.get_resume_offset(
+            self.extractor.source_hash
+        )
+        first_chunk = 1
+        if start_offset is not None:
+            first_chunk = self.start_batch
+            self.stdout.write(f"  ⏩ 從 byte {start_offset:,} 開始讀取")
+
+        chunk_size = self.chunk_size
+        if self.adaptive_chunks:
+            if start_offset is None and self.start_batch > 1:
+                # 沒有位移索引時以批次編號跳過, 大小必須和上次相同
+                self.stdout.write(
+                    self.style.WARNING("  ⚠️  無位移索引可續傳, 改用固定 chunk 大小")
+                )
+            else:
+                self.sizer = AdaptiveChunkSizer(
+                    self.chunk_size, self.memory_budget * 1024 * 1024
+                )
+                self.tracker.chunk_sizes = self.sizer.history
+                chunk_size = self.sizer
+
         try:
-            extractor = CSVExtractor(self.CSV_URL)
-            data_chunks = extractor.fetch_chunks(self.chunk_size)
+            data_chunks = self.extractor.fetch_chunks(
+                chunk_size, start_offset=start_offset, start_row=start_row
+            )
         except requests.RequestException as e:
             raise CommandError(f"資料下載失敗: {e}")
 
         # 2. Transform & Load: 清理並載入
         self.transformer = TaxDataTransformer()
-        self.loader = BulkLoader(self.batch_size)
+        self.loader = BulkLoader(
+            self.batch_size,
+            table_suffix=ShadowTables.SUFFIX if self.shadow is not None else "",
+        )
 
         self.stdout.write("🔄 階段 2: 轉換並載入資料...")
 
-        # 處理每個 chunk
-        for chunk_num, df_chunk in enumerate(data_chunks, 1):
-            # Garbage collection after every loop
+        chunks = self._iter_chunks(data_chunks, first_chunk)
+        if self._pipelined():
+            with self._transform_processes():
+                self._run_pipelined(chunks)
+            return
+
+        for chunk_num, df_chunk in chunks:
+            try:
+                self._process_chunk(df_chunk, chunk_num)
+            except Exception as e:
+                self._chunk_failed(chunk_num, df_chunk, e)
+
+    def _iter_chunks(self, data_chunks, first_chunk: int):
+        """
+        依序產生 (批次編號, chunk), 跳過續傳前已完成的批次, 達到 --limit 即停止
 
+        每個 chunk 之間重設 RSS 高水位(批次指標的 peak_rss);
+        --adaptive-chunks 時量測每個 chunk 的耗時與 RSS 高水位, 交給 sizer 決定下一個大小。
+        """
+        if self.profiler is not None:
+            data_chunks = self.profiler.iterate("extract", data_chunks, first_chunk)
+
+        read = 0
+        started, start_rss = time.perf_counter(), current_rss()
+        reset_peak_rss()
+        for chunk_num, df_chunk in enumerate(data_chunks, first_chunk):
             if chunk_num < self.start_batch:
                 continue
 
             # 限制處理筆數(for testing)
-            self.stdout.write(f"目前已處理 {self.tracker.stats['total']}")
-            if self.limit and self.tracker.stats["total"] >= self.limit:
+            self.stdout.write(f"目前已處理 {read}")
+            if self.limit and read >= self.limit:
                 self.stdout.write(
                     self.style.WARNING(f"  已達到限制 ({self.limit} 筆),停止處理")
                 )
                 break
 
+            read += len(df_chunk)
+            yield chunk_num, df_chunk
+
+            # 量測區間: 此 chunk 的處理 + 下一個 chunk 的讀取解析(管線化時為送出速度)
+            if self.sizer is not None:
+                size = self.sizer.observe(
+                    chunk_num,
+                    len(df_chunk),
+                    time.perf_counter() - started,
+                    start_rss,
+                    peak_rss(),
+                )
+                self.stdout.write(f"  📏 下一個 chunk: {size:,} 筆")
+            if self.memory is not None:
+                self._memory_checkpoint(chunk_num)
+            started, start_rss = time.perf_counter(), current_rss()
+            reset_peak_rss()
+
+    def _pipelined(self) -> bool:
+        return (
+            self.transform_workers > 1
+            or self.load_workers > 1
+            or self.transform_processes > 0
+        )
+
+    @contextmanager
+    def _transform_processes(self):
+        """--transform-processes: 執行期間維持 worker 行程池"""
+        if not self.transform_processes:
+            yield
+            return
+
+        with ProcessTransformer(self.transform_processes) as transformer:
+            self.process_transformer = transformer
             try:
-                self._process_chunk(df_chunk, chunk_num)
-            except Exception as e:
-                logger.error(f"批次 {chunk_num} 處理失敗: {e}")
-                self.tracker.save_error_batch(df_chunk, chunk_num, str(e))
+                yield
+            finally:
+                self.process_transformer = None
+
+    def _run_pipelined(self, chunks):
+        """
+        管線化執行: transform 與多條連線的 COPY 同時進行(見 etl.pipeline.LoadPipeline)
+
+        跨批次去重需依批次順序, 在 screen 階段以「已送出載入」的統一編號判斷,
+        批次失敗或個別資料列載入失敗時再將統一編號移出, 之後的批次不會把它們當成已載入
+        (移出前已通過 screen 的批次仍視為重複); tracker.seen_bans 則只在批次依序完成時
+        加入, checkpoint 與逐批執行一致。
+        使用 worker 行程時, 每個行程由一個 transform 執行緒送出批次並等待結果。
+        """
+        transform_workers = max(self.transform_workers, self.transform_processes)
+        if self.transform_processes:
+            transform_label = f"{self.transform_processes} 個轉換行程"
+        else:
+            transform_label = f"{transform_workers} 個轉換執行緒"
+        self.stdout.write(
+            f"  ⚙️  管線化: {transform_label}, {self.load_workers} 條載入連線"
+        )
+        dispatched = SeenBanSet(self.tracker.seen_bans.bits.copy())
+        pending = {}  # 批次編號 → (chunk_range, 指標, 送出的統一編號), 依序完成時取出
+
+        def screen(chunk_num, df_chunk, transformed):
+            df_clean, errors, seconds = transformed
+            with self._stage("screen", chunk_num):
+                df_clean = self._screen_chunk(
+                    df_chunk, df_clean, errors, chunk_num, dispatched
+                )
+            dispatched.add(df_clean["統一編號"])
+            pending[chunk_num] = (
+                df_chunk.attrs.get("chunk_range"),
+                self._new_metrics(chunk_num, df_chunk, len(df_clean), seconds),
+                df_clean["統一編號"],
+            )
+            if df_clean.empty or self.dry_run:
+                if self.dry_run:
+                    self._report_dry_run(chunk_num, len(df_clean))
+                return None
+            return df_clean
+
+        def complete(chunk_num, result):
+            chunk_range, metrics, _ = pending.pop(chunk_num)
+            with self._stage("tracker", chunk_num):
+                if result is not None:
+                    self._report_loaded(chunk_num, result)
+                    self._mark_loaded(result)
+                    dispatched.discard(result["rejected"]["統一編號"])
+                    with self._timed_metric(metrics, "progress_seconds"):
+                        self.tracker.update_progress(chunk_num, chunk_range)
+                self._record_metrics(metrics, result)
 
-                # 決定是否繼續
-                if not self._should_continue_on_error():
-                    raise
+        def fail(chunk_num, df, error):
+            # transform 失敗的批次尚未送出, 沒有需要移出的統一編號
+            _, _, bans = pending.pop(chunk_num, (None, None, None))
+            if bans is not None:
+                dispatched.discard(bans)
+            self._chunk_failed(chunk_num, df, error)
+
+        LoadPipeline(
+            transform=self._transform_chunk,
+            screen=screen,
+            load=self._load_stage,
+            complete=complete,
+            fail=fail,
+            transform_workers=transform_workers,
+            load_workers=self.load_workers,
+            setup=self._setup_load_connection,
+        ).run(chunks)
+
+    def _setup_load_connection(self):
+        """載入執行緒的連線同樣套用 bulk session 參數"""
+        if self.load_profile == "bulk":
+            with connection.cursor() as cursor:
+                apply_session(cursor, self.session_settings)
+
+    def _chunk_failed(self, chunk_num: int, df: pd.DataFrame, error: Exception):
+        """記錄失敗批次, 依設定決定是否繼續(不繼續時重新拋出)"""
+        logger.error(f"批次 {chunk_num} 處理失敗: {error}")
+        self.tracker.save_error_batch(df, chunk_num, str(error))
+        self.tracker.add_skipped(len(df))
+
+        # 決定是否繼續
+        if not self._should_continue_on_error():
+            raise error
 
     def _process_chunk(self, df_chunk: pd.DataFrame, chunk_num: int):
         """處理單一 chunk"""
+        df_clean, errors, seconds = self._transform_chunk(chunk_num, df_chunk)
+        with self._stage("screen", chunk_num):
+            df_clean = self._screen_chunk(
+                df_chunk, df_clean, errors, chunk_num, self.tracker.seen_bans
+            )
+        metrics = self._new_metrics(chunk_num, df_chunk, len(df_clean), seconds)
+        result = None
+
+        # Load: 載入資料庫
+        if not df_clean.empty and not self.dry_run:
+            result = self._load_stage(chunk_num, df_clean)
+
+        with self._stage("tracker", chunk_num):
+            if result is not None:
+                self._report_loaded(chunk_num, result)
+                # 批次成功後才加入去重集合, 失敗的批次不會擋掉之後的同一統一編號
+                self._mark_loaded(result)
+                # 更新進度
+                with self._timed_metric(metrics, "progress_seconds"):
+                    self.tracker.update_progress(
+                        chunk_num, df_chunk.attrs.get("chunk_range")
+                    )
+            elif self.dry_run:
+                self.tracker.seen_bans.add(df_clean["統一編號"])
+                self._report_dry_run(chunk_num, len(df_clean))
+
+            self._record_metrics(metrics, result)
+
+    def _transform_chunk(self, chunk_num: int, df_chunk: pd.DataFrame) -> tuple:
+        """
+        轉換(可在 transform 執行緒中執行), 返回 (清理後資料, 錯誤表, 秒數)
+
+        有 worker 行程時交給行程執行, 秒數包含交接時間。
+        """
+        transformer = self.process_transformer or self.transformer
+        started = time.perf_counter()
+        with self._stage("transform", chunk_num):
+            df_clean, errors = transformer.process(df_chunk, chunk_num)
+        return df_clean, errors, time.perf_counter() - started
+
+    def _stage(self, name: str, chunk_num: int):
+        """--profile 時剖析此區段"""
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name, chunk_num)
+
+    @contextmanager
+    def _profiling(self):
+        """--profile: 剖析前 --profile-chunks 個批次, 結束時寫出結果"""
+        if not self.profile:
+            yield
+            return
+
+        self.profiler = StageProfiler(
+            Path(settings.ETL_PROFILE_DIR) / f"job_{self.tracker.job_run.id}",
+            max_chunks=self.profile_chunks,
+            deterministic=not self._pipelined(),
+        ).start()
+        try:
+            yield
+        finally:
+            self.profiler.stop()
+            self._print_profile()
+
+    def _new_metrics(
+        self, chunk_num: int, df_chunk: pd.DataFrame, rows_out: int, seconds: float
+    ) -> dict:
+        """建立批次指標(欄位同 ChunkMetric), 載入與進度更新的時間之後再補上"""
+        chunk_range = df_chunk.attrs.get("chunk_range")
+        return {
+            "batch_number": chunk_num,
+            "rows_in": len(df_chunk),
+            "rows_out": rows_out,
+            "bytes_read": chunk_range[1] - chunk_range[0] if chunk_range else 0,
+            "extract_seconds": df_chunk.attrs.get("extract_seconds", 0.0),
+            "transform_seconds": seconds,
+        }
+
+    @contextmanager
+    def _timed_metric(self, metrics: dict, field: str):
+        """將區段耗時寫入批次指標"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics[field] = time.perf_counter() - started
+
+    def _record_metrics(self, metrics: dict, result: Optional[dict] = None):
+        """補上 COPY 耗時與 RSS 高水位後交給 tracker 批次寫入"""
+        if result is not None:
+            metrics.update(result["timings"])
+        metrics["peak_rss"] = peak_rss()
+        self.tracker.record_chunk_metrics(metrics)
+
+    def _screen_chunk(
+        self,
+        df_chunk: pd.DataFrame,
+        df_clean: pd.DataFrame,
+        errors: pd.DataFrame,
+        chunk_num: int,
+        seen: SeenBanSet,
+    ) -> pd.DataFrame:
+        """跨批次去重、統計並記錄錯誤(需依批次順序執行), 返回要載入的資料"""
         original_count = len(df_chunk)
 
         self.stdout.write(f"\n📦 批次 {chunk_num}")
@@ -226,22 +950,30 @@ class Command(BaseCommand):
                 "raw_count": original_count,
             },
         )
-        # Transform: 清理資料
-        df_clean, errors = self.transformer.process(df_chunk, chunk_num)
+        df_clean, seen_errors = self.transformer.drop_seen(df_clean, chunk_num, seen)
+        errors = pd.concat([errors, seen_errors], ignore_index=True)
         self.stdout.write(f"  清理: {original_count:,} → {len(df_clean):,} 筆")
 
-        self.tracker.add_failed(len(errors))
+        # 警告(總機構統一編號被清空)的資料仍會載入, 不算失敗
+        warnings_count = int(errors["type"].isin(WARNING_TYPES).sum())
+        self.tracker.add_failed(len(errors) - warnings_count)
+        self.tracker.add_warnings(warnings_count)
         self.tracker.add_total(original_count)
 
         # 統計重複筆數
-        duplicates_count = sum(1 for e in errors if e["type"] == "DUPLICATE")
+        duplicates_count = int((errors["type"] == "DUPLICATE").sum())
         self.tracker.add_duplicates(duplicates_count)
 
         # 記錄錯誤
-        if errors:
+        if not errors.empty:
             # If any row has error, record which batch it is in has error
             self.tracker.record_errors(errors, chunk_num)
-            self.stdout.write(self.style.WARNING(f"  ⚠️  驗證失敗: {len(errors)} 筆"))
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  ⚠️  驗證失敗: {len(errors) - warnings_count} 筆, "
+                    f"警告: {warnings_count} 筆"
+                )
+            )
 
             logger.warning(
                 "批次驗證有錯誤",
@@ -252,37 +984,130 @@ class Command(BaseCommand):
                     "error_count": len(errors),
                 },
             )
-        # Load: 載入資料庫
-        if not df_clean.empty and not self.dry_run:
-            success_count = self.loader.insert(df_clean)
-            self.tracker.add_success(success_count)
-            self.stdout.write(
-                self.style.SUCCESS(f"  ✅ 成功匯入: {success_count:,} 筆")
+
+        return df_clean
+
+    def _load_stage(self, chunk_num: int, df_clean: pd.DataFrame) -> dict:
+        """載入一個批次(可在載入執行緒中執行)"""
+        with self._stage("load", chunk_num):
+            return self._load_chunk(df_clean)
+
+    def _load_chunk(self, df_clean: pd.DataFrame) -> dict:
+        """
+        寫入資料庫(可在載入執行緒中執行, 不更新 tracker)
+
+        因個別資料列失敗(約束、格式)時以二分法重試, 只排除問題列,
+        其餘照常載入; 被排除的列於 _report_loaded 記入錯誤紀錄。
+        bans 只含已載入的統一編號, 被排除的列見 rejected(見 _mark_loaded)。
+        """
+        timings = {}
+        rejected, messages = df_clean.iloc[:0], []
+        try:
+            outputs = [self._load_part(df_clean, timings)]
+        except BulkLoader.ROW_ERRORS as e:
+            logger.warning(f"批次載入失敗, 以二分法找出問題資料: {e}")
+            outputs, rejected, messages = self.loader.load_bisecting(
+                df_clean, lambda part: self._load_part(part, timings)
             )
-            logger.info(
-                "批次處理完成",
-                extra={
-                    "event": "batch_completed",
-                    "job_run_id": self.tracker.job_run.id,
-                    "batch_num": chunk_num,
-                    "records_processed": success_count,
+
+        result = {
+            "count": len(df_clean) - len(rejected),
+            "bans": df_clean.loc[~df_clean.index.isin(rejected.index), "統一編號"],
+            "rejected": rejected,
+            "messages": messages,
+            "timings": timings,
+        }
+        if self.mode == "incremental":
+            result["changes"] = {
+                key: sum(output[key] for output in outputs)
+                for key in ("inserted", "updated", "unchanged")
+            }
+        return result
+
+    def _mark_loaded(self, result: dict):
+        """
+        已載入的統一編號加入去重集合
+
+        被排除的列仍出現在來源中, 記入 tracker.rejected_bans, --delete-missing
+        才不會刪除它們在資料庫中的既有資料; 但不加入去重集合,
+        之後批次中同一統一編號的有效資料不會被當成重複。
+        """
+        self.tracker.seen_bans.add(result["bans"])
+        self.tracker.rejected_bans.add(result["rejected"]["統一編號"])
+
+    def _load_part(self, df: pd.DataFrame, timings: dict):
+        """載入一段資料, 耗時累加到 timings"""
+        part_timings = {}
+        if self.mode == "incremental":
+            output = self.loader.upsert(df, part_timings)
+        else:
+            output = self.loader.insert(df, part_timings)
+
+        for key, seconds in part_timings.items():
+            timings[key] = timings.get(key, 0.0) + seconds
+        return output
+
+    def _report_loaded(self, chunk_num: int, result: dict):
+        """累計並輸出載入結果"""
+        success_count = result["count"]
+        rejected = result["rejected"]
+        if not rejected.empty:
+            errors = pd.DataFrame(
+                {
+                    "type": "LOAD_ERROR",
+                    "batch": chunk_num,
+                    "ban": rejected["統一編號"].to_numpy(),
+                    "row": rejected.index.to_numpy(dtype="int64"),
+                    "message": result["messages"],
                 },
+                columns=ERROR_COLUMNS,
             )
-            # 更新進度
-            self.tracker.update_progress(chunk_num)
-        elif self.dry_run:
+            self.tracker.record_errors(errors, chunk_num)
+            self.tracker.add_failed(len(errors))
             self.stdout.write(
-                self.style.NOTICE(f"  🔍 DRY RUN: 將匯入 {len(df_clean):,} 筆")
+                self.style.WARNING(f"  ⚠️  載入失敗已排除: {len(errors):,} 筆")
             )
-            logger.info(
-                "Dry run 批次預覽",
-                extra={
-                    "event": "batch_dry_run",
-                    "job_run_id": self.tracker.job_run.id,
-                    "batch_num": chunk_num,
-                    "would_process": len(df_clean),
-                },
+
+        changes = result.get("changes")
+        if changes is not None:
+            self.tracker.add_changes(changes)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"  ✅ 批次 {chunk_num}: 新增 {changes['inserted']:,} / "
+                    f"更新 {changes['updated']:,} / "
+                    f"未變更 {changes['unchanged']:,} 筆"
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"  ✅ 批次 {chunk_num} 成功匯入: {success_count:,} 筆"
+                )
             )
+        self.tracker.add_success(success_count)
+
+        logger.info(
+            "批次處理完成",
+            extra={
+                "event": "batch_completed",
+                "job_run_id": self.tracker.job_run.id,
+                "batch_num": chunk_num,
+                "records_processed": success_count,
+            },
+        )
+
+    def _report_dry_run(self, chunk_num: int, count: int):
+        """輸出 dry run 預覽"""
+        self.stdout.write(self.style.NOTICE(f"  🔍 DRY RUN: 將匯入 {count:,} 筆"))
+        logger.info(
+            "Dry run 批次預覽",
+            extra={
+                "event": "batch_dry_run",
+                "job_run_id": self.tracker.job_run.id,
+                "batch_num": chunk_num,
+                "would_process": count,
+            },
+        )
 
     def _print_summary(self):
         """輸出執行摘要"""
@@ -307,12 +1132,66 @@ class Command(BaseCommand):
 
         if stats["failed"] > 0:
             self.stdout.write(self.style.ERROR(f"  ❌ 失敗:    {stats['failed']:,}"))
+            sink = self.tracker.error_sink
+            for error_type, count in sorted(sink.counts.items()):
+                if error_type not in WARNING_TYPES:
+                    self.stdout.write(f"     {error_type}: {count:,}")
+            if sink.sidecar_path is not None:
+                self.stdout.write(
+                    f"     超過資料庫上限的 {sink.sidecar_rows:,} 筆: {sink.sidecar_path}"
+                )
 
         if stats["duplicates"] > 0:
             self.stdout.write(
                 self.style.WARNING(f"  🔄 重複:    {stats['duplicates']:,}")
             )
 
+        if stats["warnings"] > 0:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  ⚠️  警告:    {stats['warnings']:,} (總機構統一編號已清空, 資料仍匯入)"
+                )
+            )
+            for error_type, count in sorted(self.tracker.error_sink.counts.items()):
+                if error_type in WARNING_TYPES:
+                    self.stdout.write(f"     {error_type}: {count:,}")
+
+        if self.mode == "incremental":
+            self.stdout.write("\n異動統計:")
+            self.stdout.write(f"  新增:       {stats['inserted']:,}")
+            self.stdout.write(f"  更新:       {stats['updated']:,}")
+            self.stdout.write(f"  未變更:     {stats['unchanged']:,}")
+            self.stdout.write(f"  刪除:       {stats['deleted']:,}")
+
+        self.stdout.write("\n擷取效能:")
+        self.stdout.write(
+            f"  下載:       {self.extractor.download_mb_per_second:,.1f} MB/s"
+        )
+        self.stdout.write(
+            f"  解析:       {self.extractor.parse_rows_per_second:,.0f} rows/s"
+        )
+        if self.phase_seconds:
+            self.stdout.write("\n階段耗時:")
+            for phase, seconds in self.phase_seconds.items():
+                self.stdout.write(f"  {phase}: {seconds:10,.2f} 秒")
+
+        if self.sizer is not None and self.sizer.history:
+            sizes = [entry["size"] for entry in self.sizer.history]
+            self.stdout.write(
+                f"  Chunk 大小: {min(sizes):,} ~ {max(sizes):,} 筆 "
+                f"(RSS 高水位 {max(e['peak_rss_mb'] for e in self.sizer.history):,.0f} MB"
+                f" / 預算 {self.memory_budget:,} MB)"
+            )
+
+        self._print_chunk_metrics()
+
+        download = self.extractor.download_stats
+        if download["wire_bytes"]:
+            self.stdout.write(
+                f"  傳輸量:     {download['wire_bytes'] / 1024 / 1024:,.1f} MB "
+                f"(解壓後 {download['bytes'] / 1024 / 1024:,.1f} MB)"
+            )
+
         self.stdout.write(f"\n{'=' * 60}\n")  # Line separater
 
         # 提示查看詳細錯誤
@@ -338,9 +1217,112 @@ class Command(BaseCommand):
                 "records_success": stats["success"],
                 "records_failed": stats["failed"],
                 "records_duplicates": stats["duplicates"],
+                "records_inserted": stats["inserted"],
+                "records_updated": stats["updated"],
+                "records_unchanged": stats["unchanged"],
+                "records_deleted": stats["deleted"],
+                "download_mb_per_second": round(
+                    self.extractor.download_mb_per_second, 2
+                ),
+                "parse_rows_per_second": round(self.extractor.parse_rows_per_second),
             },
         )
 
+    @contextmanager
+    def _tracking_memory(self):
+        """--track-memory: 於 chunk 邊界記錄記憶體用量, 結束時輸出成長位置"""
+        if not self.track_memory:
+            yield
+            return
+
+        self.memory = MemoryTracker().start()
+        try:
+            yield
+        finally:
+            self._print_memory()
+            self.memory.stop()
+
+    def _memory_checkpoint(self, chunk_num: int):
+        record = self.memory.checkpoint(chunk_num)
+        self.stdout.write(
+            f"  🧠 RSS {record['rss'] / 1024**2:,.1f} MB / "
+            f"Python heap {record['traced'] / 1024**2:,.1f} MB / "
+            f"Arrow {record['arrow'] / 1024**2:,.1f} MB"
+        )
+        for growth in record["growth"][:3]:
+            self.stdout.write(
+                f"      +{growth['size_diff'] / 1024:,.0f} KB  {growth['location']}"
+            )
+
+    def _print_memory(self):
+        """輸出累計成長最多的配置位置, 持續成長超過門檻時警告"""
+        self.stdout.write(self.style.MIGRATE_HEADING("\n記憶體追蹤:"))
+        records = self.memory.records
+        if not records:
+            self.stdout.write("  沒有完成的 chunk")
+            return
+
+        first, last = records[0], records[-1]
+        for key, label in [
+            ("rss", "RSS"),
+            ("traced", "Python heap"),
+            ("arrow", "Arrow"),
+        ]:
+            self.stdout.write(
+                f"  {label}: {first[key] / 1024**2:,.1f} → {last[key] / 1024**2:,.1f} MB"
+            )
+
+        growth = self.memory.cumulative_growth()
+        if growth:
+            self.stdout.write(f"  批次 {first['chunk']} → {last['chunk']} 累計成長:")
+        for item in growth:
+            self.stdout.write(
+                f"      +{item['size_diff'] / 1024:,.0f} KB "
+                f"({item['count_diff']:+,} 個)  {item['location']}"
+            )
+
+        leaks = self.memory.leaks(self.leak_threshold * 1024 * 1024)
+        for key, size in leaks.items():
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  ⚠️  {key} 跨 chunk 持續成長 {size / 1024**2:,.1f} MB, 可能有記憶體洩漏"
+                )
+            )
+            logger.warning(
+                "記憶體跨 chunk 持續成長",
+                extra={
+                    "event": "memory_growth",
+                    "job_run_id": self.tracker.job_run.id,
+                    "metric": key,
+                    "growth": size,
+                },
+            )
+
+    def _print_profile(self):
+        """輸出各階段剖析耗時與最耗時的函式(cProfile 或取樣)"""
+        profiler = self.profiler
+        self.stdout.write(self.style.MIGRATE_HEADING("\n效能剖析:"))
+        for name, seconds in profiler.seconds.items():
+            self.stdout.write(f"  {name}: {seconds:.3f} 秒")
+            for function, own in profiler.top_functions(name, limit=3):
+                self.stdout.write(f"      {own:8.3f}  {function}")
+        self.stdout.write(f"  📁 {profiler.output_dir}")
+
+    def _print_chunk_metrics(self):
+        """各階段每批次耗時的 p50 / p95"""
+        metrics = self.tracker.chunk_metrics
+        if not metrics:
+            return
+
+        self.stdout.write(f"\n批次耗時 ({len(metrics)} 批, p50 / p95 秒):")
+        for label, field in METRIC_STAGES.items():
+            values = [m.get(field, 0.0) for m in metrics]
+            p50, p95 = np.percentile(values, [50, 95])
+            self.stdout.write(f"  {label}: {p50:.3f} / {p95:.3f}")
+
+        peak = max(m["peak_rss"] for m in metrics)
+        self.stdout.write(f"  RSS 高水位: {peak / 1024 / 1024:,.1f} MB")
+
     def _confirm_truncate(self) -> bool:
         """確認清空資料"""
         count = TaxRegistration.objects.count()
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0005_etljobrun_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="etljobrun",
+            name="source_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="完整匯入成功時記錄來源 CSV 的 sha256, 用於判斷來源是否變更",
+                max_length=64,
+                verbose_name="來源檔案雜湊",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="etljobrun",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("running", "執行中"),
+                    ("success", "成功"),
+                    ("failed", "失敗"),
+                    ("partial", "部分成功"),
+                    ("skipped", "略過(來源未變更)"),
+                ],
+                db_index=True,
+                default="running",
+                max_length=20,
+                verbose_name="狀態",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0006_etljobrun_source_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importprogress",
+            name="chunk_index",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="{批次編號: [起始 byte, 結束 byte, 起始列號, 筆數]}, 斷點續傳時直接 seek",
+                verbose_name="批次位移索引",
+            ),
+        ),
+        migrations.AddField(
+            model_name="importprogress",
+            name="source_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="位移索引所對應的來源 CSV sha256",
+                max_length=64,
+                verbose_name="來源檔案雜湊",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0007_importprogress_chunk_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importprogress",
+            name="seen_bans",
+            field=models.BinaryField(
+                blank=True,
+                help_text="跨批次去重用的統一編號 bitmap(zlib 壓縮), 斷點續傳時還原",
+                null=True,
+                verbose_name="已處理統一編號",
+            ),
+        ),
+    ]
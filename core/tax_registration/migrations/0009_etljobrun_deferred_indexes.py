@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0008_importprogress_seen_bans"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="etljobrun",
+            name="deferred_indexes",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="bulk 載入模式暫時刪除的索引 [{table, name, definition}], 重建後清空",
+                verbose_name="延後重建的索引",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0009_etljobrun_deferred_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="etljobrun",
+            name="records_deleted",
+            field=models.IntegerField(default=0, verbose_name="刪除筆數"),
+        ),
+        migrations.AddField(
+            model_name="etljobrun",
+            name="records_inserted",
+            field=models.IntegerField(default=0, verbose_name="新增筆數"),
+        ),
+        migrations.AddField(
+            model_name="etljobrun",
+            name="records_unchanged",
+            field=models.IntegerField(default=0, verbose_name="未變更筆數"),
+        ),
+        migrations.AddField(
+            model_name="etljobrun",
+            name="records_updated",
+            field=models.IntegerField(default=0, verbose_name="更新筆數"),
+        ),
+        migrations.AddField(
+            model_name="taxregistration",
+            name="content_hash",
+            field=models.BigIntegerField(
+                blank=True,
+                editable=False,
+                help_text="清理後欄位(含行業別)的 64-bit 雜湊, 增量匯入時用來判斷資料是否變更",
+                null=True,
+                verbose_name="內容雜湊",
+            ),
+        ),
+    ]
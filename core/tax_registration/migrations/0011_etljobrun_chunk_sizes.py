@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "tax_registration",
+            "0010_etljobrun_records_deleted_etljobrun_records_inserted_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="etljobrun",
+            name="chunk_sizes",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="--adaptive-chunks 時每個 chunk 的 {chunk, size, rows, rows_per_second, peak_rss_mb}",
+                verbose_name="自動調整的 Chunk 大小",
+            ),
+        ),
+    ]
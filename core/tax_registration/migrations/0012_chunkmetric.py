@@ -0,0 +1,86 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0011_etljobrun_chunk_sizes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChunkMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("batch_number", models.IntegerField(verbose_name="批次編號")),
+                ("rows_in", models.IntegerField(default=0, verbose_name="讀入筆數")),
+                ("rows_out", models.IntegerField(default=0, verbose_name="載入筆數")),
+                (
+                    "bytes_read",
+                    models.BigIntegerField(default=0, verbose_name="讀取 bytes"),
+                ),
+                (
+                    "extract_seconds",
+                    models.FloatField(default=0, verbose_name="擷取秒數"),
+                ),
+                (
+                    "transform_seconds",
+                    models.FloatField(default=0, verbose_name="轉換秒數"),
+                ),
+                (
+                    "copy_seconds",
+                    models.FloatField(default=0, verbose_name="COPY 秒數"),
+                ),
+                (
+                    "industry_seconds",
+                    models.FloatField(default=0, verbose_name="行業別載入秒數"),
+                ),
+                (
+                    "progress_seconds",
+                    models.FloatField(default=0, verbose_name="進度更新秒數"),
+                ),
+                (
+                    "peak_rss",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="處理此批次期間的 RSS 高水位 (bytes)",
+                        verbose_name="RSS 高水位",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="建立時間"),
+                ),
+                (
+                    "job_run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunk_metrics",
+                        to="tax_registration.etljobrun",
+                        verbose_name="ETL執行",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "批次效能指標",
+                "verbose_name_plural": "批次效能指標",
+                "db_table": "etl_chunk_metric",
+                "ordering": ["job_run", "batch_number"],
+                "indexes": [
+                    models.Index(
+                        fields=["job_run", "batch_number"], name="idx_metric_job_batch"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0012_chunkmetric"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="etljobrun",
+            name="error_counts",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="{錯誤類型: 筆數}, 包含超過資料庫上限而寫入壓縮檔的錯誤",
+                verbose_name="各類型錯誤筆數",
+            ),
+        ),
+        migrations.AddField(
+            model_name="etljobrun",
+            name="error_file",
+            field=models.CharField(
+                blank=True,
+                help_text="超過 ETL_ERROR_DB_LIMIT 的錯誤寫入的 gzip CSV 路徑",
+                max_length=500,
+                verbose_name="錯誤紀錄壓縮檔",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0013_etljobrun_error_counts_etljobrun_error_file"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="importprogress",
+            name="seen_bans",
+        ),
+        migrations.AddField(
+            model_name="importprogress",
+            name="seen_ban_count",
+            field=models.IntegerField(
+                blank=True,
+                help_text="跨批次去重集合的筆數, 斷點續傳還原 SeenBanDelta 後據此驗證",
+                null=True,
+                verbose_name="已處理統一編號數",
+            ),
+        ),
+        migrations.CreateModel(
+            name="SeenBanDelta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("batch_number", models.IntegerField(verbose_name="批次編號")),
+                (
+                    "bans",
+                    models.BinaryField(
+                        help_text="排序後的相鄰差值(uint32), zlib 壓縮",
+                        verbose_name="統一編號",
+                    ),
+                ),
+                (
+                    "progress",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="seen_ban_deltas",
+                        to="tax_registration.importprogress",
+                        verbose_name="匯入進度",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "去重集合增量",
+                "verbose_name_plural": "去重集合增量",
+                "db_table": "import_seen_ban_delta",
+                "ordering": ["progress", "batch_number"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("progress", "batch_number"),
+                        name="uniq_seen_delta_batch",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:04
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0014_seen_ban_delta"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="etljobrun",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                db_default=django.db.models.functions.datetime.Now(),
+                db_index=True,
+                verbose_name="更新時間",
+            ),
+        ),
+    ]
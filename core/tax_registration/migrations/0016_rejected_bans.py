@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tax_registration", "0015_etljobrun_updated_at_auto_now"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importprogress",
+            name="rejected_ban_count",
+            field=models.IntegerField(
+                blank=True,
+                help_text="載入時被排除的統一編號筆數, 斷點續傳還原後據此驗證",
+                null=True,
+                verbose_name="載入失敗統一編號數",
+            ),
+        ),
+        migrations.AddField(
+            model_name="seenbandelta",
+            name="rejected_bans",
+            field=models.BinaryField(
+                help_text="載入時被排除(不加入去重集合)的統一編號, 格式同 bans",
+                null=True,
+                verbose_name="載入失敗統一編號",
+            ),
+        ),
+    ]
@@ -51,6 +51,14 @@ class TaxRegistration(models.Model):
         default=False,
     )
 
+    content_hash = models.BigIntegerField(
+        "內容雜湊",
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="清理後欄位(含行業別)的 64-bit 雜湊, 增量匯入時用來判斷資料是否變更",
+    )
+
     # 系統欄位
     created_at = models.DateTimeField(
         "建立時間",
@@ -136,11 +144,14 @@ class ETLJobRun(models.Model):
         ("success", "成功"),
         ("failed", "失敗"),
         ("partial", "部分成功"),  # TODO
+        ("skipped", "略過(來源未變更)"),
     ]
 
     started_at = models.DateTimeField("開始時間", auto_now_add=True, db_index=True)
+    # 執行中由 Heartbeat 定期更新; auto_now 讓 tracker 的 save() 寫入當下時間,
+    # 不會把心跳蓋回建立時的值
     updated_at = models.DateTimeField(
-        "更新時間", auto_now_add=True, db_index=True, db_default=Now()
+        "更新時間", auto_now=True, db_index=True, db_default=Now()
     )
 
     completed_at = models.DateTimeField("完成時間", null=True, blank=True)
@@ -157,14 +168,59 @@ class ETLJobRun(models.Model):
 
     records_duplicated = models.IntegerField("重複筆數", default=0)
 
+    # 增量匯入(--mode=incremental)的異動筆數
+    records_inserted = models.IntegerField("新增筆數", default=0)
+
+    records_updated = models.IntegerField("更新筆數", default=0)
+
+    records_unchanged = models.IntegerField("未變更筆數", default=0)
+
+    records_deleted = models.IntegerField("刪除筆數", default=0)
+
     error_message = models.TextField("錯誤訊息", blank=True)
 
+    error_counts = models.JSONField(
+        "各類型錯誤筆數",
+        default=dict,
+        blank=True,
+        help_text="{錯誤類型: 筆數}, 包含超過資料庫上限而寫入壓縮檔的錯誤",
+    )
+
+    error_file = models.CharField(
+        "錯誤紀錄壓縮檔",
+        max_length=500,
+        blank=True,
+        help_text="超過 ETL_ERROR_DB_LIMIT 的錯誤寫入的 gzip CSV 路徑",
+    )
+
     batch_size = models.IntegerField("批次大小", default=10000)
 
     chunk_size = models.IntegerField("Chunk 大小", default=50000)
 
+    chunk_sizes = models.JSONField(
+        "自動調整的 Chunk 大小",
+        default=list,
+        blank=True,
+        help_text="--adaptive-chunks 時每個 chunk 的 {chunk, size, rows, rows_per_second, peak_rss_mb}",
+    )
+
     data_source_url = models.URLField("資料來源網址", blank=True)
 
+    source_hash = models.CharField(
+        "來源檔案雜湊",
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="完整匯入成功時記錄來源 CSV 的 sha256, 用於判斷來源是否變更",
+    )
+
+    deferred_indexes = models.JSONField(
+        "延後重建的索引",
+        default=list,
+        blank=True,
+        help_text="bulk 載入模式暫時刪除的索引 [{table, name, definition}], 重建後清空",
+    )
+
     class Meta:
         db_table = "etl_job_run"
         verbose_name = "ETL執行紀錄"
@@ -249,6 +305,34 @@ class ImportProgress(models.Model):
 
     current_batch = models.IntegerField("當前批次", default=0)
 
+    chunk_index = models.JSONField(
+        "批次位移索引",
+        default=dict,
+        blank=True,
+        help_text="{批次編號: [起始 byte, 結束 byte, 起始列號, 筆數]}, 斷點續傳時直接 seek",
+    )
+
+    source_hash = models.CharField(
+        "來源檔案雜湊",
+        max_length=64,
+        blank=True,
+        help_text="位移索引所對應的來源 CSV sha256",
+    )
+
+    seen_ban_count = models.IntegerField(
+        "已處理統一編號數",
+        null=True,
+        blank=True,
+        help_text="跨批次去重集合的筆數, 斷點續傳還原 SeenBanDelta 後據此驗證",
+    )
+
+    rejected_ban_count = models.IntegerField(
+        "載入失敗統一編號數",
+        null=True,
+        blank=True,
+        help_text="載入時被排除的統一編號筆數, 斷點續傳還原後據此驗證",
+    )
+
     updated_at = models.DateTimeField("更新時間", auto_now=True)
 
     class Meta:
@@ -265,3 +349,88 @@ class ImportProgress(models.Model):
         if self.total_batches > 0:
             return (self.current_batch / self.total_batches) * 100
         return 0
+
+
+class SeenBanDelta(models.Model):
+    """斷點續傳用: 每個成功批次加入跨批次去重集合與載入失敗的統一編號"""
+
+    progress = models.ForeignKey(
+        ImportProgress,
+        on_delete=models.CASCADE,
+        related_name="seen_ban_deltas",
+        verbose_name="匯入進度",
+    )
+
+    batch_number = models.IntegerField("批次編號")
+
+    bans = models.BinaryField(
+        "統一編號", help_text="排序後的相鄰差值(uint32), zlib 壓縮"
+    )
+
+    rejected_bans = models.BinaryField(
+        "載入失敗統一編號",
+        null=True,
+        help_text="載入時被排除(不加入去重集合)的統一編號, 格式同 bans",
+    )
+
+    class Meta:
+        db_table = "import_seen_ban_delta"
+        verbose_name = "去重集合增量"
+        verbose_name_plural = "去重集合增量"
+        ordering = ["progress", "batch_number"]
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["progress", "batch_number"], name="uniq_seen_delta_batch"
+            ),
+        ]
+
+
+class ChunkMetric(models.Model):
+    """每個批次各階段的耗時與資源用量"""
+
+    job_run = models.ForeignKey(
+        ETLJobRun,
+        on_delete=models.CASCADE,
+        related_name="chunk_metrics",
+        verbose_name="ETL執行",
+    )
+
+    batch_number = models.IntegerField("批次編號")
+
+    rows_in = models.IntegerField("讀入筆數", default=0)
+
+    rows_out = models.IntegerField("載入筆數", default=0)
+
+    bytes_read = models.BigIntegerField("讀取 bytes", default=0)
+
+    extract_seconds = models.FloatField("擷取秒數", default=0)
+
+    transform_seconds = models.FloatField("轉換秒數", default=0)
+
+    copy_seconds = models.FloatField("COPY 秒數", default=0)
+
+    industry_seconds = models.FloatField("行業別載入秒數", default=0)
+
+    progress_seconds = models.FloatField("進度更新秒數", default=0)
+
+    peak_rss = models.BigIntegerField(
+        "RSS 高水位", default=0, help_text="處理此批次期間的 RSS 高水位 (bytes)"
+    )
+
+    created_at = models.DateTimeField("建立時間", auto_now_add=True)
+
+    class Meta:
+        db_table = "etl_chunk_metric"
+        verbose_name = "批次效能指標"
+        verbose_name_plural = "批次效能指標"
+        ordering = ["job_run", "batch_number"]
+
+        indexes = [
+            models.Index(
+                fields=["job_run", "batch_number"], name="idx_metric_job_batch"
+            ),
+        ]
+
+    def __str__(self):
+        return f"批次{self.batch_number} - {self.rows_in} 筆"
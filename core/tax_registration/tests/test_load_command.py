@@ -0,0 +1,71 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from core.tax_registration.etl.synthetic import HEADER, SyntheticGenerator
+from core.tax_registration.models import DataImportError, ETLJobRun, TaxRegistration
+from core.tax_registration.tests.test_postgresql import postgresql
+
+
+@postgresql
+class RejectedRowTest(TransactionTestCase):
+    """載入時被排除的統一編號不算已出現, 但 --delete-missing 仍保留其既有資料"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.enterContext(
+            override_settings(ETL_CACHE_DIR=str(self.tmp), ETL_ERROR_DIR=str(self.tmp))
+        )
+
+        generator = SyntheticGenerator(seed=0, invalid_ratio=0, duplicate_ratio=0)
+        self.rows = generator.chunk(0, 5)
+        self.bans = self.rows["統一編號"].tolist()
+
+    def write_source(self, order, bad):
+        """依 order 的列號寫出來源 CSV, bad 中的位置組織別名稱超過 varchar(50)"""
+        df = self.rows.iloc[order].reset_index(drop=True)
+        df.loc[bad, "組織別名稱"] = "有限公司" * 20
+        path = self.tmp / "source.csv"
+        df[HEADER].to_csv(path, index=False)
+        return path
+
+    def test_valid_row_after_rejected_row(self):
+        # 既有資料: 第 3 列(來源中只有被排除的版本)與第 4 列(已不在來源)
+        for i in (3, 4):
+            TaxRegistration.objects.create(ban=self.bans[i], business_name="舊資料")
+
+        # chunk 1: [0(被排除), 1] / chunk 2: [0(有效), 2] / chunk 3: [3(被排除)]
+        path = self.write_source([0, 1, 0, 2, 3], bad=[0, 4])
+        call_command(
+            "load_tax_registration",
+            source=str(path),
+            chunk_size=2,
+            mode="incremental",
+            delete_missing=True,
+            auto=True,
+            stdout=StringIO(),
+        )
+
+        job_run = ETLJobRun.objects.get()
+        self.assertEqual(job_run.status, "success")
+        self.assertEqual(job_run.records_duplicated, 0)
+        self.assertEqual(
+            sorted(DataImportError.objects.values_list("error_type", "batch_number")),
+            [("LOAD_ERROR", 1), ("LOAD_ERROR", 3)],
+        )
+        self.assertEqual(
+            sorted(TaxRegistration.objects.values_list("ban", flat=True)),
+            sorted(self.bans[:4]),
+        )
+        self.assertEqual(
+            TaxRegistration.objects.get(ban=self.bans[0]).business_type,
+            self.rows["組織別名稱"].iloc[0],
+        )
+        self.assertEqual(
+            TaxRegistration.objects.get(ban=self.bans[3]).business_name, "舊資料"
+        )
@@ -0,0 +1,35 @@
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.tax_registration.etl.loader import CopyStream
+
+
+class CopyStreamTest(SimpleTestCase):
+    """read() 以任意大小讀取, 內容與逐段編碼相同"""
+
+    def test_read_across_blocks(self):
+        df = pd.DataFrame(
+            {
+                "ban": [f"5000000{i}" for i in range(5)],
+                "name": ["a\tb", "c\nd", "e\\f", "", None],
+            }
+        )
+        expected = b"".join(CopyStream(df, block_size=2).blocks())
+
+        stream = CopyStream(df, block_size=2)
+        chunks = []
+        while data := stream.read(7):
+            chunks.append(data)
+
+        self.assertEqual(b"".join(chunks), expected)
+        self.assertTrue(all(len(chunk) <= 7 for chunk in chunks))
+        self.assertEqual(
+            expected.decode().splitlines(),
+            [
+                "50000000\ta\\tb",
+                "50000001\tc\\nd",
+                "50000002\te\\\\f",
+                "50000003\t",
+                "50000004\t\\N",
+            ],
+        )
@@ -0,0 +1,202 @@
+import threading
+from unittest import mock, skipUnless
+
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from core.tax_registration.etl.heartbeat import etl_lock
+from core.tax_registration.etl.loader import BulkLoader, CopyStream
+from core.tax_registration.etl.schema import (
+    ShadowTables,
+    secondary_indexes,
+    table_constraints,
+)
+from core.tax_registration.models import BusinessIndustry, TaxRegistration
+
+postgresql = skipUnless(connection.vendor == "postgresql", "需要 PostgreSQL")
+
+
+def frame(bans):
+    """清理後的資料(與 DataCleaner 輸出欄位相同), 每個營業人一個行業別"""
+    return pd.DataFrame(
+        {
+            "統一編號": bans,
+            "總機構統一編號": "",
+            "營業人名稱": [f"營業人 {ban}" for ban in bans],
+            "營業地址": "台北市",
+            "資本額": 1000,
+            "設立日期": "20200101",
+            "組織別名稱": "有限公司",
+            "使用統一發票": True,
+            "內容雜湊": range(len(bans)),
+            "行業代號": "4719",
+            "名稱": "零售",
+        }
+    )
+
+
+def backends():
+    """目前驅動可用的 loader backend(binary 需要 psycopg 3)"""
+    if connection.Database.__name__ == "psycopg":
+        return BulkLoader.BACKENDS
+    return ["text"]
+
+
+def in_thread(func):
+    """在另一個 thread(即另一條資料庫連線)執行, 返回結果"""
+    result = []
+
+    def run():
+        try:
+            result.append(func())
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+@postgresql
+class DatabaseDriverTest(TestCase):
+    """DATABASE_DRIVER 決定實際使用的驅動"""
+
+    def test_driver_matches_setting(self):
+        driver = getattr(settings, "DATABASE_DRIVER", "psycopg2")
+        self.assertEqual(connection.Database.__name__, driver)
+
+    def test_binary_requires_psycopg3(self):
+        if connection.Database.__name__ == "psycopg":
+            self.skipTest("psycopg 3 支援 binary")
+        with self.assertRaises(ImproperlyConfigured):
+            BulkLoader(backend="binary").insert(frame(["10000001"]))
+
+
+@postgresql
+class EtlLockTest(TransactionTestCase):
+    """advisory lock 同時只能由一條連線取得"""
+
+    def try_lock(self):
+        with etl_lock() as acquired:
+            return acquired
+
+    def test_second_connection_is_rejected(self):
+        with etl_lock() as acquired:
+            self.assertTrue(acquired)
+            self.assertFalse(in_thread(self.try_lock))
+
+        # 釋放後其他連線可以取得
+        self.assertTrue(in_thread(self.try_lock))
+
+
+@postgresql
+class CopyTextTest(TestCase):
+    """COPY text 經由 CopyStream 的 read() 送出, 兩種驅動皆同"""
+
+    def test_copy_reads_stream(self):
+        df = frame(["40000001", "40000002", "40000003"])
+        df.loc[0, "營業人名稱"] = "tab\t換行\n歸位\r反斜線\\"
+        df.loc[1, "總機構統一編號"] = "40000001"
+
+        readinto = CopyStream.readinto
+        with mock.patch.object(
+            CopyStream, "readinto", autospec=True, side_effect=readinto
+        ) as spy:
+            # batch_size=2: 跨兩段編碼
+            BulkLoader(batch_size=2, backend="text").insert(df)
+
+        self.assertTrue(spy.called)
+        rows = dict(TaxRegistration.objects.values_list("ban", "business_name"))
+        self.assertEqual(rows["40000001"], "tab\t換行\n歸位\r反斜線\\")
+        self.assertEqual(
+            dict(TaxRegistration.objects.values_list("ban", "headquarters_ban")),
+            {"40000001": None, "40000002": "40000001", "40000003": None},
+        )
+
+
+@postgresql
+class LoadBisectingTest(TestCase):
+    """整批失敗時以 savepoint 二分, 只拒絕問題列"""
+
+    def test_rejects_only_bad_row(self):
+        bans = [f"1000000{i}" for i in range(8)]
+        df = frame(bans)
+        # 設立日期超過 varchar(8): DataError
+        df.loc[5, "設立日期"] = "2020010100"
+
+        for backend in backends():
+            with self.subTest(backend=backend):
+                loader = BulkLoader(batch_size=3, backend=backend)
+                results, rejected, messages = loader.load_bisecting(df, loader.insert)
+
+                self.assertEqual(rejected["統一編號"].tolist(), ["10000005"])
+                self.assertEqual(len(messages), 1)
+                self.assertEqual(sum(results), 7)
+                self.assertEqual(
+                    sorted(TaxRegistration.objects.values_list("ban", flat=True)),
+                    [ban for ban in bans if ban != "10000005"],
+                )
+                self.assertEqual(BusinessIndustry.objects.count(), 7)
+
+                TaxRegistration.objects.all().delete()
+
+
+@postgresql
+class ShadowSwapTest(TransactionTestCase):
+    """影子表交換後名稱、約束、索引與 sequence 都回到原本的樣子"""
+
+    def schema(self):
+        with connection.cursor() as cursor:
+            return {
+                table: (
+                    [c.name for c in table_constraints(cursor, table)],
+                    [i.name for i in secondary_indexes(cursor, table)],
+                )
+                for table in ShadowTables().tables
+            }
+
+    def test_swap_replaces_tables(self):
+        BulkLoader(backend="text").insert(frame(["20000001", "20000002"]))
+        before = self.schema()
+
+        shadow = ShadowTables()
+        shadow.create()
+        # 匯入期間讀取端仍看到舊資料
+        BulkLoader(backend="text", table_suffix=ShadowTables.SUFFIX).insert(
+            frame(["30000001", "30000002", "30000003"])
+        )
+        self.assertEqual(TaxRegistration.objects.count(), 2)
+
+        shadow.finalize()
+        shadow.swap()
+
+        self.assertEqual(self.schema(), before)
+        self.assertEqual(
+            sorted(TaxRegistration.objects.values_list("ban", flat=True)),
+            ["30000001", "30000002", "30000003"],
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT to_regclass(%s), to_regclass(%s)",
+                ["tax_registration_next", "business_industry_next"],
+            )
+            self.assertEqual(cursor.fetchone(), (None, None))
+
+        # identity sequence 改回原名稱, ORM 可繼續新增
+        industry = BusinessIndustry.objects.create(
+            business_id="30000001", industry_code="4711", order=2
+        )
+        self.assertIsNotNone(industry.pk)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_get_serial_sequence('business_industry', 'id')")
+            self.assertEqual(cursor.fetchone()[0], "public.business_industry_id_seq")
+
+        # 外鍵指向交換後的 tax_registration
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BusinessIndustry.objects.create(
+                business_id="20000001", industry_code="4711"
+            )
@@ -0,0 +1,61 @@
+import json
+import pstats
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from core.tax_registration.etl.profiling import StageProfiler
+
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+class StageProfilerTest(SimpleTestCase):
+    """兩種模式都要寫出 pstats 與 stacks.collapsed"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def assertArtifacts(self, profiler: StageProfiler, stage: str):
+        self.assertGreater(
+            len(pstats.Stats(str(self.output_dir / f"{stage}.pstats")).stats), 0
+        )
+        stacks = (self.output_dir / "stacks.collapsed").read_text().splitlines()
+        self.assertTrue(any(line.startswith(f"{stage};") for line in stacks))
+        summary = json.loads((self.output_dir / "summary.json").read_text())
+        self.assertGreater(summary["stages"][stage]["stack_weight"], 0)
+        self.assertTrue(profiler.top_functions(stage))
+
+    def test_deterministic(self):
+        profiler = StageProfiler(self.output_dir, deterministic=True).start()
+        with profiler.stage("transform", 1):
+            busy(0.05)
+        profiler.stop()
+        self.assertArtifacts(profiler, "transform")
+
+    def test_sampled_worker_thread(self):
+        profiler = StageProfiler(self.output_dir, deterministic=False).start()
+
+        def load():
+            with profiler.stage("load", 1):
+                busy(0.2)
+
+        thread = threading.Thread(target=load)
+        thread.start()
+        thread.join()
+        profiler.stop()
+        self.assertArtifacts(profiler, "load")
+
+    def test_nothing_profiled(self):
+        StageProfiler(self.output_dir, deterministic=True).start().stop()
+        self.assertFalse((self.output_dir / "stacks.collapsed").exists())
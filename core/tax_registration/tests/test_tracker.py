@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+import pandas as pd
+from django.test import TestCase
+from django.utils import timezone
+
+from core.tax_registration.etl.heartbeat import Heartbeat
+from core.tax_registration.etl.tracker import ETLTracker
+from core.tax_registration.models import ETLJobRun, ImportProgress
+
+
+class HeartbeatTest(TestCase):
+    """tracker 的 save() 不可把心跳時間蓋回舊值"""
+
+    def setUp(self):
+        self.tracker = ETLTracker(
+            batch_size=100, chunk_size=100, data_source_url="http://example.com"
+        )
+        self.tracker.start()
+        # 長時間執行的任務: 記憶體中的 updated_at 仍是建立時的值
+        self.tracker.job_run.updated_at = timezone.now() - timedelta(hours=1)
+
+    def beat(self):
+        Heartbeat(self.tracker.job_run.id).beat()
+        return ETLJobRun.objects.get(pk=self.tracker.job_run.id).updated_at
+
+    def assertNotBefore(self, beat_at):
+        updated_at = ETLJobRun.objects.get(pk=self.tracker.job_run.id).updated_at
+        self.assertGreaterEqual(updated_at, beat_at)
+
+    def test_update_progress_after_heartbeat(self):
+        beat_at = self.beat()
+        self.tracker.update_progress(1)
+        self.assertNotBefore(beat_at)
+
+    def test_defer_indexes_after_heartbeat(self):
+        beat_at = self.beat()
+        self.tracker.defer_indexes([{"name": "idx", "sql": "CREATE INDEX idx"}])
+        self.assertNotBefore(beat_at)
+        self.tracker.clear_deferred_indexes()
+        self.assertNotBefore(beat_at)
+
+
+class ResumeBanSetsTest(TestCase):
+    """斷點續傳分別還原去重集合與載入失敗的統一編號"""
+
+    def test_restore_rejected_bans_separately(self):
+        tracker = ETLTracker(
+            batch_size=100, chunk_size=100, data_source_url="http://example.com"
+        )
+        tracker.start()
+        tracker.seen_bans.add(pd.Series(["10000001", "10000002"]))
+        tracker.rejected_bans.add(pd.Series(["10000003"]))
+        tracker.update_progress(1)
+        tracker.rejected_bans.add(pd.Series(["10000004"]))
+        tracker.update_progress(2)
+
+        resumed = ETLTracker(
+            batch_size=100, chunk_size=100, data_source_url="http://example.com"
+        )
+        self.assertEqual(resumed.get_resume_batch(), 3)
+        self.assertEqual(resumed.seen_bans.to_bans().tolist(), ["10000001", "10000002"])
+        self.assertEqual(
+            resumed.rejected_bans.to_bans().tolist(), ["10000003", "10000004"]
+        )
+
+    def test_incomplete_rejected_checkpoint(self):
+        tracker = ETLTracker(
+            batch_size=100, chunk_size=100, data_source_url="http://example.com"
+        )
+        tracker.start()
+        tracker.rejected_bans.add(pd.Series(["10000003"]))
+        tracker.update_progress(1)
+        ImportProgress.objects.update(rejected_ban_count=2)
+
+        resumed = ETLTracker(
+            batch_size=100, chunk_size=100, data_source_url="http://example.com"
+        )
+        with self.assertRaises(ValueError):
+            resumed.get_resume_batch()